@@ -178,12 +178,13 @@ Select an option to manage:
         """Update user statistics."""
         stats = self._load_data(self.stats_file)
         users = self._load_data(self.users_file)
+        now = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
 
         if str(user_id) not in users:
             users[str(user_id)] = {
                 "username": username,
-                "first_seen": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
-                "last_active": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+                "first_seen": now,
+                "last_active": now,
                 "total_actions": 0,
                 "actions": {
                     "searches": 0,
@@ -193,7 +194,7 @@ Select an option to manage:
             }
             stats["total_users"] += 1
         else:
-            users[str(user_id)]["last_active"] = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+            users[str(user_id)]["last_active"] = now
             users[str(user_id)]["username"] = username
 
         users[str(user_id)]["total_actions"] += 1
@@ -614,7 +615,7 @@ or
 
 Send /cancel to cancel this operation.
 """
-            context.user_data['expecting_restriction'] = True
+            context.user_data['admin_action'] = 'restriction'
             keyboard = [[InlineKeyboardButton("« Cancel", callback_data="restrict_cancel")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
             query.edit_message_text(text=message, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
@@ -633,7 +634,7 @@ or
 
 Send /cancel to cancel this operation.
 """
-            context.user_data['expecting_block'] = True
+            context.user_data['admin_action'] = 'block'
             keyboard = [[InlineKeyboardButton("« Cancel", callback_data="restrict_cancel")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
             query.edit_message_text(text=message, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
@@ -652,15 +653,13 @@ or
 
 Send /cancel to cancel this operation.
 """
-            context.user_data['expecting_unrestrict'] = True
+            context.user_data['admin_action'] = 'unrestrict'
             keyboard = [[InlineKeyboardButton("« Cancel", callback_data="restrict_cancel")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
             query.edit_message_text(text=message, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
 
         elif action == 'cancel':
-            context.user_data.pop('expecting_restriction', None)
-            context.user_data.pop('expecting_block', None)
-            context.user_data.pop('expecting_unrestrict', None)
+            context.user_data.pop('admin_action', None)
             return self.handle_restrictions(update, context)
 
     def handle_admin_action(self, update: Update, context: CallbackContext) -> None:
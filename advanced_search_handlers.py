@@ -1,23 +1,272 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+import html
 import logging
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ParseMode
 from telegram.ext import CallbackContext, ConversationHandler
-from telegram.error import BadRequest
-from arxiv_categories import ARXIV_CATEGORIES
+from telegram.error import BadRequest, RetryAfter
+from arxiv_categories import ARXIV_CATEGORIES, CATEGORY_PARENT
 
 logger = logging.getLogger(__name__)
 
 CHOOSING_FILTER, ENTER_DATE_FROM, ENTER_DATE_TO, ENTER_AUTHOR, ENTER_MIN_CITATIONS, SAVE_FILTER = range(6)
 
-def initialize_filters(context: CallbackContext) -> None:
-    if 'advanced_filters' not in context.user_data:
-        context.user_data['advanced_filters'] = {
-            'date_from': None,
-            'date_to': None,
-            'author': None,
-            'min_citations': None,
-            'categories': []
-        }
+# Static menus are identical on every callback, so build them once at import
+_BACK_TO_FILTERS_BUTTON = InlineKeyboardButton("« Back", callback_data="back_to_filters")
+
+_ADV_MENU_MARKUP = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("📅 Date Range", callback_data="filter_date"),
+        InlineKeyboardButton("👤 Author", callback_data="filter_author")
+    ],
+    [
+        InlineKeyboardButton("📊 Citations", callback_data="filter_citations"),
+        InlineKeyboardButton("🔖 Categories", callback_data="filter_categories")
+    ],
+    [
+        InlineKeyboardButton("🔍 Execute Search", callback_data="execute_search"),
+        InlineKeyboardButton("« Back", callback_data="back_to_search_options")
+    ]
+])
+
+_DATE_MENU_MARKUP = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("Last Week", callback_data="date_week"),
+        InlineKeyboardButton("Last Month", callback_data="date_month")
+    ],
+    [
+        InlineKeyboardButton("Last Year", callback_data="date_year"),
+        InlineKeyboardButton("Custom", callback_data="date_custom")
+    ],
+    [_BACK_TO_FILTERS_BUTTON]
+])
+
+_AUTHOR_MENU_MARKUP = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("Exact Match", callback_data="author_exact"),
+        InlineKeyboardButton("Last Name", callback_data="author_last")
+    ],
+    [_BACK_TO_FILTERS_BUTTON]
+])
+
+_BACK_TO_FILTERS_MARKUP = InlineKeyboardMarkup([[_BACK_TO_FILTERS_BUTTON]])
+
+_BACK_TO_FILTERS_DONE_MARKUP = InlineKeyboardMarkup([[
+    InlineKeyboardButton("« Back to Filters", callback_data="back_to_filters")
+]])
+
+_BACK_TO_SEARCH_MARKUP = InlineKeyboardMarkup([[
+    InlineKeyboardButton("« Back to Search", callback_data="back_to_search_options")
+]])
+
+# ARXIV_CATEGORIES is static, so the category keyboards only differ in the
+# ✅/⭕️ selection marks. Precompute everything else once.
+_CATEGORIES_MARKUP = InlineKeyboardMarkup(
+    [[InlineKeyboardButton(f"📚 {main_category}", callback_data=f"cat_main_{main_category}")]
+     for main_category in ARXIV_CATEGORIES]
+    + [[_BACK_TO_FILTERS_BUTTON]]
+)
+
+_DATE_DELTAS = {
+    'week': timedelta(days=7),
+    'month': timedelta(days=30),
+    'year': timedelta(days=365)
+}
+
+_DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+# Every callback handled here is "<kind>_<arg>"; one compiled match replaces split/startswith chains
+_CB_RE = re.compile(r'^(?P<kind>filter|date|author|citations|cat_main|cat_sub|cat_toggle)_(?P<arg>.+)$')
+
+_BACK_TO_CATEGORIES_ROW = [InlineKeyboardButton("« Back to Categories", callback_data="filter_categories")]
+
+# main_category -> [(label, category_id, callback_data, has_subcategories), ...]
+_MAIN_CAT_TEMPLATE = {
+    main_category: [
+        (
+            f"📂 {category_data['name']} ({category_id})" if category_data['subcategories']
+            else f"{category_data['name']} ({category_id})",
+            category_id,
+            f"cat_sub_{category_id}" if category_data['subcategories'] else f"cat_toggle_{category_id}",
+            bool(category_data['subcategories'])
+        )
+        for category_id, category_data in categories.items()
+    ]
+    for main_category, categories in ARXIV_CATEGORIES.items()
+}
+
+# category_id -> ((label, sub_id, callback_data), ...), plus the back row to its main category
+_SUBCAT_TEMPLATE = {
+    category_id: tuple(
+        (f"{sub_name} ({sub_id})", sub_id, f"cat_toggle_{sub_id}")
+        for sub_id, sub_name in category_data['subcategories'].items()
+    )
+    for categories in ARXIV_CATEGORIES.values()
+    for category_id, category_data in categories.items()
+}
+_SUBCAT_BACK_ROW = {
+    category_id: [InlineKeyboardButton("« Back", callback_data=f"cat_main_{main_category}")]
+    for main_category, categories in ARXIV_CATEGORIES.items()
+    for category_id in categories
+}
+
+_MAIN_CAT_HEADER = {
+    main_category: f"""
+<b>{main_category} Categories</b> 📚
+
+Select a category to see its subcategories or toggle selection.
+✅ = Selected
+⭕️ = Not Selected
+"""
+    for main_category in ARXIV_CATEGORIES
+}
+
+_SUBCATEGORIES_HEADER = """
+<b>Subcategories</b> 📂
+
+Select subcategories to include in your search:
+✅ = Selected
+⭕️ = Not Selected
+"""
+
+_LOWER_CAT = {category_id: category_id.lower() for category_id in CATEGORY_PARENT}
+
+# Telegram allows roughly one message edit per second per chat. Bursts of
+# menu clicks are coalesced so only the latest pending edit is sent.
+EDIT_INTERVAL = 1.0
+_EDIT_BUCKETS: Dict[int, Dict] = {}
+_EDIT_LOCK = threading.Lock()
+_edit_retry_at = 0.0
+
+def _edit_bucket(chat_id: int) -> Dict:
+    """Return the chat's edit bucket; call with _EDIT_LOCK held."""
+    return _EDIT_BUCKETS.setdefault(chat_id, {'last_edit_ts': 0.0, 'pending': {}})
+
+def _prune_edit_buckets(now: float) -> None:
+    """Drop buckets with nothing pending whose interval has passed; call with _EDIT_LOCK held."""
+    for chat_id in [chat_id for chat_id, bucket in _EDIT_BUCKETS.items()
+                    if not bucket['pending'] and bucket['last_edit_ts'] + EDIT_INTERVAL <= now]:
+        del _EDIT_BUCKETS[chat_id]
+
+def _defer_edit(job_queue, chat_id: int, payload: Dict, wait: float) -> None:
+    """Queue an edit for the chat's next flush; call with _EDIT_LOCK held."""
+    pending = _edit_bucket(chat_id)['pending']
+    if not pending:
+        job_queue.run_once(_flush_pending_edits, max(wait, 0), context=chat_id)
+    # A newer edit queued for the same message meanwhile wins over a retried one
+    pending.setdefault(payload['message_id'], payload)
+
+def _send_edit(context: CallbackContext, chat_id: int, payload: Dict) -> None:
+    global _edit_retry_at
+    with _EDIT_LOCK:
+        now = time.monotonic()
+        if _edit_retry_at > now and context.job_queue:
+            _defer_edit(context.job_queue, chat_id, payload, _edit_retry_at - now)
+            return
+        _edit_bucket(chat_id)['last_edit_ts'] = now
+    try:
+        context.bot.edit_message_text(**payload)
+    except RetryAfter as e:
+        logger.warning("Flood limit hit, suppressing edits for %ss", e.retry_after)
+        with _EDIT_LOCK:
+            _edit_retry_at = max(_edit_retry_at, time.monotonic() + e.retry_after)
+            if context.job_queue:
+                _defer_edit(context.job_queue, chat_id, payload, e.retry_after)
+    except BadRequest as e:
+        if "Message is not modified" not in str(e):
+            raise
+
+def _flush_pending_edits(context: CallbackContext) -> None:
+    chat_id = context.job.context
+    with _EDIT_LOCK:
+        bucket = _EDIT_BUCKETS.get(chat_id)
+        if bucket is None:
+            return
+        pending = bucket['pending']
+        bucket['pending'] = {}
+    # _send_edit re-queues anything that lands in a flood wait started after this flush was scheduled
+    for payload in pending.values():
+        try:
+            _send_edit(context, chat_id, payload)
+        except BadRequest as e:
+            logger.error("Deferred edit failed: %s", e)
+
+def _safe_edit(query, context: CallbackContext, text: str, reply_markup=None,
+               parse_mode=ParseMode.HTML) -> None:
+    """Edit the callback's message, deferring edits that would exceed the per-chat rate."""
+    chat_id = query.message.chat_id
+    payload = {
+        'chat_id': chat_id,
+        'message_id': query.message.message_id,
+        'text': text,
+        'reply_markup': reply_markup,
+        'parse_mode': parse_mode
+    }
+
+    with _EDIT_LOCK:
+        now = time.monotonic()
+        _prune_edit_buckets(now)
+        bucket = _edit_bucket(chat_id)
+        wait = max(bucket['last_edit_ts'] + EDIT_INTERVAL, _edit_retry_at) - now
+        if (wait > 0 or bucket['pending']) and context.job_queue:
+            # Only schedule one flush per chat; later clicks just replace the payload
+            if not bucket['pending']:
+                context.job_queue.run_once(_flush_pending_edits, max(wait, 0), context=chat_id)
+            bucket['pending'][payload['message_id']] = payload
+            return
+
+    _send_edit(context, chat_id, payload)
+
+def _parse_callback(data: str) -> Tuple[Optional[str], Optional[str]]:
+    """Split callback data into (kind, arg), or (None, None) if it isn't ours."""
+    match = _CB_RE.match(data or '')
+    if not match:
+        return None, None
+    return match['kind'], match['arg']
+
+_DEFAULT_ERROR_TEXT = "❌ An error occurred. Please try again."
+
+def _show_error(update: Update, text: str = _DEFAULT_ERROR_TEXT, reply_markup=_BACK_TO_FILTERS_MARKUP) -> None:
+    """Report a handler failure in place of the menu, or as a reply to a text message."""
+    query = update.callback_query
+    try:
+        if query:
+            query.edit_message_text(text, reply_markup=reply_markup, parse_mode=ParseMode.HTML)
+        else:
+            update.message.reply_text(text)
+    except Exception as e:
+        logger.error("Error sending error message: %s", e)
+
+_DEFAULT_FILTERS = {
+    'date_from': None,
+    'date_to': None,
+    'author': None,
+    'min_citations': None
+}
+
+def _compact_date(d: str) -> str:
+    """Turn a validated YYYY-MM-DD date into arXiv's YYYYMMDD form."""
+    return d[:4] + d[5:7] + d[8:10]
+
+def _set_date_range(filters: Dict, date_from: Optional[str], date_to: Optional[str]) -> None:
+    filters['date_from'] = date_from
+    filters['date_to'] = date_to
+    # Keep the arXiv-formatted span alongside so execute doesn't reformat it
+    if date_from and date_to:
+        filters['_date_span'] = f"{_compact_date(date_from)} TO {_compact_date(date_to)}"
+    else:
+        filters.pop('_date_span', None)
+
+def get_filters(context: CallbackContext) -> Dict:
+    """Return the user's advanced filters, creating the defaults on first use."""
+    filters = context.user_data.get('advanced_filters')
+    if filters is None:
+        filters = context.user_data['advanced_filters'] = {**_DEFAULT_FILTERS, 'categories': set()}
+    return filters
 
 def show_advanced_search_menu(update: Update, context: CallbackContext, execute_search_func=None) -> int:
     logger.info("Showing advanced search menu")
@@ -27,174 +276,99 @@ def show_advanced_search_menu(update: Update, context: CallbackContext, execute_
         try:
             query.answer()
         except Exception as e:
-            logger.error(f"Error answering callback query: {str(e)}")
+            logger.error("Error answering callback query: %s", e)
 
     try:
-        if 'advanced_filters' not in context.user_data:
-            context.user_data['advanced_filters'] = {
-                'date_from': None,
-                'date_to': None,
-                'author': None,
-                'min_citations': None,
-                'categories': []
-            }
-
-        filters = context.user_data['advanced_filters']
-
-        keyboard = [
-            [
-                InlineKeyboardButton("📅 Date Range", callback_data="filter_date"),
-                InlineKeyboardButton("👤 Author", callback_data="filter_author")
-            ],
-            [
-                InlineKeyboardButton("📊 Citations", callback_data="filter_citations"),
-                InlineKeyboardButton("🔖 Categories", callback_data="filter_categories")
-            ],
-            [
-                InlineKeyboardButton("🔍 Execute Search", callback_data="execute_search"),
-                InlineKeyboardButton("« Back", callback_data="back_to_search_options")
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        filters = get_filters(context)
+        reply_markup = _ADV_MENU_MARKUP
 
         date_range = "Not set"
         if filters.get('date_from') and filters.get('date_to'):
             date_range = f"{filters['date_from']} to {filters['date_to']}"
 
-        author = filters.get('author', "Not set")
+        author = html.escape(filters['author']) if filters.get('author') else "Not set"
         citations = filters.get('min_citations', "Not set")
-        categories = ", ".join(filters.get('categories', [])) or "Not set"
+        categories = ", ".join(sorted(filters['categories'])) or "Not set"
 
         message = (
-            "*Advanced Search Filters* 🔬\n\n"
-            "*Current Filters:*\n"
+            "<b>Advanced Search Filters</b> 🔬\n\n"
+            "<b>Current Filters:</b>\n"
             f"📅 Date Range: {date_range}\n"
             f"👤 Author: {author}\n"
             f"📊 Min Citations: {citations}\n"
             f"🔖 Categories: {categories}\n\n"
-            "_Select a filter to modify_"
+            "<i>Select a filter to modify</i>"
         )
 
-        message += f"\n\n_{datetime.utcnow().strftime('%H:%M:%S.%f')[:10]}_"
-
         if query:
+            # Skip the edit entirely when this message already shows the same menu
+            menu_hash = (query.message.message_id, hash(message))
+            if (context.user_data.get('_last_menu_hash') == menu_hash
+                    and query.message.reply_markup == reply_markup):
+                return CHOOSING_FILTER
+
             try:
-                query.edit_message_text(
-                    message,
-                    reply_markup=reply_markup,
-                    parse_mode=ParseMode.MARKDOWN
-                )
+                _safe_edit(query, context, message, reply_markup=reply_markup)
+                context.user_data['_last_menu_hash'] = menu_hash
             except BadRequest as e:
-                if "Message is not modified" in str(e):
-                    pass
-                else:
-                    logger.error(f"BadRequest error: {str(e)}")
-                    raise
+                logger.error("BadRequest error: %s", e)
+                raise
         else:
             update.message.reply_text(
                 message,
                 reply_markup=reply_markup,
-                parse_mode=ParseMode.MARKDOWN
+                parse_mode=ParseMode.HTML
             )
 
         logger.info("Advanced search menu displayed successfully")
         return CHOOSING_FILTER
 
     except Exception as e:
-        logger.error(f"Error showing advanced search menu: {str(e)}", exc_info=True)
-        error_message = (
+        logger.error("Error showing advanced search menu: %s", e, exc_info=True)
+        _show_error(
+            update,
             "❌ An error occurred while displaying the advanced search menu.\n"
-            "Please try using /search again."
+            "Please try using /search again.",
+            reply_markup=_BACK_TO_SEARCH_MARKUP
         )
-
-        try:
-            if query:
-                query.edit_message_text(
-                    error_message,
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("« Back to Search", callback_data="back_to_search_options")
-                    ]]),
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            else:
-                update.message.reply_text(error_message)
-        except Exception as e2:
-            logger.error(f"Error sending error message: {str(e2)}")
-
         return ConversationHandler.END
 
-def handle_filter_selection(update: Update, context: CallbackContext) -> int:
-    query = update.callback_query
-    logger.info(f"Filter selection callback received: {query.data}")
-
-    try:
-        query.answer()
-        initialize_filters(context)
-
-        if query.data == "filter_date":
-            keyboard = [
-                [
-                    InlineKeyboardButton("Last Week", callback_data="date_week"),
-                    InlineKeyboardButton("Last Month", callback_data="date_month")
-                ],
-                [
-                    InlineKeyboardButton("Last Year", callback_data="date_year"),
-                    InlineKeyboardButton("Custom", callback_data="date_custom")
-                ],
-                [InlineKeyboardButton("« Back", callback_data="back_to_filters")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-
-            current_filter = ""
-            if context.user_data['advanced_filters'].get('date_from') and context.user_data['advanced_filters'].get('date_to'):
-                current_filter = f"\nCurrent: {context.user_data['advanced_filters']['date_from']} to {context.user_data['advanced_filters']['date_to']}"
-
-            query.edit_message_text(
-                f"*Select Date Range* 📅{current_filter}\n\n"
-                "Choose a predefined range or select 'Custom' to enter specific dates.",
-                reply_markup=reply_markup,
-                parse_mode=ParseMode.MARKDOWN
-            )
-            return ENTER_DATE_FROM
-
-        elif query.data == "filter_author":
-            logger.info("Showing author search options")
-            keyboard = [
-                [
-                    InlineKeyboardButton("Exact Match", callback_data="author_exact"),
-                    InlineKeyboardButton("Last Name", callback_data="author_last")
-                ],
-                [InlineKeyboardButton("« Back", callback_data="back_to_filters")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-
-            query.edit_message_text(
-                "*Choose Author Search Type* 👤\n\n"
-                "• *Exact Match:* Search for exact author name\n"
-                "• *Last Name:* Search by last name only\n",
-                reply_markup=reply_markup,
-                parse_mode=ParseMode.MARKDOWN
-            )
-            return ENTER_AUTHOR
-
-        elif query.data == "filter_categories":
-            logger.info("Showing categories options")
-            keyboard = []
-
-            for main_category in ARXIV_CATEGORIES.keys():
-                keyboard.append([InlineKeyboardButton(
-                    f"📚 {main_category}",
-                    callback_data=f"cat_main_{main_category}"
-                )])
+def _show_date_menu(query, context: CallbackContext) -> int:
+    filters = get_filters(context)
+    current_filter = ""
+    if filters['date_from'] and filters['date_to']:
+        current_filter = f"\nCurrent: {filters['date_from']} to {filters['date_to']}"
+
+    _safe_edit(
+        query,
+        context,
+        f"<b>Select Date Range</b> 📅{current_filter}\n\n"
+        "Choose a predefined range or select 'Custom' to enter specific dates.",
+        reply_markup=_DATE_MENU_MARKUP
+    )
+    return ENTER_DATE_FROM
+
+def _show_author_menu(query, context: CallbackContext) -> int:
+    logger.info("Showing author search options")
+
+    _safe_edit(
+        query,
+        context,
+        "<b>Choose Author Search Type</b> 👤\n\n"
+        "• <b>Exact Match:</b> Search for exact author name\n"
+        "• <b>Last Name:</b> Search by last name only\n",
+        reply_markup=_AUTHOR_MENU_MARKUP
+    )
+    return ENTER_AUTHOR
 
-            keyboard.append([InlineKeyboardButton("« Back", callback_data="back_to_filters")])
-            reply_markup = InlineKeyboardMarkup(keyboard)
+def _show_categories_menu(query, context: CallbackContext) -> int:
+    logger.info("Showing categories options")
 
-            current_categories = context.user_data['advanced_filters'].get('categories', [])
-            selected_cats = ", ".join(current_categories) if current_categories else "None selected"
+    current_categories = get_filters(context)['categories']
+    selected_cats = ", ".join(sorted(current_categories)) if current_categories else "None selected"
 
-            message = f"""
-*Select Categories* 🔖
+    message = f"""
+<b>Select Categories</b> 🔖
 
 Currently selected: {selected_cats}
 
@@ -207,213 +381,188 @@ And more...
 ✅ = Selected
 ⭕️ = Not Selected
 """
-            query.edit_message_text(
-                message,
-                reply_markup=reply_markup,
-                parse_mode=ParseMode.MARKDOWN
-            )
-            return CHOOSING_FILTER
+    _safe_edit(query, context, message, reply_markup=_CATEGORIES_MARKUP)
+    return CHOOSING_FILTER
 
-    except Exception as e:
-        logger.error(f"Error in filter selection: {str(e)}", exc_info=True)
+_FILTER_MENUS = {
+    'date': _show_date_menu,
+    'author': _show_author_menu,
+    'categories': _show_categories_menu
+}
 
-def handle_main_category_selection(update: Update, context: CallbackContext) -> None:
+def handle_filter_selection(update: Update, context: CallbackContext) -> int:
     query = update.callback_query
-    query.answer()
+    logger.info("Filter selection callback received: %s", query.data)
 
-    main_category = query.data.split('_')[2]
-    keyboard = []
+    try:
+        query.answer()
 
-    for category_id, category_data in ARXIV_CATEGORIES[main_category].items():
-        if category_data['subcategories']:
-            keyboard.append([InlineKeyboardButton(
-                f"📂 {category_data['name']} ({category_id})",
-                callback_data=f"cat_sub_{category_id}"
-            )])
-        else:
-            is_selected = category_id in context.user_data.get('advanced_filters', {}).get('categories', [])
-            status = "✅" if is_selected else "⭕️"
-            keyboard.append([InlineKeyboardButton(
-                f"{status} {category_data['name']} ({category_id})",
-                callback_data=f"cat_toggle_{category_id}"
-            )])
+        kind, arg = _parse_callback(query.data)
+        show_menu = _FILTER_MENUS.get(arg) if kind == 'filter' else None
+        if show_menu:
+            return show_menu(query, context)
 
-    keyboard.append([InlineKeyboardButton("« Back to Categories", callback_data="filter_categories")])
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    except Exception as e:
+        logger.error("Error in filter selection: %s", e, exc_info=True)
+        _show_error(update)
 
-    message = f"""
-*{main_category} Categories* 📚
+def handle_main_category_selection(update: Update, context: CallbackContext) -> None:
+    query = update.callback_query
+    query.answer()
 
-Select a category to see its subcategories or toggle selection.
-✅ = Selected
-⭕️ = Not Selected
-"""
+    _, main_category = _parse_callback(query.data)
+    return _render_main_category(update, context, main_category)
+
+@lru_cache(maxsize=256)
+def _main_category_markup(main_category: str, selected: frozenset) -> InlineKeyboardMarkup:
+    """Build a main category's keyboard, given which of its toggles are selected."""
+    keyboard = [
+        [InlineKeyboardButton(
+            label if has_subcategories else f"{'✅' if category_id in selected else '⭕️'} {label}",
+            callback_data=callback_data
+        )]
+        for label, category_id, callback_data, has_subcategories in _MAIN_CAT_TEMPLATE[main_category]
+    ]
+    keyboard.append(_BACK_TO_CATEGORIES_ROW)
+    return InlineKeyboardMarkup(keyboard)
+
+@lru_cache(maxsize=256)
+def _subcategory_markup(category_id: str, selected: frozenset) -> InlineKeyboardMarkup:
+    """Build a category's subcategory keyboard, given which subcategories are selected."""
+    keyboard = [
+        [InlineKeyboardButton(
+            f"{'✅' if sub_id in selected else '⭕️'} {label}",
+            callback_data=callback_data
+        )]
+        for label, sub_id, callback_data in _SUBCAT_TEMPLATE[category_id]
+    ]
+    keyboard.append(_SUBCAT_BACK_ROW[category_id])
+    return InlineKeyboardMarkup(keyboard)
+
+def _render_main_category(update: Update, context: CallbackContext, main_category: str) -> int:
+    query = update.callback_query
+    selected = get_filters(context)['categories']
+    # Only this menu's selections affect the keyboard, so they form the cache key
+    reply_markup = _main_category_markup(main_category, frozenset(
+        category_id for _, category_id, _, _ in _MAIN_CAT_TEMPLATE[main_category] if category_id in selected
+    ))
 
-    query.edit_message_text(
-        message,
-        reply_markup=reply_markup,
-        parse_mode=ParseMode.MARKDOWN
-    )
+    _safe_edit(query, context, _MAIN_CAT_HEADER[main_category], reply_markup=reply_markup)
     return CHOOSING_FILTER
 
 def handle_subcategory_selection(update: Update, context: CallbackContext) -> None:
     query = update.callback_query
     query.answer()
 
-    category_id = query.data.split('_')[2]
-    keyboard = []
-
-    for main_cat, categories in ARXIV_CATEGORIES.items():
-        if category_id in categories:
-            subcategories = categories[category_id]['subcategories']
-            for sub_id, sub_name in subcategories.items():
-                is_selected = sub_id in context.user_data.get('advanced_filters', {}).get('categories', [])
-                status = "✅" if is_selected else "⭕️"
-                keyboard.append([InlineKeyboardButton(
-                    f"{status} {sub_name} ({sub_id})",
-                    callback_data=f"cat_toggle_{sub_id}"
-                )])
-            break
-
-    keyboard.append([InlineKeyboardButton("« Back", callback_data=f"cat_main_{main_cat}")])
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    _, category_id = _parse_callback(query.data)
+    return _render_subcategory(update, context, category_id)
 
-    message = f"""
-*Subcategories* 📂
-
-Select subcategories to include in your search:
-✅ = Selected
-⭕️ = Not Selected
-"""
+def _render_subcategory(update: Update, context: CallbackContext, category_id: str) -> int:
+    query = update.callback_query
+    selected = get_filters(context)['categories']
+    reply_markup = _subcategory_markup(category_id, frozenset(
+        sub_id for _, sub_id, _ in _SUBCAT_TEMPLATE[category_id] if sub_id in selected
+    ))
 
-    query.edit_message_text(
-        message,
-        reply_markup=reply_markup,
-        parse_mode=ParseMode.MARKDOWN
-    )
+    _safe_edit(query, context, _SUBCATEGORIES_HEADER, reply_markup=reply_markup)
     return CHOOSING_FILTER
 
 def handle_category_toggle(update: Update, context: CallbackContext) -> None:
     query = update.callback_query
-    query.answer()
-
-    category_id = query.data.split('_')[2]
-
-    if 'advanced_filters' not in context.user_data:
-        context.user_data['advanced_filters'] = {'categories': []}
-    if 'categories' not in context.user_data['advanced_filters']:
-        context.user_data['advanced_filters']['categories'] = []
+    _, category_id = _parse_callback(query.data)
 
-    categories = context.user_data['advanced_filters']['categories']
+    filters = get_filters(context)
+    categories = filters['categories']
 
     if category_id in categories:
-        categories.remove(category_id)
+        categories.discard(category_id)
         feedback = f"❌ Removed {category_id}"
     else:
-        categories.append(category_id)
+        categories.add(category_id)
         feedback = f"✅ Added {category_id}"
 
+    # Keep the query fragment in step with the selection so execute doesn't rebuild it
+    filters['_cat_frag'] = _category_fragment(categories)
+
     query.answer(feedback)
 
-    for main_cat, categories in ARXIV_CATEGORIES.items():
-        for cat_id, cat_data in categories.items():
-            if category_id == cat_id:
-                query.data = f"cat_main_{main_cat}"
-                return handle_main_category_selection(update, context)
-            elif category_id in cat_data['subcategories']:
-                query.data = f"cat_sub_{cat_id}"
-                return handle_subcategory_selection(update, context)
+    main_cat, parent = CATEGORY_PARENT.get(category_id, (None, None))
+    if main_cat is None:
+        return CHOOSING_FILTER
 
-    return CHOOSING_FILTER
+    # The toggle feedback already answered the callback, so render without re-answering
+    if parent is None:
+        return _render_main_category(update, context, main_cat)
+    return _render_subcategory(update, context, parent)
 
 def handle_date_input(update: Update, context: CallbackContext) -> int:
     query = update.callback_query
     query.answer()
-    logger.info(f"Processing date input: {query.data}")
+    logger.info("Processing date input: %s", query.data)
 
     try:
-        initialize_filters(context)
+        filters = get_filters(context)
 
-        if not query.data.startswith("date_"):
+        kind, option = _parse_callback(query.data)
+        if kind != 'date':
             return CHOOSING_FILTER
 
-        option = query.data.split("_")[1]
-        end_date = datetime.utcnow()
-
-        if option in ["week", "month", "year"]:
-            if option == "week":
-                start_date = end_date - timedelta(days=7)
-                date_description = "Last Week"
-            elif option == "month":
-                start_date = end_date - timedelta(days=30)
-                date_description = "Last Month"
-            else:
-                start_date = end_date - timedelta(days=365)
-                date_description = "Last Year"
+        if option in _DATE_DELTAS:
+            end_date = datetime.utcnow().date()
+            start_date = end_date - _DATE_DELTAS[option]
 
-            context.user_data['advanced_filters']['date_from'] = start_date.strftime('%Y-%m-%d')
-            context.user_data['advanced_filters']['date_to'] = end_date.strftime('%Y-%m-%d')
+            _set_date_range(filters, start_date.isoformat(), end_date.isoformat())
 
             return show_advanced_search_menu(update, context)
 
         elif option == "custom":
-            keyboard = [[InlineKeyboardButton("« Back", callback_data="back_to_filters")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-
             query.edit_message_text(
-                "*Enter Start Date* 📅\n\n"
+                "<b>Enter Start Date</b> 📅\n\n"
                 "Please enter the start date in YYYY-MM-DD format:\n"
-                "Example: `2024-01-01`",
-                reply_markup=reply_markup,
-                parse_mode=ParseMode.MARKDOWN
+                "Example: <code>2024-01-01</code>",
+                reply_markup=_BACK_TO_FILTERS_MARKUP,
+                parse_mode=ParseMode.HTML
             )
             context.user_data['awaiting_custom_date'] = True
-            context.user_data['advanced_filters']['date_from'] = None
-            context.user_data['advanced_filters']['date_to'] = None
+            _set_date_range(filters, None, None)
             return ENTER_DATE_FROM
 
         return CHOOSING_FILTER
 
     except Exception as e:
-        logger.error(f"Error handling date input: {str(e)}")
-        query.edit_message_text(
-            "❌ An error occurred. Please try again.",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("« Back", callback_data="back_to_filters")
-            ]]),
-            parse_mode=ParseMode.MARKDOWN
-        )
+        logger.error("Error handling date input: %s", e)
+        _show_error(update)
         return CHOOSING_FILTER
 
 def handle_custom_date_message(update: Update, context: CallbackContext) -> int:
     try:
         input_date = update.message.text.strip()
-        datetime.strptime(input_date, '%Y-%m-%d')
+        # fromisoformat also accepts YYYYMMDD and week dates, so pin the layout first
+        if not _DATE_RE.match(input_date):
+            raise ValueError(f"Invalid date: {input_date}")
+        date.fromisoformat(input_date)
+        filters = get_filters(context)
 
         if 'awaiting_date_to' in context.user_data:
-            context.user_data['advanced_filters']['date_to'] = input_date
+            date_from = filters['date_from']
+            _set_date_range(filters, date_from, input_date)
             del context.user_data['awaiting_date_to']
 
-            date_from = context.user_data['advanced_filters']['date_from']
             update.message.reply_text(
                 f"✅ Date range set: {date_from} to {input_date}",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("« Back to Filters", callback_data="back_to_filters")
-                ]])
+                reply_markup=_BACK_TO_FILTERS_DONE_MARKUP
             )
             return CHOOSING_FILTER
         else:
-            context.user_data['advanced_filters']['date_from'] = input_date
+            _set_date_range(filters, input_date, None)
             context.user_data['awaiting_date_to'] = True
 
             update.message.reply_text(
-                "*Enter End Date* 📅\n\n"
+                "<b>Enter End Date</b> 📅\n\n"
                 "Please enter the end date in YYYY-MM-DD format:\n"
-                "Example: `2024-01-31`",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("« Back", callback_data="back_to_filters")
-                ]]),
-                parse_mode=ParseMode.MARKDOWN
+                "Example: <code>2024-01-31</code>",
+                reply_markup=_BACK_TO_FILTERS_MARKUP,
+                parse_mode=ParseMode.HTML
             )
             return ENTER_DATE_TO
 
@@ -421,9 +570,7 @@ def handle_custom_date_message(update: Update, context: CallbackContext) -> int:
         update.message.reply_text(
             "❌ Invalid date format! Please use YYYY-MM-DD format.\n"
             "Example: 2024-01-01",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("« Back", callback_data="back_to_filters")
-            ]])
+            reply_markup=_BACK_TO_FILTERS_MARKUP
         )
         return ENTER_DATE_FROM if 'awaiting_date_to' not in context.user_data else ENTER_DATE_TO
 
@@ -433,19 +580,16 @@ def handle_author_input(update: Update, context: CallbackContext) -> int:
             query = update.callback_query
             query.answer()
 
-            if query.data.startswith("author_"):
-                author_type = query.data.split("_")[1]
+            kind, author_type = _parse_callback(query.data)
+            if kind == 'author':
                 context.user_data['author_type'] = author_type
 
-                keyboard = [[InlineKeyboardButton("« Back", callback_data="back_to_filters")]]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-
                 query.edit_message_text(
-                    f"*Enter Author Name* 👤\n\n"
-                    f"Type: {author_type.title()}\n"
+                    f"<b>Enter Author Name</b> 👤\n\n"
+                    f"Type: {html.escape(author_type.title())}\n"
                     f"Please enter the author name:",
-                    reply_markup=reply_markup,
-                    parse_mode=ParseMode.MARKDOWN
+                    reply_markup=_BACK_TO_FILTERS_MARKUP,
+                    parse_mode=ParseMode.HTML
                 )
                 context.user_data['awaiting_author'] = True
                 return ENTER_AUTHOR
@@ -456,7 +600,7 @@ def handle_author_input(update: Update, context: CallbackContext) -> int:
                 update.message.reply_text("❌ Please enter a valid author name")
                 return ENTER_AUTHOR
 
-            context.user_data['advanced_filters']['author'] = author
+            get_filters(context)['author'] = author
             context.user_data['awaiting_author'] = False
 
             return show_advanced_search_menu(update, context)
@@ -464,121 +608,140 @@ def handle_author_input(update: Update, context: CallbackContext) -> int:
         return CHOOSING_FILTER
 
     except Exception as e:
-        logger.error(f"Error in handle_author_input: {str(e)}")
-        message = "❌ An error occurred. Please try again."
-        if update.callback_query:
-            update.callback_query.edit_message_text(
-                message,
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("« Back", callback_data="back_to_filters")
-                ]])
-            )
-        else:
-            update.message.reply_text(message)
+        logger.error("Error in handle_author_input: %s", e)
+        _show_error(update)
         return CHOOSING_FILTER
 
 def handle_citations_input(update: Update, context: CallbackContext) -> int:
     query = update.callback_query
     query.answer()
-    logger.info(f"Processing citations input: {query.data}")
+    logger.info("Processing citations input: %s", query.data)
 
     try:
-        if query.data.startswith("citations_"):
-            citations = int(query.data.split("_")[1])
-            context.user_data.setdefault('advanced_filters', {})
-            context.user_data['advanced_filters']['min_citations'] = citations
+        kind, arg = _parse_callback(query.data)
+        if kind == 'citations':
+            citations = int(arg)
+            get_filters(context)['min_citations'] = citations
             return show_advanced_search_menu(update, context)
 
     except Exception as e:
-        logger.error(f"Error handling citations input: {str(e)}")
-        query.edit_message_text(
-            "❌ An error occurred. Please try again.",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("« Back", callback_data="back_to_filters")
-            ]]),
-            parse_mode=ParseMode.MARKDOWN
-        )
+        logger.error("Error handling citations input: %s", e)
+        _show_error(update)
 
     return CHOOSING_FILTER
 
+_execute_search = None
+
+def _get_execute_search():
+    """Return arXiv.execute_search_with_query, importing it on first use only.
+
+    arXiv imports this module at load time, so the import can't live at the top.
+    """
+    global _execute_search
+    if _execute_search is None:
+        from arXiv import execute_search_with_query
+        _execute_search = execute_search_with_query
+    return _execute_search
+
+def _category_fragment(categories) -> str:
+    """Build the '(cat:a OR cat:b)' query fragment for the selected categories."""
+    if not categories:
+        return ''
+    return '(' + ' OR '.join(f"cat:{_LOWER_CAT.get(cat) or cat.lower()}" for cat in sorted(categories)) + ')'
+
+def _filters_key(filters: Dict) -> tuple:
+    """Return a hashable snapshot of the filters dict."""
+    return tuple(
+        (key, tuple(sorted(value)) if isinstance(value, (list, set)) else value)
+        for key, value in sorted(filters.items())
+    )
+
+def _date_query(filters: Dict) -> str:
+    span = filters.get('_date_span') or f"{_compact_date(filters['date_from'])} TO {_compact_date(filters['date_to'])}"
+    return f"submittedDate:[{span}]"
+
+# (is_set, query part, summary line) per filter, in the order they appear in the query
+_FIELD_BUILDERS = (
+    (
+        lambda f: f.get('date_from') and f.get('date_to'),
+        _date_query,
+        lambda f: f"📅 Date: {f['date_from']} to {f['date_to']}"
+    ),
+    (
+        lambda f: f.get('author'),
+        lambda f: f'au:"{f["author"].strip()}"',
+        lambda f: f"👤 Author: {html.escape(f['author'])}"
+    ),
+    (
+        lambda f: f.get('min_citations'),
+        lambda f: f"citations:>={f['min_citations']}",
+        lambda f: f"📊 Min Citations: {f['min_citations']}"
+    ),
+    (
+        lambda f: f.get('categories'),
+        lambda f: f.get('_cat_frag') or _category_fragment(f['categories']),
+        lambda f: f"🔖 Categories: {', '.join(sorted(f['categories']))}"
+    ),
+)
+
 def handle_filter_execute(update: Update, context: CallbackContext) -> int:
     query = update.callback_query
     query.answer("🔍 Processing your search...")
     logger.info("Executing advanced search with filters")
 
     try:
-        filters = context.user_data.get('advanced_filters', {})
-        search_parts = []
-
-        if filters.get('date_from') and filters.get('date_to'):
-            date_from = filters['date_from'].replace('-', '')
-            date_to = filters['date_to'].replace('-', '')
-            search_parts.append(f"submittedDate:[{date_from} TO {date_to}]")
-
-        if filters.get('author'):
-            author = filters['author'].strip()
-            search_parts.append(f'au:"{author}"')
+        filters = get_filters(context)
 
-        if filters.get('min_citations'):
-            min_cites = filters['min_citations']
-            search_parts.append(f"citations:>={min_cites}")
+        # Re-submitting unchanged filters reuses the previously built query
+        filters_key = _filters_key(filters)
+        cached = context.user_data.get('_last_built_query')
+        if cached and cached[0] == filters_key:
+            _, search_query, filter_summary = cached
+        else:
+            search_parts = []
+            filter_summary = []
+            for is_set, build_query, build_summary in _FIELD_BUILDERS:
+                if is_set(filters):
+                    search_parts.append(build_query(filters))
+                    filter_summary.append(build_summary(filters))
 
-        if filters.get('categories'):
-            cats = ' OR '.join(f"cat:{cat.lower()}" for cat in filters['categories'])
-            if cats:
-                search_parts.append(f"({cats})")
+            search_query = ' AND '.join(search_parts)
+            context.user_data['_last_built_query'] = (filters_key, search_query, filter_summary)
 
-        if not search_parts:
+        if not search_query:
             query.edit_message_text(
                 "❌ Please set at least one filter before searching!\n\n"
                 "Use the buttons below to set your search filters.",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("« Back", callback_data="back_to_filters")
-                ]]),
-                parse_mode=ParseMode.MARKDOWN
+                reply_markup=_BACK_TO_FILTERS_MARKUP,
+                parse_mode=ParseMode.HTML
             )
             return CHOOSING_FILTER
 
-        search_query = ' AND '.join(search_parts)
-
-        filter_summary = []
-        if filters.get('date_from') and filters.get('date_to'):
-            filter_summary.append(f"📅 Date: {filters['date_from']} to {filters['date_to']}")
-        if filters.get('author'):
-            filter_summary.append(f"👤 Author: {filters['author']}")
-        if filters.get('min_citations'):
-            filter_summary.append(f"📊 Min Citations: {filters['min_citations']}")
-        if filters.get('categories'):
-            filter_summary.append(f"🔖 Categories: {', '.join(filters['categories'])}")
-
         query.edit_message_text(
-            f"🔍 *Processing Advanced Search*\n\n"
-            f"*Active Filters:*\n" + "\n".join(filter_summary) + "\n\n"
-            f"Query: `{search_query}`\n\n"
+            f"🔍 <b>Processing Advanced Search</b>\n\n"
+            f"<b>Active Filters:</b>\n" + "\n".join(filter_summary) + "\n\n"
+            f"Query: <code>{html.escape(search_query)}</code>\n\n"
             "Please wait...",
-            parse_mode=ParseMode.MARKDOWN
+            parse_mode=ParseMode.HTML
         )
 
-        from arXiv import execute_search
-
-        new_update = Update(update.update_id)
-        new_update.message = query.message
         context.user_data['last_search_query'] = search_query
-        context.args = [search_query]
 
-        execute_search(new_update, context)
+        # The arXiv round-trip runs on the dispatcher's worker pool so this
+        # handler returns immediately instead of blocking other updates
+        context.dispatcher.run_async(
+            _get_execute_search(), query.message, update.effective_user.id, context, search_query,
+            update=update
+        )
 
         return ConversationHandler.END
 
     except Exception as e:
-        logger.error(f"Error executing search: {str(e)}", exc_info=True)
-        query.edit_message_text(
+        logger.error("Error executing search: %s", e, exc_info=True)
+        _show_error(
+            update,
             "❌ An error occurred while searching.\n"
-            "Please try again or modify your filters.",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("« Back", callback_data="back_to_filters")
-            ]]),
-            parse_mode=ParseMode.MARKDOWN
+            "Please try again or modify your filters."
         )
         return ConversationHandler.END
 
@@ -593,7 +756,7 @@ def cancel_search(update: Update, context: CallbackContext) -> int:
                 "🚫 Search cancelled. Use /search to start a new search."
             )
     except Exception as e:
-        logger.error(f"Error canceling search: {str(e)}")
+        logger.error("Error canceling search: %s", e)
         if update.effective_message:
             update.effective_message.reply_text(
                 "❌ An error occurred. Please use /search to start over."
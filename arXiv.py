@@ -15,7 +15,9 @@ from telegram.ext import (
     CallbackContext,
     CallbackQueryHandler,
     ConversationHandler,
-    PreCheckoutQueryHandler
+    PreCheckoutQueryHandler,
+    ChatMemberHandler,
+    DispatcherHandlerStop
 )
 from arxiv_categories import ARXIV_CATEGORIES
 from advanced_search_handlers import (
@@ -41,7 +43,7 @@ from chat_handler import ChatHandler
 from document_handler import DocumentHandler
 import telegram
 from typing import Dict, List, Optional
-from telegram.error import TimedOut, NetworkError, BadRequest
+from telegram.error import TimedOut, NetworkError, BadRequest, RetryAfter, TelegramError
 import paper_comparison
 from voice_handler import VoiceSearchHandler
 from user_preferences import UserPreferences
@@ -51,11 +53,18 @@ import google.generativeai as genai
 import os
 from datetime import datetime, timedelta
 import requests
-from io import BytesIO
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from tempfile import SpooledTemporaryFile
 from dotenv import load_dotenv
 import time
 import random
-import json
+from functools import lru_cache
+from collections import OrderedDict, deque
+from types import MappingProxyType
+import threading
+import re
+import itertools
 from admin_handler import AdminManager
 import asyncio
 
@@ -81,13 +90,97 @@ TOKEN = os.getenv('TELEGRAM_TOKEN')
 if not TOKEN:
     raise ValueError("❌ Telegram token not found in environment variables!")
 
+# Public HTTPS base URL; when set, Telegram pushes updates to us instead of being polled
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_PORT = int(os.getenv('PORT', '8443'))
+
 MAX_PAPERS_TO_COMPARE = 3
 MAX_RESPONSE_LENGTH = 4096  # Telegram's message length limit
 RATE_LIMIT_DELAY = 1  # seconds between messages
+PROGRESS_EDIT_INTERVAL = 0.8  # minimum seconds between download progress edits
+COMPARE_FETCH_DELAY = 0.2  # seconds of "Add to Compare" clicks batched into one arXiv lookup
+MORE_RESULTS_DEBOUNCE = 0.3  # "More Results" clicks closer together than this share one edit
+QUESTION_BATCH_DELAY = 0.3  # seconds to wait for the rest of a question sent in several messages
+QUESTION_BATCH_DELAY_SHORT = 0.18  # wait after a short message, which is rarely followed by more
+QUESTION_BATCH_DELAY_SPLIT = 2.0  # wait after a message long enough that Telegram may have split it
+QUESTION_SHORT_LENGTH = 320
+QUESTION_SPLIT_LENGTH = 4000
+SEARCH_CACHE_TTL = 3600  # seconds an arXiv result list is reused for an identical query
+SEARCH_CACHE_SIZE = 256
+PAPER_CACHE_SIZE = 4096  # individual results kept for buttons on older result cards
+COMPARISON_CACHE_SIZE = 128  # finished comparisons, keyed by the set of papers compared
+PAPER_CARD_CACHE_SIZE = 4096
+SUMMARY_CACHE_SIZE = 4096  # Gemini summaries kept in memory, keyed by arXiv id
+UPDATER_WORKERS = 16  # threads for handlers that wait on arXiv, Gemini or PDF downloads
+HTTP_POOL_SIZE = UPDATER_WORKERS  # one pooled connection per worker thread
+POLL_TIMEOUT = 60  # seconds Telegram holds an idle getUpdates call open
+NOTIFICATION_SEARCH_LANES = 4  # notification queries searched at once, leaving workers for users
+NOTIFICATION_CHECK_INTERVAL = 3600  # seconds between notification sweeps; should_notify applies each user's frequency
+NOTIFICATION_CHECK_FIRST = 60  # seconds after startup before the first sweep
+# Bot API connections: one per worker plus the updater, job queue and dispatcher threads.
+# PTB warns and requests queue for a free connection if this drops below workers + 4.
+TELEGRAM_POOL_SIZE = UPDATER_WORKERS + 8
+TELEGRAM_CONNECT_TIMEOUT = 10  # seconds
+TELEGRAM_READ_TIMEOUT = 30  # seconds; PDF uploads routinely exceed PTB's 5s default
 
 # Channel config
 CHANNEL_USERNAME = "@TheodoreI1"  # For display purposes
 CHANNEL_ID = -1002412839333
+SUBSCRIPTION_CACHE_TTL = 300  # seconds a confirmed membership is trusted
+SUBSCRIPTION_CACHE_SIZE = 100_000
+SUBSCRIPTION_CHECKS_KEPT = 1024  # recent per-update answers; only the update in flight needs one
+
+# (normalized query, max_results, sort_by, sort_order) -> (expires_at, results), oldest first
+_SEARCH_CACHE: Dict[tuple, tuple] = OrderedDict()
+_SEARCH_CACHE_LOCK = threading.Lock()
+
+# arXiv short id -> (expires_at, result), oldest first
+_PAPER_CACHE: Dict[str, tuple] = OrderedDict()
+_PAPER_CACHE_LOCK = threading.Lock()
+
+# frozenset of entry ids -> comparison with its Gemini analysis, oldest first
+_COMPARISON_CACHE: Dict[frozenset, object] = OrderedDict()
+_COMPARISON_CACHE_LOCK = threading.Lock()
+
+# Reused across PDF downloads so repeat fetches from arxiv.org skip the TCP/TLS handshake
+_HTTP = requests.Session()
+_HTTP.headers.update({
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'application/pdf'
+})
+_HTTP.mount("https://", HTTPAdapter(
+    pool_connections=HTTP_POOL_SIZE,
+    pool_maxsize=HTTP_POOL_SIZE,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        respect_retry_after_header=True
+    )
+))
+
+# Invoice payloads stay unique within a process via the counter and across restarts via the prefix
+_PAYLOAD_PREFIX = f"{int(time.time())}_{os.getpid()}"
+_PAYLOAD_SEQ = itertools.count()
+
+# user_id -> monotonic time until which the user is known to be a member
+_SUBSCRIPTION_CACHE: Dict[int, float] = {}
+# user_id -> (update_id, result) of the last check made against Telegram, oldest first
+_SUBSCRIPTION_CHECKED: Dict[int, tuple] = OrderedDict()
+_SUBSCRIPTION_LOCK = threading.Lock()
+
+# arXiv short id -> rendered result card, oldest first
+_PAPER_CARDS: Dict[str, str] = OrderedDict()
+_PAPER_CARDS_LOCK = threading.Lock()
+
+# Guards the pending_question buffers, shared by the dispatcher and the job queue
+_QUESTION_LOCK = threading.Lock()
+# Guards the pending_compare_ids sets, filled by clicks and emptied by the job queue
+_COMPARE_LOCK = threading.Lock()
+
+# chat_id -> (handler, update, context) waiting to run; a chat is present while a worker drains it
+_CHAT_QUEUES: Dict[int, deque] = {}
+_CHAT_QUEUES_LOCK = threading.Lock()
 
 # Fun messages for non-subscribers
 JOIN_MESSAGES = [
@@ -171,7 +264,12 @@ HELP_MESSAGE = """
 Need more help? Feel free to ask! 🤖
 """
 
-ABOUT_MESSAGE = f"""
+ABOUT_FUN_FACTS = (
+    "🌟 *Fun fact:* $10 = 100 extra papers I can process daily!",
+    "🚀 *Pro tip:* Paid hosting = instant 24/7 access for everyone!",
+)
+
+_ABOUT_TEMPLATE = """
 **✨ Yo, what’s good? I’m PaperPilot!**
 Your AI-powered research dude, created by [Theodore](https://t.me/FirafisBekele) —a high school dev with cosmic ambitions. Let’s break it down:
 
@@ -193,10 +291,7 @@ Right now, I’m running on *free-tier hosting*:
 • 🐢 **Speed limits** (my brain’s *too* powerful for this)
 • 💸 **Funded by Theodore’s ramen budget** ( you know, high school life!)
 
-{random.choice([
-    "🌟 *Fun fact:* $10 = 100 extra papers I can process daily!",
-    "🚀 *Pro tip:* Paid hosting = instant 24/7 access for everyone!",
-])}
+{fun_fact}
 
 ---
 
@@ -208,31 +303,85 @@ Right now, I’m running on *free-tier hosting*:
 *"Let’s turn PDFs into pure knowledge fuel!"* 🔥
 """
 
+# Every fun-fact variant is rendered once; /about just picks one
+_ABOUT_VARIANTS = tuple(_ABOUT_TEMPLATE.format(fun_fact=fact) for fact in ABOUT_FUN_FACTS)
+
 class UserSession:
     def __init__(self):
         self.papers_to_compare = []
-        self.last_activity = datetime.utcnow()
+        self._day = int(time.time() // 86400)
         self.comparison_count = 0
         self.daily_limit = 10
+        # /compare runs on the worker pool, so guard the day/count pair
+        self._lock = threading.Lock()
 
     def can_compare(self) -> bool:
         """Check if user hasn't exceeded daily comparison limit."""
-        if (datetime.utcnow() - self.last_activity).days >= 1:
-            self.comparison_count = 0
-        return self.comparison_count < self.daily_limit
+        today = int(time.time() // 86400)
+        with self._lock:
+            if today != self._day:
+                self._day = today
+                self.comparison_count = 0
+            return self.comparison_count < self.daily_limit
 
     def record_comparison(self):
         """Record a comparison activity."""
-        self.comparison_count += 1
-        self.last_activity = datetime.utcnow()
+        today = int(time.time() // 86400)
+        with self._lock:
+            if today != self._day:
+                self._day = today
+                self.comparison_count = 0
+            self.comparison_count += 1
+
+def _remember_subscription(user_id: int) -> None:
+    now = time.monotonic()
+    with _SUBSCRIPTION_LOCK:
+        if len(_SUBSCRIPTION_CACHE) >= SUBSCRIPTION_CACHE_SIZE:
+            # Expired entries are only dropped once the cache is full
+            for uid in [uid for uid, until in _SUBSCRIPTION_CACHE.items() if until <= now]:
+                del _SUBSCRIPTION_CACHE[uid]
+            if len(_SUBSCRIPTION_CACHE) >= SUBSCRIPTION_CACHE_SIZE:
+                _SUBSCRIPTION_CACHE.pop(next(iter(_SUBSCRIPTION_CACHE)))
+        _SUBSCRIPTION_CACHE[user_id] = now + SUBSCRIPTION_CACHE_TTL
+
+def handle_channel_member_update(update: Update, context: CallbackContext) -> None:
+    """Drop the cached subscription of a user who left or was removed from the channel."""
+    member_update = update.chat_member
+    if member_update.chat.id != CHANNEL_ID:
+        return
+    if member_update.new_chat_member.status not in ['member', 'administrator', 'creator']:
+        with _SUBSCRIPTION_LOCK:
+            _SUBSCRIPTION_CACHE.pop(member_update.new_chat_member.user.id, None)
 
 def check_channel_subscription(update: Update, context: CallbackContext) -> bool:
     """Check if the user is subscribed to the channel."""
+    user_id = update.effective_user.id if update.effective_user else None
+    cached_until = _SUBSCRIPTION_CACHE.get(user_id)
+    if cached_until and cached_until > time.monotonic():
+        return True
+
+    # Handlers in several groups can check the same update; only the first one
+    # asks Telegram and sends the join prompt, the rest reuse its answer
+    with _SUBSCRIPTION_LOCK:
+        checked = _SUBSCRIPTION_CHECKED.get(user_id)
+        if checked and checked[0] == update.update_id:
+            return checked[1]
+
+    is_member = _query_channel_subscription(update, context)
+    with _SUBSCRIPTION_LOCK:
+        _SUBSCRIPTION_CHECKED[user_id] = (update.update_id, is_member)
+        _SUBSCRIPTION_CHECKED.move_to_end(user_id)
+        if len(_SUBSCRIPTION_CHECKED) > SUBSCRIPTION_CHECKS_KEPT:
+            _SUBSCRIPTION_CHECKED.popitem(last=False)
+    return is_member
+
+def _query_channel_subscription(update: Update, context: CallbackContext) -> bool:
     try:
         user_id = update.effective_user.id
         chat_member = context.bot.get_chat_member(chat_id=CHANNEL_ID, user_id=user_id)
 
         if chat_member.status in ['member', 'administrator', 'creator']:
+            _remember_subscription(user_id)
             return True
 
         keyboard = [[InlineKeyboardButton("🌟 Join Channel", url=f"https://t.me/{CHANNEL_USERNAME.replace('@', '')}")]]
@@ -263,16 +412,71 @@ def subscription_required(func):
             return func(update, context, *args, **kwargs)
     return wrapper
 
+def run_in_chat_order(update: Update, context: CallbackContext, func) -> None:
+    """Run func on the worker pool after any earlier queued work from the same chat."""
+    chat_id = update.effective_chat.id
+    with _CHAT_QUEUES_LOCK:
+        queue = _CHAT_QUEUES.get(chat_id)
+        if queue is not None:
+            queue.append((func, update, context))
+            return
+        _CHAT_QUEUES[chat_id] = deque([(func, update, context)])
+    context.dispatcher.run_async(_drain_chat_queue, chat_id, update=update)
+
+def _drain_chat_queue(chat_id: int) -> None:
+    while True:
+        with _CHAT_QUEUES_LOCK:
+            queue = _CHAT_QUEUES[chat_id]
+            if not queue:
+                del _CHAT_QUEUES[chat_id]
+                return
+            func, update, context = queue.popleft()
+        try:
+            func(update, context)
+        except Exception:
+            logger.exception(f"Error handling queued update for chat {chat_id}")
+
+def chat_ordered(func):
+    """Decorator running a slow handler off the dispatcher thread, one update at a time per chat."""
+    def wrapper(update: Update, context: CallbackContext):
+        run_in_chat_order(update, context, func)
+    return wrapper
+
+def author_names(paper) -> tuple:
+    """Return the paper's author names as a tuple, extracted once per result."""
+    names = getattr(paper, '_author_names', None)
+    if names is None:
+        names = paper._author_names = tuple(author.name for author in paper.authors)
+    return names
+
+def author_line(paper) -> str:
+    """Return the first three author names for display, formatted once per result."""
+    line = getattr(paper, '_author_line', None)
+    if line is None:
+        names = author_names(paper)
+        line = paper._author_line = ', '.join(names[:3]) + ('...' if len(names) > 3 else '')
+    return line
+
 def generate_paper_summary(paper):
     """Generate summary using Gemini."""
+    return _summary_for(
+        paper.get_short_id(),
+        paper.title,
+        author_names(paper),
+        paper.summary
+    )
+
+# Abstracts don't change, so a paper's summary can be shared by every user who asks
+@lru_cache(maxsize=SUMMARY_CACHE_SIZE)
+def _summary_for(short_id: str, title: str, authors: tuple, abstract: str) -> str:
     prompt = f"""
     Please provide a clear and engaging summary of this research paper:
 
-    Title: {paper.title}
-    Authors: {', '.join(str(author) for author in paper.authors)}
+    Title: {title}
+    Authors: {', '.join(authors)}
 
     Abstract:
-    {paper.summary}
+    {abstract}
 
     Please cover:
     1. Main research objective
@@ -287,38 +491,112 @@ def generate_paper_summary(paper):
     response = model.generate_content(prompt)
     return response.text
 
-def format_paper(paper) -> str:
-    """Format paper details with emojis and markdown."""
-    authors = [str(author) for author in paper.authors[:3]]
-    authors_text = ', '.join(authors)
-
-    safe_title = paper.title.replace('*', r'\*').replace('_', r'\_').replace('[', r'\[').replace(']', r'\]')
-    safe_category = paper.primary_category.replace('*', r'\*').replace('_', r'\_')
-    safe_summary = paper.summary[:300].replace('*', r'\*').replace('_', r'\_')
-
-    keyboard = [
-        [
-            InlineKeyboardButton("📚 Read Paper", url=f"https://arxiv.org/abs/{paper.get_short_id()}"),
-            InlineKeyboardButton("🤖 Summarize", callback_data=f"summarize_{paper.get_short_id()}")
-        ],
-        [
-            InlineKeyboardButton("📥 Download PDF", callback_data=f"download_{paper.get_short_id()}"),
-            InlineKeyboardButton("➕ Add to Compare", callback_data=f"compare_add_{paper.get_short_id()}")
-        ]
-    ]
-
-    return f"""
-📄 *Title:* {safe_title}
-👥 *Authors:* {authors_text} {'...' if len(paper.authors) > 3 else ''}
-📅 *Published:* {paper.published.strftime('%Y-%m-%d')}
-🏷️ *Categories:* {safe_category}
+def _cached_arxiv_search(query: str, max_results: int,
+                         sort_by=arxiv.SortCriterion.Relevance,
+                         sort_order=arxiv.SortOrder.Descending) -> list:
+    """Run an arXiv search, reusing results fetched for the same query recently."""
+    key = (' '.join(query.split()), max_results, sort_by, sort_order)
+    now = time.monotonic()
+    with _SEARCH_CACHE_LOCK:
+        cached = _SEARCH_CACHE.get(key)
+        if cached and cached[0] > now:
+            _SEARCH_CACHE.move_to_end(key)
+            return list(cached[1])
+
+    results = list(arxiv.Search(
+        query=query,
+        max_results=max_results,
+        sort_by=sort_by,
+        sort_order=sort_order
+    ).results())
+    for paper in results:
+        author_names(paper)
+    _remember_papers(results, now + SEARCH_CACHE_TTL)
+
+    with _SEARCH_CACHE_LOCK:
+        _SEARCH_CACHE[key] = (now + SEARCH_CACHE_TTL, results)
+        _SEARCH_CACHE.move_to_end(key)
+        while len(_SEARCH_CACHE) > SEARCH_CACHE_SIZE:
+            _SEARCH_CACHE.popitem(last=False)
+    return list(results)
+
+def _remember_papers(papers, expires_at: float) -> None:
+    """Store results so later button presses can find them without refetching."""
+    with _PAPER_CACHE_LOCK:
+        for paper in papers:
+            short_id = paper.get_short_id()
+            _PAPER_CACHE[short_id] = (expires_at, paper)
+            _PAPER_CACHE.move_to_end(short_id)
+        while len(_PAPER_CACHE) > PAPER_CACHE_SIZE:
+            _PAPER_CACHE.popitem(last=False)
+
+def known_paper(paper_id: str, context: CallbackContext):
+    """Return the arXiv result for paper_id if it is already in memory, else None."""
+    search_state = context.user_data.get('search_state')
+    if search_state:
+        for paper in search_state['results']:
+            if paper.get_short_id() == paper_id:
+                return paper
+
+    with _PAPER_CACHE_LOCK:
+        cached = _PAPER_CACHE.get(paper_id)
+        if cached and cached[0] > time.monotonic():
+            _PAPER_CACHE.move_to_end(paper_id)
+            return cached[1]
+    return None
+
+def fetch_papers(paper_ids) -> list:
+    """Fetch several papers from arXiv in a single request and remember them."""
+    papers = list(arxiv.Search(id_list=list(paper_ids)).results())
+    for paper in papers:
+        author_names(paper)
+    _remember_papers(papers, time.monotonic() + SEARCH_CACHE_TTL)
+    return papers
+
+def get_paper(paper_id: str, context: CallbackContext):
+    """Return the arXiv result for paper_id, fetching it only if it isn't already known."""
+    paper = known_paper(paper_id, context)
+    if paper is None:
+        paper = fetch_papers([paper_id])[0]
+    return paper
+
+# Single-pass escape tables for legacy Markdown in paper cards
+_MD_ESCAPE = str.maketrans({'*': r'\*', '_': r'\_'})
+_MD_TITLE_ESCAPE = str.maketrans({'*': r'\*', '_': r'\_', '[': r'\[', ']': r'\]'})
+
+_PAPER_CARD_TEMPLATE = """
+📄 *Title:* {title}
+👥 *Authors:* {authors}
+📅 *Published:* {published}
+🏷️ *Categories:* {category}
 
 📝 *Abstract:*
-{safe_summary}...
+{summary}...
 
-🔗 [Read Full Paper]({paper.pdf_url})
+🔗 [Read Full Paper]({pdf_url})
 """
 
+def format_paper(paper) -> str:
+    """Format paper details with emojis and markdown."""
+    short_id = paper.get_short_id()
+    with _PAPER_CARDS_LOCK:
+        card = _PAPER_CARDS.get(short_id)
+    if card is None:
+        # Cards depend only on immutable paper fields, so each is rendered once
+        card = _PAPER_CARD_TEMPLATE.format(
+            title=paper.title.translate(_MD_TITLE_ESCAPE),
+            authors=author_line(paper),
+            published=paper.published.strftime('%Y-%m-%d'),
+            category=paper.primary_category.translate(_MD_ESCAPE),
+            summary=paper.summary[:300].translate(_MD_ESCAPE),
+            pdf_url=paper.pdf_url
+        )
+        with _PAPER_CARDS_LOCK:
+            _PAPER_CARDS[short_id] = card
+            while len(_PAPER_CARDS) > PAPER_CARD_CACHE_SIZE:
+                _PAPER_CARDS.popitem(last=False)
+    return card
+
 @subscription_required
 def start(update: Update, context: CallbackContext) -> None:
     """Send welcome message when /start is issued."""
@@ -335,37 +613,31 @@ def help_command(update: Update, context: CallbackContext) -> None:
         parse_mode=ParseMode.MARKDOWN
     )
 
+_ABOUT_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("💰 Support PaperPilot", callback_data="show_support_options")]
+])
+
 @subscription_required
 def about_command(update: Update, context: CallbackContext) -> None:
     """Show information about the bot."""
-    keyboard = [
-        [
-            InlineKeyboardButton("💰 Support PaperPilot",callback_data="show_support_options")
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
     update.message.reply_text(
-        ABOUT_MESSAGE,
+        random.choice(_ABOUT_VARIANTS),
         parse_mode=ParseMode.MARKDOWN,
-        reply_markup=reply_markup,
+        reply_markup=_ABOUT_MARKUP,
         disable_web_page_preview=True
     )
 
-def handle_support_options(update: Update, context: CallbackContext) -> None:
-    """Handle support button clicks and show payment options."""
-    query = update.callback_query
-    query.answer()
-
-    if query.data == "show_support_options":
-        thank_you_message = """
+# callback_data -> (text, markup) for the static support screens
+_SUPPORT_SCREENS = {
+    "show_support_options": (
+        """
 ✨ *A Heartfelt Thank You!* ✨
 
 Your consideration to support PaperPilot means the world to me! It's amazing to see people who believe in making research accessible to everyone. Your support will help keep this bot running 24/7 and enable us to add even more exciting features!
 
 Choose your preferred way to help:
-"""
-        keyboard = [
+""",
+        InlineKeyboardMarkup([
             [InlineKeyboardButton(
                 "⭐️ Stars - Support via Telegram",
                 callback_data="stars_donation"
@@ -382,24 +654,17 @@ Choose your preferred way to help:
                 "🔙 Back",
                 callback_data="back_to_about"
             )]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
-        query.message.edit_text(
-            thank_you_message,
-            parse_mode=ParseMode.MARKDOWN,
-            reply_markup=reply_markup
-        )
-
-    elif query.data == "stars_donation":
-        stars_message = """
+        ])
+    ),
+    "stars_donation": (
+        """
 🌟 *Support PaperPilot with Telegram Stars* 🌟
 
 Ready to help keep PaperPilot flying high? Click below to choose your donation amount!
 
 Your support fuels 24/7 research awesomeness! 🚀
-"""
-        keyboard = [
+""",
+        InlineKeyboardMarkup([
             [InlineKeyboardButton(
                 "💸 Donate with Stars",
                 callback_data="start_stars_donation"
@@ -408,17 +673,10 @@ Your support fuels 24/7 research awesomeness! 🚀
                 "🔙 Back to Options",
                 callback_data="show_support_options"
             )]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
-        query.message.edit_text(
-            stars_message,
-            parse_mode=ParseMode.MARKDOWN,
-            reply_markup=reply_markup
-        )
-
-    elif query.data == "show_telebirr_info":
-        telebirr_message = """
+        ])
+    ),
+    "show_telebirr_info": (
+        """
 📱 *Telebirr Payment Details*
 
 You can support PaperPilot directly through Telebirr:
@@ -428,12 +686,21 @@ You can support PaperPilot directly through Telebirr:
 💫 *Message:* PaperPilot Support
 
 _Thank you for helping keep the research flowing!_ ✨
-"""
-        keyboard = [[InlineKeyboardButton("🔙 Back to Options", callback_data="show_support_options")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+""",
+        InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back to Options", callback_data="show_support_options")]])
+    ),
+}
+
+def handle_support_options(update: Update, context: CallbackContext) -> None:
+    """Handle support button clicks and show payment options."""
+    query = update.callback_query
+    query.answer()
 
+    screen = _SUPPORT_SCREENS.get(query.data)
+    if screen:
+        text, reply_markup = screen
         query.message.edit_text(
-            telebirr_message,
+            text,
             parse_mode=ParseMode.MARKDOWN,
             reply_markup=reply_markup
         )
@@ -523,7 +790,7 @@ def confirm_stars_donation(update: Update, context: CallbackContext) -> None:
         user = update.effective_user
 
         # Create invoice payload with unique identifier
-        payload = f"donation_{user.id}_{int(time.time())}"
+        payload = f"donation_{user.id}_{_PAYLOAD_PREFIX}_{next(_PAYLOAD_SEQ)}"
 
         # Create labeled price (amount in cents)
         prices = [LabeledPrice(f"PaperPilot Donation ({amount} Stars)", amount * 100)]
@@ -608,7 +875,7 @@ def add_support_handlers(dispatcher):
     """Add support-related handlers to the dispatcher."""
     dispatcher.add_handler(CallbackQueryHandler(
         handle_support_options,
-        pattern='^(show_support_options|show_telebirr_info|back_to_about|stars_donation)$'
+        pattern='^(?:show_support_options|show_telebirr_info|back_to_about|stars_donation)$'
     ))
 
 def add_stars_handlers(dispatcher):
@@ -619,7 +886,7 @@ def add_stars_handlers(dispatcher):
     ))
     dispatcher.add_handler(CallbackQueryHandler(
         confirm_stars_donation,
-        pattern='^confirm_stars_\d+$'
+        pattern=r'^confirm_stars_\d+$'
     ))
 
 def add_payment_handlers(dispatcher):
@@ -633,100 +900,116 @@ def admin_command(update: Update, context: CallbackContext) -> None:
     admin_manager = context.bot_data['admin_manager']
     admin_manager.show_admin_panel(update, context)
 
+def _handle_broadcast_type(admin_manager: AdminManager, update: Update, context: CallbackContext) -> None:
+    context.user_data['broadcast_type'] = update.callback_query.data.split('_')[2]
+    update.callback_query.edit_message_text(
+        text="📢 Please send your broadcast message now (text, photo, video, or document).\n"
+             "Send /cancel to abort the broadcast.",
+        parse_mode=ParseMode.MARKDOWN
+    )
+
+def _handle_broadcast_users(admin_manager: AdminManager, update: Update, context: CallbackContext) -> None:
+    action = update.callback_query.data.split('_')[2]
+    if action in ['prev', 'next']:
+        context.user_data['broadcast_user_page'] = context.user_data.get('broadcast_user_page', 0) + (1 if action == 'next' else -1)
+        admin_manager.show_user_selection(update, context)
+
+# Exact callback_data matches are checked first, then the prefix families in order
+_ADMIN_EXACT = {
+    "admin_panel": AdminManager.show_admin_panel,
+    "admin_stats": AdminManager.handle_stats,
+    "admin_users": AdminManager.handle_users,
+    "admin_restrictions": AdminManager.handle_restrictions,
+    "admin_admins": AdminManager.handle_admin_management,
+    "admin_broadcast": AdminManager.handle_broadcast,
+}
+
+_ADMIN_PREFIX = (
+    ("restrict_", AdminManager.handle_restriction_action),
+    ("admin_", AdminManager.handle_admin_action),
+    ("users_", AdminManager.handle_user_navigation),
+    ("broadcast_target_", AdminManager.handle_broadcast_target),
+    ("broadcast_select_", AdminManager.handle_user_selection),
+    ("broadcast_type_", _handle_broadcast_type),
+    ("broadcast_users_", _handle_broadcast_users),
+)
+
+# One compiled alternation resolves the prefix family in a single match
+_ADMIN_PREFIX_RE = re.compile('^(' + '|'.join(re.escape(prefix) for prefix, _ in _ADMIN_PREFIX) + ')')
+_ADMIN_PREFIX_HANDLERS = dict(_ADMIN_PREFIX)
+
 def handle_admin_callback(update: Update, context: CallbackContext) -> None:
     """Handle admin panel callback queries."""
     query = update.callback_query
     admin_manager = context.bot_data['admin_manager']
 
-    if query.data == "admin_panel":
-        admin_manager.show_admin_panel(update, context)
-    elif query.data == "admin_stats":
-        admin_manager.handle_stats(update, context)
-    elif query.data == "admin_users":
-        admin_manager.handle_users(update, context)
-    elif query.data == "admin_restrictions":
-        admin_manager.handle_restrictions(update, context)
-    elif query.data == "admin_admins":
-        admin_manager.handle_admin_management(update, context)
-    elif query.data == "admin_broadcast":
-        admin_manager.handle_broadcast(update, context)
-    elif query.data.startswith("restrict_"):
-        admin_manager.handle_restriction_action(update, context)
-    elif query.data.startswith("admin_"):
-        admin_manager.handle_admin_action(update, context)
-    elif query.data.startswith("users_"):
-        admin_manager.handle_user_navigation(update, context)
-    elif query.data.startswith("broadcast_"):
-        # Handle broadcast-related callbacks
-        if query.data.startswith("broadcast_target_"):
-            admin_manager.handle_broadcast_target(update, context)
-        elif query.data.startswith("broadcast_select_"):
-            admin_manager.handle_user_selection(update, context)
-        elif query.data.startswith("broadcast_type_"):
-            context.user_data['broadcast_type'] = query.data.split('_')[2]
-            query.edit_message_text(
-                text="📢 Please send your broadcast message now (text, photo, video, or document).\n"
-                     "Send /cancel to abort the broadcast.",
-                parse_mode=ParseMode.MARKDOWN
-            )
-        elif query.data.startswith("broadcast_users_"):
-            action = query.data.split('_')[2]
-            if action in ['prev', 'next']:
-                context.user_data['broadcast_user_page'] = context.user_data.get('broadcast_user_page', 0) + (1 if action == 'next' else -1)
-                admin_manager.show_user_selection(update, context)
+    handler = _ADMIN_EXACT.get(query.data)
+    if handler is None:
+        match = _ADMIN_PREFIX_RE.match(query.data)
+        handler = _ADMIN_PREFIX_HANDLERS[match.group(1)] if match else None
+    if handler:
+        handler(admin_manager, update, context)
 
     # Prevent "loading" animation from getting stuck
     if not query.data.startswith("broadcast_select_"):
         query.answer()
 
-def handle_restriction_input(update: Update, context: CallbackContext) -> None:
-    """Handle user input for restrictions."""
-    admin_manager = context.bot_data['admin_manager']
-    message = update.message.text
-
-    if context.user_data.get('expecting_restriction'):
-        try:
-            user_id, duration, *reason = message.split()
-            admin_manager.restrict_user(update, context, int(user_id), int(duration))
-            update.message.reply_text(f"✅ User {user_id} has been restricted for {duration} hours.")
-        except:
-            update.message.reply_text("❌ Invalid format. Please use: `username/ID duration_in_hours reason`")
+def _restrict_from_input(admin_manager: AdminManager, update: Update, context: CallbackContext) -> None:
+    try:
+        parts = update.message.text.split()
+        user_id, duration = int(parts[0]), int(parts[1])
+    except (ValueError, IndexError):
+        update.message.reply_text("❌ Invalid format. Please use: `username/ID duration_in_hours reason`")
+    else:
+        admin_manager.restrict_user(update, context, user_id, duration)
+        update.message.reply_text(f"✅ User {user_id} has been restricted for {duration} hours.")
 
-    elif context.user_data.get('expecting_block'):
-        try:
-            user_id, *reason = message.split()
-            admin_manager.block_user(update, context, int(user_id))
-            update.message.reply_text(f"⛔️ User {user_id} has been blocked.")
-        except:
-            update.message.reply_text("❌ Invalid format. Please use: `username/ID reason`")
+def _block_from_input(admin_manager: AdminManager, update: Update, context: CallbackContext) -> None:
+    try:
+        user_id = int(update.message.text.split()[0])
+    except (ValueError, IndexError):
+        update.message.reply_text("❌ Invalid format. Please use: `username/ID reason`")
+    else:
+        admin_manager.block_user(update, context, user_id)
+        update.message.reply_text(f"⛔️ User {user_id} has been blocked.")
 
-    elif context.user_data.get('expecting_unrestrict'):
-        try:
-            user_id = int(message.strip())
-            admin_manager.unblock_user(update, context, user_id)
-            update.message.reply_text(f"✅ User {user_id} has been unrestricted.")
-        except:
-            update.message.reply_text("❌ Invalid format. Please use: `username/ID`")
+def _unrestrict_from_input(admin_manager: AdminManager, update: Update, context: CallbackContext) -> None:
+    try:
+        user_id = int(update.message.text.strip())
+    except ValueError:
+        update.message.reply_text("❌ Invalid format. Please use: `username/ID`")
+    else:
+        admin_manager.unblock_user(update, context, user_id)
+        update.message.reply_text(f"✅ User {user_id} has been unrestricted.")
 
-    # Clear expectation flags
-    context.user_data.pop('expecting_restriction', None)
-    context.user_data.pop('expecting_block', None)
-    context.user_data.pop('expecting_unrestrict', None)
+# user_data['admin_action'] set by the restrictions menu -> handler for the text the admin sends next
+_ADMIN_INPUT_ACTIONS = {
+    'restriction': _restrict_from_input,
+    'block': _block_from_input,
+    'unrestrict': _unrestrict_from_input,
+}
 
-@subscription_required
-def model_command(update: Update, context: CallbackContext) -> None:
-    """Show available AI models for paper summarization."""
-    keyboard = [
-        [InlineKeyboardButton("🌟 Gemini 1.5 Pro (Default) ✓", callback_data="model_gemini")],
-        [InlineKeyboardButton("🤖 GPT-4 Turbo", callback_data="model_gpt4")],
-        [InlineKeyboardButton("🧠 Claude 3 Opus", callback_data="model_claude3")],
-        [InlineKeyboardButton("⚡ PaLM 2", callback_data="model_palm2")],
-        [InlineKeyboardButton("🔮 Llama 2 70B", callback_data="model_llama2")],
-        [InlineKeyboardButton("🎯 Mistral Large", callback_data="model_mistral")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+def handle_restriction_input(update: Update, context: CallbackContext) -> None:
+    """Handle user input for restrictions."""
+    handler = _ADMIN_INPUT_ACTIONS.get(context.user_data.get('admin_action'))
+    if handler is None:
+        return
 
-    message = """
+    context.user_data.pop('admin_action', None)
+    handler(context.bot_data['admin_manager'], update, context)
+    # The input was for the admin panel; keep it away from search and Q&A
+    raise DispatcherHandlerStop()
+
+_MODEL_MENU_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🌟 Gemini 1.5 Pro (Default) ✓", callback_data="model_gemini")],
+    [InlineKeyboardButton("🤖 GPT-4 Turbo", callback_data="model_gpt4")],
+    [InlineKeyboardButton("🧠 Claude 3 Opus", callback_data="model_claude3")],
+    [InlineKeyboardButton("⚡ PaLM 2", callback_data="model_palm2")],
+    [InlineKeyboardButton("🔮 Llama 2 70B", callback_data="model_llama2")],
+    [InlineKeyboardButton("🎯 Mistral Large", callback_data="model_mistral")]
+])
+
+_MODEL_MENU_TEXT = """
 🤖 *AI Model Selection*
 
 Choose your preferred AI model for paper summarization:
@@ -744,43 +1027,44 @@ Each model has its own strengths:
 _Note: Additional models coming soon!_
 """
 
+_BACK_TO_MODELS_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("« Back to Model Selection", callback_data="back_to_models")]
+])
+
+@subscription_required
+def model_command(update: Update, context: CallbackContext) -> None:
+    """Show available AI models for paper summarization."""
     # Check if this is a callback query
     if update.callback_query:
         update.callback_query.answer()  # Answer the callback query
         update.callback_query.edit_message_text(
-            text=message,
-            reply_markup=reply_markup,
+            text=_MODEL_MENU_TEXT,
+            reply_markup=_MODEL_MENU_MARKUP,
             parse_mode=ParseMode.MARKDOWN
         )
     else:
         # This is a direct command
         update.message.reply_text(
-            text=message,
-            reply_markup=reply_markup,
+            text=_MODEL_MENU_TEXT,
+            reply_markup=_MODEL_MENU_MARKUP,
             parse_mode=ParseMode.MARKDOWN
         )
 
 @subscription_required
 def chat_command(update: Update, context: CallbackContext) -> None:
     """Start a chat session with PaperPilot."""
-    if 'chat_handler' not in context.bot_data:
-        context.bot_data['chat_handler'] = ChatHandler()
     context.bot_data['chat_handler'].start_chat(update, context)
 
 def handle_chat_message(update: Update, context: CallbackContext) -> None:
     """Handle messages in chat mode."""
     if not check_channel_subscription(update, context):
         return
-    if 'chat_handler' not in context.bot_data:
-        context.bot_data['chat_handler'] = ChatHandler()
     context.bot_data['chat_handler'].handle_message(update, context, model)
 
 def end_chat_command(update: Update, context: CallbackContext) -> None:
     """End the chat session."""
     if not check_channel_subscription(update, context):
         return
-    if 'chat_handler' not in context.bot_data:
-        context.bot_data['chat_handler'] = ChatHandler()
     context.bot_data['chat_handler'].end_chat(update, context)
 
 def handle_model_selection(update: Update, context: CallbackContext) -> None:
@@ -803,12 +1087,9 @@ This model will be integrated soon! Currently using:
 
 Stay tuned for updates!
 """
-        keyboard = [[InlineKeyboardButton("« Back to Model Selection", callback_data="back_to_models")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
         query.edit_message_text(
             message,
-            reply_markup=reply_markup,
+            reply_markup=_BACK_TO_MODELS_MARKUP,
             parse_mode=ParseMode.MARKDOWN
         )
         return
@@ -824,12 +1105,9 @@ Current active model for:
 
 Optimized for research paper understanding!
 """
-    keyboard = [[InlineKeyboardButton("« Back to Model Selection", callback_data="back_to_models")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
     query.edit_message_text(
         message,
-        reply_markup=reply_markup,
+        reply_markup=_BACK_TO_MODELS_MARKUP,
         parse_mode=ParseMode.MARKDOWN
     )
 
@@ -846,6 +1124,24 @@ def create_paper_keyboard(paper_id: str) -> InlineKeyboardMarkup:
     ]
     return InlineKeyboardMarkup(keyboard)
 
+_SEARCH_OPTIONS_MARKUP = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("🔍 Simple Search", callback_data="simple_search"),
+        InlineKeyboardButton("🔬 Advanced Search", callback_data="advanced_search")
+    ]
+])
+
+_SEARCH_OPTIONS_TEXT = (
+    "*ArXiv Paper Search*\n\n"
+    "Choose your search method:\n\n"
+    "🔍 *Simple Search:* Search papers directly by keywords\n"
+    "🔬 *Advanced Search:* Use filters for date, author, citations, etc."
+)
+
+_BACK_TO_SEARCH_OPTIONS_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("« Back", callback_data="back_to_search_options")]
+])
+
 @subscription_required
 def handle_search(update: Update, context: CallbackContext) -> None:
     """Handle the /search command - provides option for simple or advanced search"""
@@ -856,24 +1152,9 @@ def handle_search(update: Update, context: CallbackContext) -> None:
         return
 
     # If no arguments, show search options menu
-    keyboard = [
-        [
-            InlineKeyboardButton("🔍 Simple Search", callback_data="simple_search"),
-            InlineKeyboardButton("🔬 Advanced Search", callback_data="advanced_search")
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    message = (
-        "*ArXiv Paper Search*\n\n"
-        "Choose your search method:\n\n"
-        "🔍 *Simple Search:* Search papers directly by keywords\n"
-        "🔬 *Advanced Search:* Use filters for date, author, citations, etc."
-    )
-
     update.message.reply_text(
-        message,
-        reply_markup=reply_markup,
+        _SEARCH_OPTIONS_TEXT,
+        reply_markup=_SEARCH_OPTIONS_MARKUP,
         parse_mode=ParseMode.MARKDOWN
     )
 
@@ -889,15 +1170,12 @@ def handle_search_options(update: Update, context: CallbackContext) -> None:
 
     try:
         if query.data == "simple_search":
-            keyboard = [[InlineKeyboardButton("« Back", callback_data="back_to_search_options")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-
             query.edit_message_text(
                 "*Enter your search terms:*\n\n"
                 "📝 Type your search keywords below\n"
                 "Example: `machine learning neural networks`\n\n"
                 "_Hit « Back to return to search options_",
-                reply_markup=reply_markup,
+                reply_markup=_BACK_TO_SEARCH_OPTIONS_MARKUP,
                 parse_mode=ParseMode.MARKDOWN
             )
             context.user_data['awaiting_simple_search'] = True
@@ -907,24 +1185,9 @@ def handle_search_options(update: Update, context: CallbackContext) -> None:
             return show_advanced_search_menu(update, context)
 
         elif query.data == "back_to_search_options":
-            keyboard = [
-                [
-                    InlineKeyboardButton("🔍 Simple Search", callback_data="simple_search"),
-                    InlineKeyboardButton("🔬 Advanced Search", callback_data="advanced_search")
-                ]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-
-            message = (
-                "*ArXiv Paper Search*\n\n"
-                "Choose your search method:\n\n"
-                "🔍 *Simple Search:* Search papers directly by keywords\n"
-                "🔬 *Advanced Search:* Use filters for date, author, citations, etc."
-            )
-
             query.edit_message_text(
-                message,
-                reply_markup=reply_markup,
+                _SEARCH_OPTIONS_TEXT,
+                reply_markup=_SEARCH_OPTIONS_MARKUP,
                 parse_mode=ParseMode.MARKDOWN
             )
     except Exception as e:
@@ -954,6 +1217,30 @@ def handle_simple_search_input(update: Update, context: CallbackContext) -> None
     context.args = query.split()
     execute_search(update, context)
 
+# Read-only stand-in for a user who hasn't set any filters yet
+_NO_FILTERS = MappingProxyType({
+    'date_from': None,
+    'date_to': None,
+    'author': None,
+    'min_citations': None,
+    'categories': ()
+})
+
+_FILTER_MENU_MARKUP = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("📅 Date Range", callback_data="filter_date"),
+        InlineKeyboardButton("👤 Author", callback_data="filter_author")
+    ],
+    [
+        InlineKeyboardButton("📊 Citations", callback_data="filter_citations"),
+        InlineKeyboardButton("🔖 Categories", callback_data="filter_categories")
+    ],
+    [
+        InlineKeyboardButton("🔍 Execute Search", callback_data="execute_search"),
+        InlineKeyboardButton("« Back", callback_data="back_to_search_options")
+    ]
+])
+
 def handle_advanced_search_menu(update: Update, context: CallbackContext) -> int:
     """Show advanced search filters menu"""
     query = update.callback_query
@@ -963,35 +1250,13 @@ def handle_advanced_search_menu(update: Update, context: CallbackContext) -> int
     logger.info("Showing advanced search menu")  # Add logging
 
     # Get current filters from user data
-    filters = context.user_data.get('advanced_filters', {
-        'date_from': None,
-        'date_to': None,
-        'author': None,
-        'min_citations': None,
-        'categories': []
-    })
-
-    keyboard = [
-        [
-            InlineKeyboardButton("📅 Date Range", callback_data="filter_date"),
-            InlineKeyboardButton("👤 Author", callback_data="filter_author")
-        ],
-        [
-            InlineKeyboardButton("📊 Citations", callback_data="filter_citations"),
-            InlineKeyboardButton("🔖 Categories", callback_data="filter_categories")
-        ],
-        [
-            InlineKeyboardButton("🔍 Execute Search", callback_data="execute_search"),
-            InlineKeyboardButton("« Back", callback_data="back_to_search_options")
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    filters = context.user_data.get('advanced_filters', _NO_FILTERS)
 
     # Format current filters for display
     date_range = f"{filters['date_from']} to {filters['date_to']}" if filters['date_from'] else "Not set"
     author = filters['author'] or "Not set"
     citations = filters['min_citations'] or "Not set"
-    categories = ", ".join(filters['categories']) if filters['categories'] else "Not set"
+    categories = ", ".join(sorted(filters['categories'])) if filters['categories'] else "Not set"
 
     message = (
         "*Advanced Search Filters* 🔬\n\n"
@@ -1006,13 +1271,13 @@ def handle_advanced_search_menu(update: Update, context: CallbackContext) -> int
     if query:
         query.edit_message_text(
             message,
-            reply_markup=reply_markup,
+            reply_markup=_FILTER_MENU_MARKUP,
             parse_mode=ParseMode.MARKDOWN
         )
     else:
         update.message.reply_text(
             message,
-            reply_markup=reply_markup,
+            reply_markup=_FILTER_MENU_MARKUP,
             parse_mode=ParseMode.MARKDOWN
         )
 
@@ -1029,16 +1294,20 @@ def execute_search(update: Update, context: CallbackContext) -> None:
         return
 
     query = ' '.join(context.args) if context.args else context.user_data.get('last_search_query', '')
-    loading_message = update.message.reply_text("🔍 Searching papers... Please wait...")
+    execute_search_with_query(update.message, update.effective_user.id, context, query)
+
+def execute_search_with_query(message, user_id: int, context: CallbackContext, query: str) -> None:
+    """Search arXiv for query and reply to message with the first result."""
+    loading_message = message.reply_text("🔍 Searching papers... Please wait...")
 
     try:
         # Get user preferences
         pref_manager = ensure_preferences_initialized(context)
-        user_prefs = pref_manager.get_preferences(update.effective_user.id)
+        user_prefs = pref_manager.get_preferences(user_id)
         max_results = user_prefs.get('max_results', 10)
 
-        # Build search query with filters
-        search_query_parts = [query]  # Start with the base query
+        # Build search query with filters, each part already parenthesized
+        search_query_parts = [f"({query})"] if query else []  # Start with the base query
 
         # Add advanced filters if they exist
         if 'advanced_filters' in context.user_data:
@@ -1048,12 +1317,12 @@ def execute_search(update: Update, context: CallbackContext) -> None:
             if filters.get('date_from') and filters.get('date_to'):
                 date_from = filters['date_from'].replace('-', '')
                 date_to = filters['date_to'].replace('-', '')
-                search_query_parts.append(f"submittedDate:[{date_from} TO {date_to}]")
+                search_query_parts.append(f"(submittedDate:[{date_from} TO {date_to}])")
 
             # Add author filter
             if filters.get('author'):
                 author = filters['author'].strip()
-                search_query_parts.append(f'au:"{author}"')
+                search_query_parts.append(f'(au:"{author}")')
 
             # Add category filters - Updated for new category system
             if filters.get('categories'):
@@ -1061,23 +1330,16 @@ def execute_search(update: Update, context: CallbackContext) -> None:
                 search_query_parts.append(f"({category_filter})")
 
         # Combine all parts with AND
-        final_query = ' AND '.join(f"({part})" for part in search_query_parts if part)
+        final_query = ' AND '.join(search_query_parts)
 
         # Log the query for debugging
         logger.info(f"Searching with query: {final_query}")
 
-        # Create the search object
-        search = arxiv.Search(
-            query=final_query,
-            max_results=max_results,
-            sort_by=arxiv.SortCriterion.Relevance
-        )
-
-        results = list(search.results())
+        results = _cached_arxiv_search(final_query, max_results)
 
         if not results:
             # Provide detailed feedback
-            message = (
+            feedback = (
                 "❌ No papers found matching your query and filters.\n\n"
                 "Try:\n"
                 "• Using different search terms\n"
@@ -1089,9 +1351,9 @@ def execute_search(update: Update, context: CallbackContext) -> None:
             # Add category information if present
             if 'advanced_filters' in context.user_data and context.user_data['advanced_filters'].get('categories'):
                 cats = context.user_data['advanced_filters']['categories']
-                message += f"Categories: {', '.join(cats)}\n"
+                feedback += f"Categories: {', '.join(cats)}\n"
 
-            loading_message.edit_text(message)
+            loading_message.edit_text(feedback)
             return
 
         context.user_data['search_state'] = {
@@ -1101,7 +1363,7 @@ def execute_search(update: Update, context: CallbackContext) -> None:
         }
 
         loading_message.delete()
-        show_paper_result(update, context, context.user_data['search_state'], is_new_search=True)
+        show_paper_result(message, context, context.user_data['search_state'], is_new_search=True)
 
     except Exception as e:
         logger.error(f"Search error: {str(e)}")
@@ -1115,6 +1377,25 @@ def execute_search(update: Update, context: CallbackContext) -> None:
         )
         loading_message.edit_text(error_message)
 
+_MORE_RESULTS_ROW = [InlineKeyboardButton("➡️ More Results", callback_data="more_results")]
+
+@lru_cache(maxsize=PAPER_CARD_CACHE_SIZE)
+def paper_result_markup(paper_id: str, has_more: bool) -> InlineKeyboardMarkup:
+    """Build the action keyboard shown under a search result."""
+    keyboard = [
+        [
+            InlineKeyboardButton("📚 Read Paper", url=f"https://arxiv.org/abs/{paper_id}"),
+            InlineKeyboardButton("🤖 Summarize", callback_data=f"summarize_{paper_id}")
+        ],
+        [
+            InlineKeyboardButton("📥 Download PDF", callback_data=f"download_{paper_id}"),
+            InlineKeyboardButton("➕ Add to Compare", callback_data=f"compare_add_{paper_id}")
+        ]
+    ]
+    if has_more:
+        keyboard.append(_MORE_RESULTS_ROW)
+    return InlineKeyboardMarkup(keyboard)
+
 def handle_more_results(update: Update, context: CallbackContext) -> None:
     """Handle 'More Results' button click."""
     query = update.callback_query
@@ -1126,36 +1407,29 @@ def handle_more_results(update: Update, context: CallbackContext) -> None:
         query.answer("❌ No active search session. Please start a new search.")
         return
 
-    context.user_data['search_state']['current_index'] += 1
-    current_index = context.user_data['search_state']['current_index']
-    results = context.user_data['search_state']['results']
-
-    if current_index >= len(results):
+    search_state = context.user_data['search_state']
+    if search_state['current_index'] + 1 >= len(search_state['results']):
         query.answer("🏁 You've reached the end of results!")
         return
 
-    paper = results[current_index]
-
-    # Create keyboard with all buttons including Add to Compare
-    keyboard = [
-        [
-            InlineKeyboardButton("📚 Read Paper", url=f"https://arxiv.org/abs/{paper.get_short_id()}"),
-            InlineKeyboardButton("🤖 Summarize", callback_data=f"summarize_{paper.get_short_id()}")
-        ],
-        [
-            InlineKeyboardButton("📥 Download PDF", callback_data=f"download_{paper.get_short_id()}"),
-            InlineKeyboardButton("➕ Add to Compare", callback_data=f"compare_add_{paper.get_short_id()}")
-        ]
-    ]
-
-    # Add More Results button if there are more papers
-    if current_index < len(results) - 1:
-        keyboard.append([InlineKeyboardButton("➡️ More Results", callback_data="more_results")])
+    search_state['current_index'] += 1
 
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    # Rapid clicks only move the index; one edit shows wherever the user stopped
+    now = time.monotonic()
+    last_click = context.user_data.get('last_more_ts', 0)
+    context.user_data['last_more_ts'] = now
+    if now - last_click < MORE_RESULTS_DEBOUNCE:
+        query.answer()
+        if not context.user_data.get('more_results_pending'):
+            context.user_data['more_results_pending'] = True
+            context.job_queue.run_once(
+                flush_more_results,
+                MORE_RESULTS_DEBOUNCE,
+                context=(update.effective_user.id, query.message.chat_id, query.message.message_id)
+            )
+        return
 
-    formatted_text = format_paper(paper)
-    message = f"📚 Result {current_index + 1}/{len(results)}:\n\n{formatted_text}"
+    message, reply_markup = _more_result_message(search_state)
 
     try:
         query.edit_message_text(
@@ -1168,41 +1442,61 @@ def handle_more_results(update: Update, context: CallbackContext) -> None:
         logger.error(f"Error updating message: {str(e)}")
         query.answer("❌ Error showing next result. Please try searching again.")
 
-def show_paper_result(update: Update, context: CallbackContext, user_state, is_new_search=False):
+def flush_more_results(context: CallbackContext) -> None:
+    """Show the result a user settled on after a burst of 'More Results' clicks."""
+    user_id, chat_id, message_id = context.job.context
+    user_data = context.dispatcher.user_data[user_id]
+    user_data.pop('more_results_pending', None)
+    search_state = user_data.get('search_state')
+    if not search_state:
+        return
+
+    message, reply_markup = _more_result_message(search_state)
+
+    try:
+        context.bot.edit_message_text(
+            chat_id=chat_id,
+            message_id=message_id,
+            text=message,
+            reply_markup=reply_markup,
+            parse_mode=ParseMode.MARKDOWN,
+            disable_web_page_preview=True
+        )
+    except Exception as e:
+        logger.error(f"Error updating message: {str(e)}")
+
+def _more_result_message(search_state) -> tuple:
+    """Return the text and keyboard for the current result in a search."""
+    results = search_state['results']
+    current_index = search_state['current_index']
+    paper = results[current_index]
+
+    reply_markup = paper_result_markup(paper.get_short_id(), current_index < len(results) - 1)
+
+    formatted_text = format_paper(paper)
+    return f"📚 Result {current_index + 1}/{len(results)}:\n\n{formatted_text}", reply_markup
+
+def show_paper_result(message, context: CallbackContext, user_state, is_new_search=False):
     """Show single paper result with navigation."""
     results = user_state['results']
     current_index = user_state['current_index']
 
     if current_index >= len(results):
-        update.message.reply_text("🏁 You've reached the end of results!")
+        message.reply_text("🏁 You've reached the end of results!")
         return
 
     paper = results[current_index]
 
-    keyboard = [
-    [
-        InlineKeyboardButton("📚 Read Paper", url=f"https://arxiv.org/abs/{paper.get_short_id()}"),
-        InlineKeyboardButton("🤖 Summarize", callback_data=f"summarize_{paper.get_short_id()}")
-    ],
-    [
-        InlineKeyboardButton("📥 Download PDF", callback_data=f"download_{paper.get_short_id()}"),
-        InlineKeyboardButton("➕ Add to Compare", callback_data=f"compare_add_{paper.get_short_id()}")  # Fixed here
-    ]
-]
-
-    if current_index < len(results) - 1:
-        keyboard.append([InlineKeyboardButton("➡️ More Results", callback_data="more_results")])
-
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = paper_result_markup(paper.get_short_id(), current_index < len(results) - 1)
     formatted_text = format_paper(paper)
 
     if is_new_search:
-        message = f"🔍 Found {len(results)} papers! Showing result {current_index + 1}/{len(results)}:\n\n{formatted_text}"
+        text = f"🔍 Found {len(results)} papers! Showing result {current_index + 1}/{len(results)}:\n\n{formatted_text}"
     else:
-        message = f"📚 Result {current_index + 1}/{len(results)}:\n\n{formatted_text}"
+        text = f"📚 Result {current_index + 1}/{len(results)}:\n\n{formatted_text}"
 
-    return update.message.reply_text(
-        message,
+    return message.reply_text(
+        text,
         parse_mode=ParseMode.MARKDOWN,
         reply_markup=reply_markup,
         disable_web_page_preview=True
@@ -1219,11 +1513,17 @@ def summarize_paper(update: Update, context: CallbackContext) -> None:
 
     try:
         query.answer("🤖 Asking PaperPilot to analyze the paper...")
+        # The typing indicator goes out on the worker pool while arXiv and Gemini are queried
+        context.dispatcher.run_async(
+            context.bot.send_chat_action,
+            chat_id=query.message.chat_id,
+            action=ChatAction.TYPING
+        )
         processing_message = query.message.reply_text(
             "🧠 PaperPilot is analyzing the paper... Please wait..."
         )
 
-        paper = next(arxiv.Search(id_list=[paper_id]).results())
+        paper = get_paper(paper_id, context)
         context.user_data['current_paper'] = paper
         summary = generate_paper_summary(paper)
 
@@ -1234,7 +1534,7 @@ def summarize_paper(update: Update, context: CallbackContext) -> None:
 
 *Paper Details:*
 📄 [{paper.title}]({paper.pdf_url})
-👥 Authors: {', '.join(str(author) for author in paper.authors[:3])} {'...' if len(paper.authors) > 3 else ''}
+👥 Authors: {author_line(paper)}
 📅 Published: {paper.published.strftime('%Y-%m-%d')}
 
 💡 *Ask me anything about this paper!*
@@ -1254,6 +1554,9 @@ Just type your question below and I'll answer based on the paper's content.
         )
         logger.error(f"Summarization error: {str(e)}")
 
+# Anything other than letters, digits, spaces, hyphens and underscores is dropped from PDF filenames
+_UNSAFE_FILENAME_CHARS = re.compile(r'[^\w \-]+')
+
 def download_paper(update: Update, context: CallbackContext) -> None:
     """Download and send paper as PDF using the most reliable method with pro UX."""
     query = update.callback_query
@@ -1273,20 +1576,41 @@ def download_paper(update: Update, context: CallbackContext) -> None:
         )
 
         # Fetch paper metadata (for title/authors later)
-        paper = next(arxiv.Search(id_list=[paper_id]).results())
+        paper = get_paper(paper_id, context)
+
+        # Create sexy filename
+        safe_title = _UNSAFE_FILENAME_CHARS.sub('', paper.title).rstrip()
+        filename = f"{safe_title[:45]}.pdf"  # Slightly shorter for mobile users
+        caption = f"""
+📄 *{paper.title}*
+👥 *Authors:* {author_line(paper)}
+📅 *Published:* {paper.published.strftime('%Y-%m-%d')}
+🔗 *Original URL:* [arXiv:{paper_id}]({paper.pdf_url})
+                """
+        reply_markup = InlineKeyboardMarkup([[
+            InlineKeyboardButton("🌟 Rate This Paper", callback_data=f"rate_{paper_id}")
+        ]])
+
+        # Method 1 - let Telegram fetch the PDF itself, so no bytes pass through the bot
+        try:
+            query.message.reply_document(
+                document=paper.pdf_url,
+                filename=filename,
+                caption=caption,
+                parse_mode=ParseMode.MARKDOWN,
+                reply_markup=reply_markup
+            )
+            loading_message.delete()
+            return
+        except BadRequest as e:
+            logger.info(f"Telegram could not fetch {paper.pdf_url} ({e}), streaming it instead")
 
         # Method 2 (The Working Champion) - Export API
         export_url = f"https://export.arxiv.org/pdf/{paper_id}"
 
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'application/pdf'
-        }
-
         # Download with streaming
-        with requests.get(
+        with _HTTP.get(
             export_url,
-            headers=headers,
             stream=True,
             timeout=30
         ) as response:
@@ -1296,50 +1620,45 @@ def download_paper(update: Update, context: CallbackContext) -> None:
             if 'application/pdf' not in response.headers.get('content-type', '').lower():
                 raise ValueError("Server returned non-PDF content")
 
-            # Create in-memory file with progress tracking
-            pdf_file = BytesIO()
             total_size = int(response.headers.get('content-length', 0))
-            chunk_size = 8192
+            chunk_size = 64 * 1024
             progress = 0
-
-            for chunk in response.iter_content(chunk_size):
-                if chunk:
-                    pdf_file.write(chunk)
-                    progress += len(chunk)
-
-                    # Update progress every 25%
-                    if total_size > 0 and int((progress / total_size) * 100) % 25 == 0:
-                        loading_message.edit_text(
-                            f"🚀 Downloading... {int((progress / total_size) * 100)}% complete\n"
-                            f"_File size: {total_size/1024/1024:.1f} MB_",
-                            parse_mode=ParseMode.MARKDOWN
-                        )
-
-            pdf_file.seek(0)
-
-            # Create sexy filename
-            safe_title = "".join(
-                c for c in paper.title
-                if c.isalnum() or c in (' ', '-', '_')
-            ).rstrip()
-            filename = f"{safe_title[:45]}.pdf"  # Slightly shorter for mobile users
-
-            # Send that beautiful PDF with style
-            loading_message.delete()
-            query.message.reply_document(
-                document=pdf_file,
-                filename=filename,
-                caption=f"""
-📄 *{paper.title}*
-👥 *Authors:* {', '.join(str(author) for author in paper.authors[:3])}{'...' if len(paper.authors) > 3 else ''}
-📅 *Published:* {paper.published.strftime('%Y-%m-%d')}
-🔗 *Original URL:* [arXiv:{paper_id}]({paper.pdf_url})
-                """,
-                parse_mode=ParseMode.MARKDOWN,
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🌟 Rate This Paper", callback_data=f"rate_{paper_id}")
-                ]])
-            )
+            # Byte offsets of each quarter of the file; empty when the size is unknown
+            thresholds = iter([total_size // 4, total_size // 2, 3 * total_size // 4, total_size] if total_size > 0 else [])
+            next_threshold = next(thresholds, None)
+            last_edit = time.monotonic()
+
+            # Small PDFs stay in memory, larger ones spill to disk
+            with SpooledTemporaryFile(max_size=1 << 20) as pdf_file:
+                for chunk in response.iter_content(chunk_size):
+                    if chunk:
+                        pdf_file.write(chunk)
+                        progress += len(chunk)
+
+                        # Update progress each time a new 25% is reached, at most once per interval
+                        if next_threshold is not None and progress >= next_threshold:
+                            now = time.monotonic()
+                            if now - last_edit >= PROGRESS_EDIT_INTERVAL:
+                                last_edit = now
+                                while next_threshold is not None and progress >= next_threshold:
+                                    next_threshold = next(thresholds, None)
+                                loading_message.edit_text(
+                                    f"🚀 Downloading... {progress * 100 // total_size}% complete\n"
+                                    f"_File size: {total_size/1024/1024:.1f} MB_",
+                                    parse_mode=ParseMode.MARKDOWN
+                                )
+
+                pdf_file.seek(0)
+
+                # Send that beautiful PDF with style
+                loading_message.delete()
+                query.message.reply_document(
+                    document=pdf_file,
+                    filename=filename,
+                    caption=caption,
+                    parse_mode=ParseMode.MARKDOWN,
+                    reply_markup=reply_markup
+                )
 
     except Exception as e:
         error_msg = f"""
@@ -1365,7 +1684,21 @@ _Error details:_ `{str(e)}`
             )
         logger.error(f"Paper download error for {paper_id}: {str(e)}")
 
-def chat_about_paper(update: Update, context: CallbackContext) -> None:
+# The fixed tail of every Q&A prompt, so only the paper and question are formatted per message
+_QA_PROMPT_RULES = """
+        Rules for answering:
+        1. Be accurate and specific
+        2. Use information from the paper
+        3. If the answer isn't in the paper, you can answer
+           from your knowledge but it must be based on the paper's concept and idea.
+           If the answer is in the paper, use it to answer.
+        4. Use simple language but maintain technical accuracy
+        5. Include relevant quotes if helpful
+        6. Maintain a playful tone but professional
+        7. You can answer based on the summary, not only the paper.
+        """
+
+def chat_about_paper(update: Update, context: CallbackContext, question: Optional[str] = None) -> None:
     # Check if we're expecting a keyword or journal name
     if context.user_data.get('awaiting_notification_keyword') or context.user_data.get('awaiting_journal_name'):
         return  # Stop processing if we're expecting a keyword or journal name
@@ -1378,24 +1711,17 @@ def chat_about_paper(update: Update, context: CallbackContext) -> None:
     if not context.user_data.get('current_paper'):
         return  # Don't show any message if there's no current paper
 
-    # Check if the user is subscribed to the channel
-    if not check_channel_subscription(update, context):
-        return
-
-    # Check if there's a current paper to chat about
-    if not context.user_data.get('current_paper'):
-        update.message.reply_text(
-            "❌ Please summarize a paper first before asking questions about it!"
-        )
-        return
-
     # Get the paper and the user's question
     paper = context.user_data['current_paper']
-    question = update.message.text
+    question = question or update.message.text
 
     try:
-        # Show typing indicator and analyzing message
-        update.message.chat.send_action(ChatAction.TYPING)
+        # Show typing indicator and analyzing message; the indicator goes out on the worker pool
+        context.dispatcher.run_async(
+            context.bot.send_chat_action,
+            chat_id=update.effective_chat.id,
+            action=ChatAction.TYPING
+        )
         analyzing_message = update.message.reply_text(
             "🧠 Analyzing paper to answer your question...",
             quote=True
@@ -1408,18 +1734,7 @@ def chat_about_paper(update: Update, context: CallbackContext) -> None:
         Abstract: {paper.summary}
 
         Please answer this question: {question}
-
-        Rules for answering:
-        1. Be accurate and specific
-        2. Use information from the paper
-        3. If the answer isn't in the paper, you can answer
-           from your knowledge but it must be based on the paper's concept and idea.
-           If the answer is in the paper, use it to answer.
-        4. Use simple language but maintain technical accuracy
-        5. Include relevant quotes if helpful
-        6. Maintain a playful tone but professional
-        7. You can answer based on the summary, not only the paper.
-        """
+{_QA_PROMPT_RULES}"""
 
         # Get response from Gemini
         response = model.generate_content(prompt)
@@ -1451,19 +1766,16 @@ def get_latest_papers(update: Update, context: CallbackContext) -> None:
 
     try:
         # Use a date-based query for the last week
-        from datetime import datetime, timedelta
         last_week = datetime.now() - timedelta(days=7)
         date_query = f"submittedDate:[{last_week.strftime('%Y%m%d')}0000 TO 999999999999]"
 
-        search = arxiv.Search(
-            query=date_query,
+        results = _cached_arxiv_search(
+            date_query,
             max_results=5,
             sort_by=arxiv.SortCriterion.SubmittedDate,
             sort_order=arxiv.SortOrder.Descending
         )
 
-        results = list(search.results())
-
         if not results:
             loading_message.edit_text("❌ Could not fetch latest papers. Please try again later.")
             return
@@ -1475,7 +1787,7 @@ def get_latest_papers(update: Update, context: CallbackContext) -> None:
         }
 
         loading_message.delete()
-        show_paper_result(update, context, context.user_data['search_state'], is_new_search=True)
+        show_paper_result(update.message, context, context.user_data['search_state'], is_new_search=True)
 
     except Exception as e:
         loading_message.edit_text(f"❌ An error occurred: {str(e)}")
@@ -1487,6 +1799,7 @@ def start_paper_comparison(update: Update, context: CallbackContext) -> None:
         return
 
     context.user_data['papers_to_compare'] = []
+    context.user_data['papers_to_compare_ids'] = set()
     context.user_data['awaiting_paper_selection'] = True
 
     update.message.reply_text(
@@ -1512,37 +1825,86 @@ def add_paper_to_comparison(update: Update, context: CallbackContext) -> None:
     if not check_channel_subscription(update, context):
         return
 
-    if 'papers_to_compare' not in context.user_data:
-        context.user_data['papers_to_compare'] = []
-
     paper_id = query.data.split('_')[2]  # Format: "compare_add_<paper_id>"
 
     try:
-        paper = next(arxiv.Search(id_list=[paper_id]).results())
-        papers_list = context.user_data['papers_to_compare']
+        paper = known_paper(paper_id, context)
+        if paper is None:
+            # Papers we don't hold are fetched together once the clicks settle
+            with _COMPARE_LOCK:
+                pending = context.user_data.setdefault('pending_compare_ids', set())
+                if not pending:
+                    context.job_queue.run_once(
+                        flush_pending_comparison,
+                        COMPARE_FETCH_DELAY,
+                        context=(update.effective_user.id, query.message.chat_id)
+                    )
+                pending.add(paper_id)
+            query.answer("⏳ Fetching paper details...")
+            return
 
-        # Check if paper is already in the list
-        if any(p.entry_id == paper.entry_id for p in papers_list):
+        added_text = _add_comparison_paper(context.user_data, paper)
+        if added_text is None:
             query.answer("❌ This paper is already in your comparison list!")
             return
 
-        # Add paper to comparison list
-        papers_list.append(paper)
-        context.user_data['papers_to_compare'] = papers_list
-
         query.answer("✅ Paper added to comparison list!")
-        query.message.reply_text(
-            f"""📑 Paper added to comparison ({len(papers_list)}/{MAX_PAPERS_TO_COMPARE})
+        query.message.reply_text(added_text, parse_mode=ParseMode.MARKDOWN)
 
-*Title:* {paper.title}
+    except Exception as e:
+        query.answer(f"❌ Error adding paper: {str(e)}")
+        logger.error(f"Error adding paper to comparison: {str(e)}")
 
-{f'Add {MAX_PAPERS_TO_COMPARE - len(papers_list)} more papers or use /compare to see the comparison!' if len(papers_list) < MAX_PAPERS_TO_COMPARE else 'Ready to compare! Use /compare to see the analysis.'}""",
-            parse_mode=ParseMode.MARKDOWN
-        )
+def flush_pending_comparison(context: CallbackContext) -> None:
+    """Fetch every paper queued for comparison by a user and add them in one go."""
+    user_id, chat_id = context.job.context
+    user_data = context.dispatcher.user_data[user_id]
+    with _COMPARE_LOCK:
+        paper_ids = set(user_data.pop('pending_compare_ids', ()))
+    if not paper_ids:
+        return
 
+    try:
+        papers = fetch_papers(paper_ids)
     except Exception as e:
-        query.answer(f"❌ Error adding paper: {str(e)}")
+        context.bot.send_message(chat_id=chat_id, text=f"❌ Error adding paper: {str(e)}")
         logger.error(f"Error adding paper to comparison: {str(e)}")
+        return
+
+    # arXiv silently leaves out ids it doesn't know; a click may also have named an unversioned id
+    found = set()
+    for paper in papers:
+        short_id = paper.get_short_id()
+        found.update((short_id, re.sub(r'v\d+$', '', short_id)))
+    for paper_id in sorted(paper_ids - found):
+        context.bot.send_message(chat_id=chat_id, text=f"❌ Error adding paper: {paper_id} was not found on arXiv")
+
+    for paper in papers:
+        added_text = _add_comparison_paper(user_data, paper)
+        context.bot.send_message(
+            chat_id=chat_id,
+            text=added_text or "❌ This paper is already in your comparison list!",
+            parse_mode=ParseMode.MARKDOWN
+        )
+
+def _add_comparison_paper(user_data, paper) -> Optional[str]:
+    """Append paper to the comparison list; return the confirmation text, or None if already listed."""
+    papers_list = user_data.setdefault('papers_to_compare', [])
+    paper_ids = user_data.setdefault('papers_to_compare_ids', {p.entry_id for p in papers_list})
+
+    # Check if paper is already in the list
+    if paper.entry_id in paper_ids:
+        return None
+
+    # Add paper to comparison list
+    papers_list.append(paper)
+    paper_ids.add(paper.entry_id)
+
+    return f"""📑 Paper added to comparison ({len(papers_list)}/{MAX_PAPERS_TO_COMPARE})
+
+*Title:* {paper.title}
+
+{f'Add {MAX_PAPERS_TO_COMPARE - len(papers_list)} more papers or use /compare to see the comparison!' if len(papers_list) < MAX_PAPERS_TO_COMPARE else 'Ready to compare! Use /compare to see the analysis.'}"""
 
 def split_long_message(message: str, max_length: int = MAX_RESPONSE_LENGTH) -> List[str]:
     """Split long messages into smaller chunks for Telegram."""
@@ -1550,35 +1912,34 @@ def split_long_message(message: str, max_length: int = MAX_RESPONSE_LENGTH) -> L
         return [message]
 
     chunks = []
-    current_chunk = ""
+    lines = []
+    length = 0
 
     for line in message.split('\n'):
-        if len(current_chunk) + len(line) + 1 <= max_length:
-            current_chunk += line + '\n'
-        else:
-            chunks.append(current_chunk)
-            current_chunk = line + '\n'
+        if lines and length + len(line) + 1 > max_length:
+            chunks.append('\n'.join(lines))
+            lines = []
+            length = 0
+        lines.append(line)
+        length += len(line) + 1
 
-    if current_chunk:
-        chunks.append(current_chunk)
+    if lines:
+        chunks.append('\n'.join(lines))
 
     return chunks
 
+_MD2_ESCAPE = str.maketrans({c: '\\' + c for c in '\\_*[]()~`>#+-=|{}.!'})
+
 def escape_markdown_v2(text: str) -> str:
     """Escape Markdown V2 special characters."""
-    escape_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-    return ''.join(f'\\{c}' if c in escape_chars else c for c in str(text))
+    return str(text).translate(_MD2_ESCAPE)
 
 def generate_comparison(update: Update, context: CallbackContext) -> None:
     """Generate and show the comparison between selected papers."""
     if not check_channel_subscription(update, context):
         return
 
-    # Initialize user session if needed
-    if 'session' not in context.user_data:
-        context.user_data['session'] = UserSession()
-
-    session = context.user_data['session']
+    session = context.user_data.setdefault('session', UserSession())
 
     # Check daily limit
     if not session.can_compare():
@@ -1607,14 +1968,22 @@ def generate_comparison(update: Update, context: CallbackContext) -> None:
         ]
         processing_msg = update.message.reply_text(random.choice(loading_messages))
 
-        # Try to get cached comparison
-        comparison = paper_comparison.comparison_cache.get(papers)
+        # Try to get cached comparison, keyed by content so selection order doesn't matter
+        cache_key = frozenset(context.user_data.setdefault('papers_to_compare_ids', {p.entry_id for p in papers}))
+        with _COMPARISON_CACHE_LOCK:
+            comparison = _COMPARISON_CACHE.get(cache_key)
+            if comparison:
+                _COMPARISON_CACHE.move_to_end(cache_key)
 
         if not comparison:
             comparison = paper_comparison.compare_papers(papers)
             prompt = paper_comparison.generate_comparison_prompt(papers)
             ai_response = model.generate_content(prompt)
             comparison.methodology_comparison = str(ai_response.text)
+            with _COMPARISON_CACHE_LOCK:
+                _COMPARISON_CACHE[cache_key] = comparison
+                while len(_COMPARISON_CACHE) > COMPARISON_CACHE_SIZE:
+                    _COMPARISON_CACHE.popitem(last=False)
 
         # Format papers with cool emojis
         papers_list = []
@@ -1677,62 +2046,53 @@ def generate_comparison(update: Update, context: CallbackContext) -> None:
 
         response = "".join(response_parts)
 
-        # Delete processing message
-        processing_msg.delete()
-
-        # Split and send the response with cool headers
+        # Split the response with cool headers
         if len(response) > 4000:
-            chunks = []
-            current_chunk = ""
-
-            for line in response.split('\n'):
-                if len(current_chunk) + len(line) + 1 > 4000:
-                    chunks.append(current_chunk)
-                    current_chunk = line + '\n'
-                else:
-                    current_chunk += line + '\n'
+            chunks = split_long_message(response, 4000)
+            parts = [
+                f"✨ *PaperPilot Analysis \\| Part {i+1}/{len(chunks)}* ✨\n\n{chunk}"
+                for i, chunk in enumerate(chunks)
+            ]
+        else:
+            parts = [response]
 
-            if current_chunk:
-                chunks.append(current_chunk)
+        # The processing message becomes the first part rather than being deleted and re-sent
+        processing_msg.edit_text(
+            parts[0],
+            parse_mode=ParseMode.MARKDOWN_V2,
+            disable_web_page_preview=True
+        )
 
-            # Send chunks with cool headers
-            for i, chunk in enumerate(chunks):
-                header = f"✨ *PaperPilot Analysis \\| Part {i+1}/{len(chunks)}* ✨\n\n"
-                if i == 0:
-                    chunk = header + chunk
-                else:
-                    chunk = header + chunk
-
-                context.bot.send_message(
-                    chat_id=update.effective_chat.id,
-                    text=chunk,
-                    parse_mode=ParseMode.MARKDOWN_V2,
-                    disable_web_page_preview=True
-                )
-                time.sleep(0.5)
-        else:
-            context.bot.send_message(
+        # Send the rest back to back unless Telegram asks us to wait
+        for part in parts[1:]:
+            send_kwargs = dict(
                 chat_id=update.effective_chat.id,
-                text=response,
+                text=part,
                 parse_mode=ParseMode.MARKDOWN_V2,
                 disable_web_page_preview=True
             )
+            try:
+                context.bot.send_message(**send_kwargs)
+            except RetryAfter as e:
+                time.sleep(e.retry_after)
+                context.bot.send_message(**send_kwargs)
 
         # Record the comparison
         session.record_comparison()
 
         # Clear the comparison list
         context.user_data['papers_to_compare'] = []
+        context.user_data['papers_to_compare_ids'] = set()
 
-    except Exception as e:
-        logger.error(f"Comparison error: {str(e)}")
+    except Exception:
+        logger.exception("Comparison error")
         if processing_msg:
             try:
                 processing_msg.edit_text(
                     "❌ Oops\\! Something went wrong\\. Let's try that again\\!",
                     parse_mode=ParseMode.MARKDOWN_V2
                 )
-            except:
+            except BadRequest:
                 processing_msg.edit_text(
                     "❌ Oops! Something went wrong. Let's try that again!"
                 )
@@ -1746,18 +2106,7 @@ def safe_send_message(update: Update, context: CallbackContext, text: str, **kwa
 
         # Split long messages
         if len(text) > 4000:
-            chunks = []
-            current_chunk = ""
-
-            for line in text.split('\n'):
-                if len(current_chunk) + len(line) + 1 > 4000:
-                    chunks.append(current_chunk)
-                    current_chunk = line + '\n'
-                else:
-                    current_chunk += line + '\n'
-
-            if current_chunk:
-                chunks.append(current_chunk)
+            chunks = split_long_message(text, 4000)
 
             # Send chunks
             for i, chunk in enumerate(chunks):
@@ -1792,52 +2141,136 @@ def clear_comparison(update: Update, context: CallbackContext) -> None:
     """Clear the current paper comparison list."""
     if 'papers_to_compare' in context.user_data:
         context.user_data['papers_to_compare'] = []
+        context.user_data['papers_to_compare_ids'] = set()
     update.message.reply_text(
         "🧹 Comparison list cleared! You can start a new comparison."
     )
 
-def settings_command(update: Update, context: CallbackContext) -> None:
-    """Show settings menu."""
-    if not check_channel_subscription(update, context):
-        return
-
-    keyboard = [
-        [
-            InlineKeyboardButton("📊 Max Results", callback_data="settings_max_results"),
-            InlineKeyboardButton("📚 Journals", callback_data="settings_journals")
-        ],
-        [
-            InlineKeyboardButton("🏷️ Categories", callback_data="settings_categories")
-        ],
-        [
-            InlineKeyboardButton("🔄 Reset Preferences", callback_data="settings_reset")
-        ]
+_SETTINGS_MARKUP = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("📊 Max Results", callback_data="settings_max_results"),
+        InlineKeyboardButton("📚 Journals", callback_data="settings_journals")
+    ],
+    [
+        InlineKeyboardButton("🏷️ Categories", callback_data="settings_categories")
+    ],
+    [
+        InlineKeyboardButton("🔄 Reset Preferences", callback_data="settings_reset")
     ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+])
 
-    pref_manager = ensure_preferences_initialized(context)
-    user_prefs = pref_manager.get_preferences(update.effective_user.id)
+_BACK_TO_SETTINGS_BUTTON = InlineKeyboardButton("« Back to Settings", callback_data="back_settings")
 
-    categories_count = len(user_prefs.get('preferred_categories', []))
+_MAX_RESULTS_MARKUP = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("5", callback_data="set_max_results_5"),
+        InlineKeyboardButton("10", callback_data="set_max_results_10"),
+        InlineKeyboardButton("20", callback_data="set_max_results_20")
+    ],
+    [_BACK_TO_SETTINGS_BUTTON]
+])
 
-    message = f"""
+# Fixed rows under the per-journal remove buttons
+_JOURNALS_MENU_TAIL = [
+    [InlineKeyboardButton("➕ Add New Journal", callback_data="journal_add")],
+    [_BACK_TO_SETTINGS_BUTTON]
+]
+
+_BACK_TO_JOURNALS_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("« Back to Journals", callback_data="settings_journals")]
+])
+
+_CATEGORY_FIELDS_MARKUP = InlineKeyboardMarkup(
+    [
+        [InlineKeyboardButton(f"📚 {field}", callback_data=f"category_field_{field}")]
+        for field in UserPreferences.ARXIV_CATEGORIES
+    ] + [[_BACK_TO_SETTINGS_BUTTON]]
+)
+
+@lru_cache(maxsize=None)
+def category_field_markup(field: str, selected: frozenset) -> InlineKeyboardMarkup:
+    """Build the toggle keyboard for a field, given which of its categories are selected."""
+    keyboard = []
+    # Add category toggles
+    for cat_id, cat_name in UserPreferences.ARXIV_CATEGORIES[field].items():
+        status = "✅" if cat_id in selected else "⭕️"
+        keyboard.append([InlineKeyboardButton(
+            f"{status} {cat_name} ({cat_id})",
+            callback_data=f"toggle_category_{cat_id}"
+        )])
+
+    # Add navigation buttons
+    keyboard.append([
+        InlineKeyboardButton("« Back to Fields", callback_data="settings_categories"),
+        InlineKeyboardButton("« Main Menu", callback_data="back_settings")
+    ])
+    return InlineKeyboardMarkup(keyboard)
+
+_SETTINGS_TEXT = """
 🛠 *User Preferences*
 
 Current Settings:
-📊 Max Results: {user_prefs['max_results']}
-📚 Specific Journals: {', '.join(user_prefs['specific_journals']) or 'None'}
+📊 Max Results: {max_results}
+📚 Specific Journals: {journals}
 🏷️ Categories: {categories_count} selected
-⏰ Last Updated: {user_prefs['last_updated']}
+⏰ Last Updated: {last_updated}
 
 Select a setting to modify:
 """
 
+def settings_text(user_prefs: Dict) -> str:
+    """Render the settings overview shown by /settings and the Back to Settings button."""
+    return _SETTINGS_TEXT.format(
+        max_results=user_prefs['max_results'],
+        journals=', '.join(user_prefs['specific_journals']) or 'None',
+        categories_count=len(user_prefs.get('preferred_categories', [])),
+        last_updated=user_prefs['last_updated']
+    )
+
+def settings_command(update: Update, context: CallbackContext) -> None:
+    """Show settings menu."""
+    if not check_channel_subscription(update, context):
+        return
+
+    reply_markup = _SETTINGS_MARKUP
+
+    pref_manager = ensure_preferences_initialized(context)
+    user_prefs = pref_manager.get_preferences(update.effective_user.id)
+
+    message = settings_text(user_prefs)
+
     update.message.reply_text(
         message,
         reply_markup=reply_markup,
         parse_mode=ParseMode.MARKDOWN
     )
 
+def _show_max_results(update: Update, context: CallbackContext, pref_manager: UserPreferences) -> None:
+    current_max = pref_manager.get_preferences(update.effective_user.id).get('max_results', 10)
+    update.callback_query.edit_message_text(
+        f"📊 *Maximum Results Settings*\n\nCurrent setting: {current_max}\nSelect new maximum number of search results:",
+        reply_markup=_MAX_RESULTS_MARKUP,
+        parse_mode=ParseMode.MARKDOWN
+    )
+
+def _show_journals(update: Update, context: CallbackContext, pref_manager: UserPreferences) -> None:
+    _render_journals_menu(update.callback_query, pref_manager.get_preferences(update.effective_user.id))
+
+def _reset_preferences(update: Update, context: CallbackContext, pref_manager: UserPreferences) -> None:
+    # Reset preferences to default
+    default_prefs = {
+        'max_results': 10,
+        'specific_journals': [],
+        'auto_download': False,
+        'preferred_categories': []
+    }
+    pref_manager.save_preferences(update.effective_user.id, default_prefs)
+
+    update.callback_query.edit_message_text(
+        "✅ Preferences reset to default values!\n\nUse /settings to view or modify settings.",
+        parse_mode=ParseMode.MARKDOWN
+    )
+
 def handle_settings_callback(update: Update, context: CallbackContext) -> None:
     """Handle settings menu callbacks."""
     query = update.callback_query
@@ -1846,83 +2279,46 @@ def handle_settings_callback(update: Update, context: CallbackContext) -> None:
     if not check_channel_subscription(update, context):
         return
 
-    action = query.data.split('_', 1)[1]  # Split only once to handle journal names with underscores
-    pref_manager = ensure_preferences_initialized(context)
-
-    if action == "categories":
-        handle_categories_menu(update, context)
-
-    if action == "max_results":
-        keyboard = [
-            [
-                InlineKeyboardButton("5", callback_data="set_max_results_5"),
-                InlineKeyboardButton("10", callback_data="set_max_results_10"),
-                InlineKeyboardButton("20", callback_data="set_max_results_20")
-            ],
-            [InlineKeyboardButton("« Back to Settings", callback_data="back_settings")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
-        current_max = pref_manager.get_preferences(update.effective_user.id).get('max_results', 10)
-        query.edit_message_text(
-            f"📊 *Maximum Results Settings*\n\nCurrent setting: {current_max}\nSelect new maximum number of search results:",
-            reply_markup=reply_markup,
-            parse_mode=ParseMode.MARKDOWN
-        )
+    handler = _SETTINGS_ACTIONS.get(query.data)
+    if handler is None:
+        return
 
-    elif action == "journals":
-        prefs = pref_manager.get_preferences(update.effective_user.id)
-        journals = prefs.get('specific_journals', [])
+    handler(update, context, ensure_preferences_initialized(context))
 
-        keyboard = []
-        # Add remove buttons for existing journals
-        for journal in journals:
-            safe_journal = journal.replace(' ', '_')  # Make safe for callback data
-            keyboard.append([
-                InlineKeyboardButton(
-                    f"❌ Remove {journal}",
-                    callback_data=f"journal_remove_{safe_journal}"
-                )
-            ])
+def _render_journals_menu(query, prefs: Dict) -> None:
+    """Show the journal preferences menu for the given preferences."""
+    journals = prefs.get('specific_journals', [])
 
-        # Add other buttons
-        keyboard.extend([
-            [InlineKeyboardButton("➕ Add New Journal", callback_data="journal_add")],
-            [InlineKeyboardButton("« Back to Settings", callback_data="back_settings")]
+    keyboard = []
+    # Add remove buttons for existing journals
+    for journal in journals:
+        safe_journal = journal.replace(' ', '_')  # Make safe for callback data
+        keyboard.append([
+            InlineKeyboardButton(
+                f"❌ Remove {journal}",
+                callback_data=f"journal_remove_{safe_journal}"
+            )
         ])
 
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
-        message = "📚 *Journal Preferences*\n\n"
-        message += "*Current journals:*\n"
-        if journals:
-            message += "\n".join([f"• {j}" for j in journals])
-        else:
-            message += "_No journals selected_"
+    # Add other buttons
+    keyboard.extend(_JOURNALS_MENU_TAIL)
 
-        message += "\n\nClick '➕ Add New Journal' to add a new journal or click the ❌ button to remove a journal."
+    reply_markup = InlineKeyboardMarkup(keyboard)
 
-        query.edit_message_text(
-            message,
-            reply_markup=reply_markup,
-            parse_mode=ParseMode.MARKDOWN
-        )
+    message = "📚 *Journal Preferences*\n\n"
+    message += "*Current journals:*\n"
+    if journals:
+        message += "• " + "\n• ".join(journals)
+    else:
+        message += "_No journals selected_"
 
-    elif action == "reset":
-        # Reset preferences to default
-        default_prefs = {
-            'max_results': 10,
-            'specific_journals': [],
-            'last_updated': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
-            'auto_download': False,
-            'preferred_categories': []
-        }
-        pref_manager.save_preferences(update.effective_user.id, default_prefs)
+    message += "\n\nClick '➕ Add New Journal' to add a new journal or click the ❌ button to remove a journal."
 
-        query.edit_message_text(
-            "✅ Preferences reset to default values!\n\nUse /settings to view or modify settings.",
-            parse_mode=ParseMode.MARKDOWN
-        )
+    query.edit_message_text(
+        message,
+        reply_markup=reply_markup,
+        parse_mode=ParseMode.MARKDOWN
+    )
 
 def handle_journal_actions(update: Update, context: CallbackContext) -> None:
     """Handle journal add/remove actions."""
@@ -1947,19 +2343,15 @@ def handle_journal_actions(update: Update, context: CallbackContext) -> None:
             pref_manager.save_preferences(update.effective_user.id, prefs)
 
         # Refresh journals menu
-        query.data = "settings_journals"
-        handle_settings_callback(update, context)
+        _render_journals_menu(query, prefs)
 
     elif action[1] == "add":
-        keyboard = [[InlineKeyboardButton("« Back to Journals", callback_data="settings_journals")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
         query.edit_message_text(
             "📝 *Add New Journal*\n\n"
             "To add a new journal, send the journal name as a message.\n\n"
             "Example: `Nature` or `Science`\n\n"
             "_Click 'Back to Journals' to cancel_",
-            reply_markup=reply_markup,
+            reply_markup=_BACK_TO_JOURNALS_MARKUP,
             parse_mode=ParseMode.MARKDOWN
         )
         # Set state to expect journal name
@@ -1977,27 +2369,8 @@ def handle_back_to_settings(update: Update, context: CallbackContext) -> None:
     pref_manager = ensure_preferences_initialized(context)
     user_prefs = pref_manager.get_preferences(update.effective_user.id)
 
-    keyboard = [
-        [
-            InlineKeyboardButton("📊 Max Results", callback_data="settings_max_results"),
-            InlineKeyboardButton("📚 Journals", callback_data="settings_journals")
-        ],
-        [
-            InlineKeyboardButton("🔄 Reset Preferences", callback_data="settings_reset")
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    message = f"""
-🛠 *User Preferences*
-
-Current Settings:
-📊 Max Results: {user_prefs['max_results']}
-📚 Specific Journals: {', '.join(user_prefs['specific_journals']) or 'None'}
-⏰ Last Updated: {user_prefs['last_updated']}
-
-Select a setting to modify:
-"""
+    reply_markup = _SETTINGS_MARKUP
+    message = settings_text(user_prefs)
 
     query.edit_message_text(
         message,
@@ -2035,6 +2408,50 @@ def handle_journal_name_message(update: Update, context: CallbackContext) -> Non
     context.user_data['awaiting_journal_name'] = False
     return True  # Stop other handlers from processing this message
 
+def route_private_text(update: Update, context: CallbackContext) -> None:
+    """Send a private text message to the journal prompt or to the paper Q&A."""
+    if context.user_data.get('awaiting_notification_keyword'):
+        return  # handle_notification_keyword already took it in group 0
+
+    if context.user_data.get('awaiting_journal_name'):
+        handle_journal_name_message(update, context)
+    elif context.user_data.get('current_paper'):
+        queue_question_part(update, context)
+
+def queue_question_part(update: Update, context: CallbackContext) -> None:
+    """Collect consecutive messages so a question Telegram split into parts is answered once."""
+    text = update.message.text
+    if len(text) >= QUESTION_SPLIT_LENGTH:
+        delay = QUESTION_BATCH_DELAY_SPLIT
+    elif len(text) <= QUESTION_SHORT_LENGTH:
+        delay = QUESTION_BATCH_DELAY_SHORT
+    else:
+        delay = QUESTION_BATCH_DELAY
+
+    with _QUESTION_LOCK:
+        pending = context.user_data.get('pending_question')
+        if pending is not None:
+            pending['parts'].append(text)
+            pending['deadline'] = time.monotonic() + delay
+            return
+        context.user_data['pending_question'] = {'parts': [text], 'deadline': time.monotonic() + delay}
+    context.job_queue.run_once(flush_question, delay, context=(update, context))
+
+def flush_question(job_context: CallbackContext) -> None:
+    """Answer a buffered question once no further part has arrived within its window."""
+    update, context = job_context.job.context
+    with _QUESTION_LOCK:
+        pending = context.user_data['pending_question']
+        remaining = pending['deadline'] - time.monotonic()
+        if remaining > 0:
+            job_context.job_queue.run_once(flush_question, remaining, context=(update, context))
+            return
+        del context.user_data['pending_question']
+
+    question = "\n".join(pending['parts'])
+    # Gemini answers take seconds; don't hold up other chats, but answer this one in order
+    run_in_chat_order(update, context, lambda u, c: chat_about_paper(u, c, question))
+
 def handle_max_results_callback(update: Update, context: CallbackContext) -> None:
     """Handle selection of maximum results."""
     query = update.callback_query
@@ -2066,24 +2483,15 @@ def handle_categories_menu(update: Update, context: CallbackContext) -> None:
     if not check_channel_subscription(update, context):
         return
 
-    pref_manager = ensure_preferences_initialized(context)
-    user_prefs = pref_manager.get_preferences(update.effective_user.id)
-    selected_categories = set(user_prefs.get('preferred_categories', []))
-
-    # Create keyboard with categories grouped by main field
-    keyboard = []
-    for field, categories in UserPreferences.ARXIV_CATEGORIES.items():
-        # Add field header
-        keyboard.append([InlineKeyboardButton(
-            f"📚 {field}",
-            callback_data=f"category_field_{field}"
-        )])
+    _show_categories(update, context, ensure_preferences_initialized(context))
 
-    keyboard.append([InlineKeyboardButton("« Back to Settings", callback_data="back_settings")])
-    reply_markup = InlineKeyboardMarkup(keyboard)
+def _show_categories(update: Update, context: CallbackContext, pref_manager: UserPreferences) -> None:
+    query = update.callback_query
+    user_prefs = pref_manager.get_preferences(update.effective_user.id)
+    reply_markup = _CATEGORY_FIELDS_MARKUP
 
-    current_cats = user_prefs.get('preferred_categories', [])
-    categories_text = "\n".join([f"• {cat}" for cat in current_cats]) if current_cats else "None selected"
+    current_cats = sorted(user_prefs.get('preferred_categories', ()))
+    categories_text = "• " + "\n• ".join(current_cats) if current_cats else "None selected"
 
     message = f"""
 🏷️ *Category Preferences*
@@ -2100,6 +2508,13 @@ Choose a field to view categories:
         parse_mode=ParseMode.MARKDOWN
     )
 
+_SETTINGS_ACTIONS = {
+    "settings_categories": _show_categories,
+    "settings_max_results": _show_max_results,
+    "settings_journals": _show_journals,
+    "settings_reset": _reset_preferences,
+}
+
 def handle_category_field(update: Update, context: CallbackContext) -> None:
     """Show categories for selected field."""
     query = update.callback_query
@@ -2109,28 +2524,16 @@ def handle_category_field(update: Update, context: CallbackContext) -> None:
         return
 
     field = query.data.split('_')[2]
-    categories = UserPreferences.ARXIV_CATEGORIES[field]
-
     pref_manager = ensure_preferences_initialized(context)
-    user_prefs = pref_manager.get_preferences(update.effective_user.id)
-    selected_categories = set(user_prefs.get('preferred_categories', []))
-
-    keyboard = []
-    # Add category toggles
-    for cat_id, cat_name in categories.items():
-        status = "✅" if cat_id in selected_categories else "⭕️"
-        keyboard.append([InlineKeyboardButton(
-            f"{status} {cat_name} ({cat_id})",
-            callback_data=f"toggle_category_{cat_id}"
-        )])
+    _render_category_field(query, field, pref_manager.get_preferences(update.effective_user.id))
 
-    # Add navigation buttons
-    keyboard.append([
-        InlineKeyboardButton("« Back to Fields", callback_data="settings_categories"),
-        InlineKeyboardButton("« Main Menu", callback_data="back_settings")
-    ])
+def _render_category_field(query, field: str, user_prefs: Dict) -> None:
+    """Show the category toggles of one field for the given preferences."""
+    categories = UserPreferences.ARXIV_CATEGORIES[field]
+    # Only this field's selections affect the keyboard, so they form the cache key
+    selected_categories = frozenset(categories).intersection(user_prefs.get('preferred_categories', []))
 
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = category_field_markup(field, selected_categories)
 
     message = f"""
 🏷️ *{field} Categories*
@@ -2151,32 +2554,30 @@ Your selections will be used to filter search results.
 def handle_category_toggle(update: Update, context: CallbackContext) -> None:
     """Toggle category selection."""
     query = update.callback_query
-    query.answer()
 
+    # The query is answered once, with the toggle result, to save a round trip
     if not check_channel_subscription(update, context):
+        query.answer()
         return
 
     category_id = query.data.split('_')[2]
     pref_manager = ensure_preferences_initialized(context)
     prefs = pref_manager.get_preferences(update.effective_user.id)
 
-    if 'preferred_categories' not in prefs:
-        prefs['preferred_categories'] = []
-
-    if category_id in prefs['preferred_categories']:
-        prefs['preferred_categories'].remove(category_id)
-        query.answer("Category removed!")
+    selected = prefs['preferred_categories']
+    if category_id in selected:
+        selected.discard(category_id)
+        query.answer("Category removed!", cache_time=1)
     else:
-        prefs['preferred_categories'].append(category_id)
-        query.answer("Category added!")
+        selected.add(category_id)
+        query.answer("Category added!", cache_time=1)
 
     pref_manager.save_preferences(update.effective_user.id, prefs)
 
     # Find which field this category belongs to
     for field, categories in UserPreferences.ARXIV_CATEGORIES.items():
         if category_id in categories:
-            query.data = f"category_field_{field}"
-            handle_category_field(update, context)
+            _render_category_field(query, field, prefs)
             break
 
 def sanitize_search_query(query: str) -> str:
@@ -2200,29 +2601,37 @@ def ensure_preferences_initialized(context: CallbackContext) -> UserPreferences:
         context.bot_data['preferences_manager'] = preferences_manager
     return context.bot_data['preferences_manager']
 
+def ensure_notifications_initialized(context: CallbackContext) -> NotificationPreferences:
+    """Ensure the notification preferences manager is initialized and return it."""
+    notif_manager = context.bot_data.get('notifications_manager')
+    if notif_manager is None:
+        notif_manager = context.bot_data.setdefault('notifications_manager', NotificationPreferences())
+    return notif_manager
+
+
+_NOTIFICATION_SETUP_MARKUP = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("🔔 Enable", callback_data="notif_enable"),
+        InlineKeyboardButton("🔕 Disable", callback_data="notif_disable")
+    ],
+    [
+        InlineKeyboardButton("📅 Daily", callback_data="notif_freq_daily"),
+        InlineKeyboardButton("📅 Weekly", callback_data="notif_freq_weekly")
+    ],
+    [
+        InlineKeyboardButton("➕ Add Keyword", callback_data="notif_add_keyword"),
+        InlineKeyboardButton("❌ Remove Keyword", callback_data="notif_remove_keyword")
+    ]
+])
 
 def setup_notifications(update: Update, context: CallbackContext) -> None:
     """Setup notification preferences."""
     if not check_channel_subscription(update, context):
         return
 
-    keyboard = [
-        [
-            InlineKeyboardButton("🔔 Enable", callback_data="notif_enable"),
-            InlineKeyboardButton("🔕 Disable", callback_data="notif_disable")
-        ],
-        [
-            InlineKeyboardButton("📅 Daily", callback_data="notif_freq_daily"),
-            InlineKeyboardButton("📅 Weekly", callback_data="notif_freq_weekly")
-        ],
-        [
-            InlineKeyboardButton("➕ Add Keyword", callback_data="notif_add_keyword"),
-            InlineKeyboardButton("❌ Remove Keyword", callback_data="notif_remove_keyword")
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = _NOTIFICATION_SETUP_MARKUP
 
-    notif_manager = NotificationPreferences()
+    notif_manager = ensure_notifications_initialized(context)
     prefs = notif_manager.get_preferences(update.effective_user.id)
 
     status = "✅ Enabled" if prefs['enabled'] else "❌ Disabled"
@@ -2254,7 +2663,7 @@ def handle_notification_keyword(update: Update, context: CallbackContext) -> Non
     keyword = update.message.text.strip().lower()
 
     # Add the keyword to the user's preferences
-    notif_manager = NotificationPreferences()
+    notif_manager = ensure_notifications_initialized(context)
     notif_manager.add_keyword(update.effective_user.id, keyword)
 
     # Clear the awaiting state
@@ -2269,19 +2678,119 @@ def handle_notification_keyword(update: Update, context: CallbackContext) -> Non
 
     return True  # Stop other handlers from processing this message
 
+def _show_notifications(update: Update, context: CallbackContext, notif_manager: NotificationPreferences, prefs: Dict) -> None:
+    show_notifications_menu(update, context)
+
+def _show_keyword_removal(update: Update, context: CallbackContext, notif_manager: NotificationPreferences, prefs: Dict) -> None:
+    keywords = prefs.get('keywords', [])
+    if not keywords:
+        show_notifications_menu(update, context, "❌ No keywords to remove!")
+        return
+
+    keyboard = []
+    for keyword in keywords:
+        keyboard.append([
+            InlineKeyboardButton(
+                f"❌ {keyword}",
+                callback_data=f"notif_remove_keyword_{keyword}"
+            )
+        ])
+
+    keyboard.append([InlineKeyboardButton("« Back to Settings", callback_data="back_to_notifications")])
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    text = "*Remove Keywords*\n\nSelect a keyword to remove:\n\n"
+    text += "• " + "\n• ".join(keywords)
+
+    update.callback_query.edit_message_text(
+        text,
+        reply_markup=reply_markup,
+        parse_mode=ParseMode.MARKDOWN
+    )
+
+def _prompt_for_keyword(update: Update, context: CallbackContext, notif_manager: NotificationPreferences, prefs: Dict) -> None:
+    context.user_data['awaiting_notification_keyword'] = True
+    keyboard = [[InlineKeyboardButton("« Back to Settings", callback_data="back_to_notifications")]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    text = (
+        "*Add New Keyword*\n\n"
+        "Please send the keyword you want to be notified about.\n\n"
+        "*Examples:*\n"
+        "• machine learning\n"
+        "• neural networks\n"
+        "• quantum computing\n\n"
+        "_Click 'Back to Settings' to cancel_"
+    )
+
+    update.callback_query.edit_message_text(
+        text,
+        reply_markup=reply_markup,
+        parse_mode=ParseMode.MARKDOWN
+    )
+
+def _remove_keyword(update: Update, context: CallbackContext, notif_manager: NotificationPreferences, prefs: Dict) -> None:
+    keyword = update.callback_query.data[len("notif_remove_keyword_"):]
+    if keyword in prefs.get('keywords', []):
+        prefs['keywords'].remove(keyword)
+        notif_manager.save_preferences(update.effective_user.id, prefs)
+        show_notifications_menu(update, context, f"✅ Removed keyword: {keyword}")
+    else:
+        show_notifications_menu(update, context, "❌ Keyword not found!")
+
+def _enable_notifications(update: Update, context: CallbackContext, notif_manager: NotificationPreferences, prefs: Dict) -> None:
+    prefs['enabled'] = True
+    notif_manager.save_preferences(update.effective_user.id, prefs)
+    show_notifications_menu(update, context, "✅ Notifications enabled!")
+
+def _disable_notifications(update: Update, context: CallbackContext, notif_manager: NotificationPreferences, prefs: Dict) -> None:
+    prefs['enabled'] = False
+    notif_manager.save_preferences(update.effective_user.id, prefs)
+    show_notifications_menu(update, context, "🔕 Notifications disabled!")
+
+def _set_notification_frequency(update: Update, context: CallbackContext, notif_manager: NotificationPreferences, prefs: Dict) -> None:
+    freq = update.callback_query.data[len("notif_freq_"):]
+    prefs['frequency'] = freq
+    notif_manager.save_preferences(update.effective_user.id, prefs)
+    show_notifications_menu(update, context, f"📅 Frequency set to {freq}!")
+
+# Exact callback_data matches are checked first, then the prefix families in order
+_NOTIFICATION_EXACT = {
+    "back_to_notifications": _show_notifications,
+    "back_notifications": _show_notifications,
+    "back": _show_notifications,
+    "notif_remove": _show_keyword_removal,
+    "notif_remove_keyword": _show_keyword_removal,  # sent by the /notifications setup keyboard
+    "notif_add": _prompt_for_keyword,
+    "notif_add_keyword": _prompt_for_keyword,  # sent by the /notifications setup keyboard
+    "notif_enable": _enable_notifications,
+    "notif_disable": _disable_notifications,
+}
+
+_NOTIFICATION_PREFIX = (
+    ("notif_remove_keyword_", _remove_keyword),
+    ("notif_freq_", _set_notification_frequency),
+)
+
 def handle_notification_callback(update: Update, context: CallbackContext) -> None:
     query = update.callback_query
+    if not query:
+        return
 
-    try:
-        if not query:
-            return
+    # Resolve the action before any I/O; callbacks meant for other menus are left alone
+    handler = _NOTIFICATION_EXACT.get(query.data)
+    if handler is None:
+        handler = next((h for prefix, h in _NOTIFICATION_PREFIX if query.data.startswith(prefix)), None)
+    if handler is None:
+        return
 
+    try:
         query.answer()  # Answer callback immediately to prevent "loading" state
 
         if not check_channel_subscription(update, context):
             return
 
-        notif_manager = NotificationPreferences()
+        notif_manager = ensure_notifications_initialized(context)
         prefs = notif_manager.get_preferences(update.effective_user.id)
 
         # Initialize preferences if they don't exist
@@ -2294,101 +2803,18 @@ def handle_notification_callback(update: Update, context: CallbackContext) -> No
             }
             notif_manager.save_preferences(update.effective_user.id, prefs)
 
-        # Handle back button - Important: Check this first
-        if query.data in ["back_to_notifications", "back_notifications", "back"]:
-            show_notifications_menu(update, context)
-            return
-
-        # Handle other callbacks
-        if query.data == "notif_remove":
-            keywords = prefs.get('keywords', [])
-            if not keywords:
-                show_notifications_menu(update, context, "❌ No keywords to remove!")
-                return
-
-            keyboard = []
-            for keyword in keywords:
-                keyboard.append([
-                    InlineKeyboardButton(
-                        f"❌ {keyword}",
-                        callback_data=f"notif_remove_keyword_{keyword}"
-                    )
-                ])
+        handler(update, context, notif_manager, prefs)
 
-            keyboard.append([InlineKeyboardButton("« Back to Settings", callback_data="back_to_notifications")])
-            reply_markup = InlineKeyboardMarkup(keyboard)
-
-            text = "*Remove Keywords*\n\nSelect a keyword to remove:\n\n"
-            text += "\n".join([f"• {kw}" for kw in keywords])
-
-            query.edit_message_text(
-                text,
-                reply_markup=reply_markup,
-                parse_mode=ParseMode.MARKDOWN
-            )
-            return
-
-        elif query.data == "notif_add":
-            context.user_data['awaiting_notification_keyword'] = True
-            keyboard = [[InlineKeyboardButton("« Back to Settings", callback_data="back_to_notifications")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-
-            text = (
-                "*Add New Keyword*\n\n"
-                "Please send the keyword you want to be notified about.\n\n"
-                "*Examples:*\n"
-                "• machine learning\n"
-                "• neural networks\n"
-                "• quantum computing\n\n"
-                "_Click 'Back to Settings' to cancel_"
-            )
-
-            query.edit_message_text(
-                text,
-                reply_markup=reply_markup,
-                parse_mode=ParseMode.MARKDOWN
-            )
-            return
-
-        elif query.data.startswith("notif_remove_keyword_"):
-            keyword = query.data.replace("notif_remove_keyword_", "")
-            if keyword in prefs.get('keywords', []):
-                prefs['keywords'].remove(keyword)
-                notif_manager.save_preferences(update.effective_user.id, prefs)
-                show_notifications_menu(update, context, f"✅ Removed keyword: {keyword}")
-            else:
-                show_notifications_menu(update, context, "❌ Keyword not found!")
-            return
-
-        elif query.data == "notif_enable":
-            prefs['enabled'] = True
-            notif_manager.save_preferences(update.effective_user.id, prefs)
-            show_notifications_menu(update, context, "✅ Notifications enabled!")
-
-        elif query.data == "notif_disable":
-            prefs['enabled'] = False
-            notif_manager.save_preferences(update.effective_user.id, prefs)
-            show_notifications_menu(update, context, "🔕 Notifications disabled!")
-
-        elif query.data.startswith("notif_freq_"):
-            freq = query.data.replace("notif_freq_", "")
-            prefs['frequency'] = freq
-            notif_manager.save_preferences(update.effective_user.id, prefs)
-            show_notifications_menu(update, context, f"📅 Frequency set to {freq}!")
-
-    except Exception as e:
-        logger.error(f"Error in notification callback: {str(e)}")
-        try:
-            show_notifications_menu(update, context, "❌ An error occurred. Please try again.")
-        except:
-            if update.effective_message:
-                update.effective_message.reply_text("❌ An error occurred. Please use /notifications to start over.")
+    except Exception:
+        logger.exception("Error in notification callback")
+        # show_notifications_menu handles its own failures with a start-over message
+        show_notifications_menu(update, context, "❌ An error occurred. Please try again.")
 
 def show_notifications_menu(update: Update, context: CallbackContext, status_message: str = None) -> None:
     """Show the notifications menu with current settings."""
     try:
         # Get or initialize preferences
-        notif_manager = NotificationPreferences()
+        notif_manager = ensure_notifications_initialized(context)
         prefs = notif_manager.get_preferences(update.effective_user.id)
 
         # Initialize preferences if they don't exist
@@ -2457,94 +2883,129 @@ _All buttons are clickable - tap any option to change settings_
                 parse_mode=ParseMode.MARKDOWN
             )
 
-    except Exception as e:
-        logger.error(f"Error in show_notifications_menu: {str(e)}")
+    except Exception:
+        logger.exception("Error in show_notifications_menu")
         try:
             text = "❌ An error occurred. Please use /notifications to start over."
             if update.callback_query:
                 update.callback_query.edit_message_text(text)
             else:
                 update.message.reply_text(text)
-        except:
-            pass
+        except TelegramError as e:
+            logger.warning(f"Could not report notification menu error: {e}")
 
 def check_notifications(context: CallbackContext) -> None:
     """Check and send notifications to users."""
     job = context.job
-    notif_manager = NotificationPreferences()
-
-    # Get all notification files
-    for filename in os.listdir(notif_manager.notifications_dir):
-        if not filename.startswith("notifications_"):
-            continue
+    notif_manager = ensure_notifications_initialized(context)
 
+    # Users with the same keywords and categories share one arXiv query
+    subscribers = {}
+    for user_id in notif_manager.enabled_users():
         try:
-            user_id = int(filename.split('_')[1].split('.')[0])
             prefs = notif_manager.get_preferences(user_id)
 
             if not prefs['enabled'] or not notif_manager.should_notify(user_id):
                 continue
 
-            # Search for new papers
-            search_query_parts = []
+            query = notif_manager.search_query(user_id, prefs)
+            if query:
+                subscribers.setdefault(query, []).append((user_id, prefs))
 
-            # Add keywords
-            for keyword in prefs['keywords']:
-                search_query_parts.append(keyword)
-
-            # Add categories if any
-            if prefs['categories']:
-                category_filter = ' OR '.join(f'cat:{cat}' for cat in prefs['categories'])
-                search_query_parts.append(f"({category_filter})")
+        except Exception:
+            logger.exception(f"Error processing notifications for user {user_id}")
 
-            # Get papers from last day/week
-            time_window = 7 if prefs['frequency'] == 'weekly' else 1
-            last_check = datetime.strptime(prefs['last_checked'], '%Y-%m-%d %H:%M:%S')
+    # Searches run on the worker pool so one slow arXiv response doesn't hold up the job queue or
+    # the other queries, but only a few lanes at a time so interactive handlers keep their workers
+    pending = deque(subscribers.items())
+    for _ in range(min(NOTIFICATION_SEARCH_LANES, len(pending))):
+        context.dispatcher.run_async(_run_notification_lane, context, notif_manager, pending)
 
-            query = ' AND '.join(f"({part})" for part in search_query_parts if part)
-            search = arxiv.Search(
-                query=query,
-                max_results=10,
-                sort_by=arxiv.SortCriterion.SubmittedDate
-            )
+def _run_notification_lane(context: CallbackContext, notif_manager: NotificationPreferences, pending: deque) -> None:
+    """Work through queued notification queries one at a time until none are left."""
+    while True:
+        try:
+            query, users = pending.popleft()
+        except IndexError:
+            return
+        _notify_subscribers(context, notif_manager, query, users)
 
-            results = list(search.results())
-            new_papers = []
+def _notify_subscribers(context: CallbackContext, notif_manager: NotificationPreferences, query: str, users: list) -> None:
+    """Run one notification query and deliver its results to everyone subscribed to it."""
+    try:
+        results = _cached_arxiv_search(
+            query,
+            max_results=10,
+            sort_by=arxiv.SortCriterion.SubmittedDate
+        )
+    except Exception as e:
+        logger.error(f"Notification search failed for {len(users)} users: {str(e)}")
+        return
 
-            for paper in results:
-                if paper.published.replace(tzinfo=None) > last_check:
-                    new_papers.append(paper)
+    # Only users with something new need a delivery; the rest just record the check together
+    newest = max((paper.published.timestamp() for paper in results), default=0)
+    now = int(time.time())
+    checked = {}
+    for user_id, prefs in users:
+        if newest > (prefs['last_checked'] or 0):
+            # Deliveries fan out over the worker pool, which also bounds how many sends run at once
+            context.dispatcher.run_async(
+                _deliver_notification, context.bot, notif_manager, user_id, prefs, results
+            )
+        else:
+            prefs['last_checked'] = prefs['last_notification'] = now
+            checked[user_id] = prefs
+    notif_manager.save_preferences_bulk(checked)
 
-            if new_papers:
-                # Send notification
-                message = f"🔔 *New Papers Alert!*\n\nFound {len(new_papers)} new papers matching your interests:\n\n"
+def _deliver_notification(bot, notif_manager: NotificationPreferences, user_id: int, prefs: Dict, results: list) -> None:
+    """Send one user the papers published since their last check and record the check."""
+    try:
+        last_check = prefs['last_checked'] or 0
+        new_papers = [
+            paper for paper in results
+            if paper.published.timestamp() > last_check
+        ]
 
-                for i, paper in enumerate(new_papers[:5], 1):
-                    message += f"{i}. [{paper.title}]({paper.pdf_url})\n"
+        if new_papers:
+            # Send notification
+            message = f"🔔 *New Papers Alert!*\n\nFound {len(new_papers)} new papers matching your interests:\n\n"
 
-                if len(new_papers) > 5:
-                    message += f"\n_...and {len(new_papers) - 5} more papers_"
+            for i, paper in enumerate(new_papers[:5], 1):
+                message += f"{i}. [{paper.title}]({paper.pdf_url})\n"
 
-                context.bot.send_message(
-                    chat_id=user_id,
-                    text=message,
-                    parse_mode=ParseMode.MARKDOWN,
-                    disable_web_page_preview=True
-                )
+            if len(new_papers) > 5:
+                message += f"\n_...and {len(new_papers) - 5} more papers_"
 
-            # Update last checked time
-            prefs['last_checked'] = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
-            prefs['last_notification'] = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
-            notif_manager.save_preferences(user_id, prefs)
+            bot.send_message(
+                chat_id=user_id,
+                text=message,
+                parse_mode=ParseMode.MARKDOWN,
+                disable_web_page_preview=True
+            )
 
-        except Exception as e:
-            logger.error(f"Error processing notifications for user {user_id}: {str(e)}")
+        # Update last checked time
+        prefs['last_checked'] = prefs['last_notification'] = int(time.time())
+        notif_manager.save_preferences(user_id, prefs)
 
+    except Exception:
+        logger.exception(f"Error delivering notifications to user {user_id}")
 
 def main() -> None:
-    updater = Updater(TOKEN)
+    updater = Updater(
+        TOKEN,
+        workers=UPDATER_WORKERS,
+        request_kwargs={
+            'con_pool_size': TELEGRAM_POOL_SIZE,
+            'connect_timeout': TELEGRAM_CONNECT_TIMEOUT,
+            'read_timeout': TELEGRAM_READ_TIMEOUT
+        }
+    )
     dp = updater.dispatcher
 
+    # Shared filter instances for the text handlers below
+    text_message = Filters.text & ~Filters.command
+    private_text = text_message & Filters.chat_type.private
+
     advanced_search_handler = ConversationHandler(
         entry_points=[
             CallbackQueryHandler(show_advanced_search_menu, pattern='^advanced_search$')
@@ -2560,16 +3021,16 @@ def main() -> None:
             ],
             ENTER_DATE_FROM: [
                 CallbackQueryHandler(handle_date_input, pattern='^date_'),
-                MessageHandler(Filters.text & ~Filters.command, handle_custom_date_message),  # Add this
+                MessageHandler(text_message, handle_custom_date_message),  # Add this
                 CallbackQueryHandler(show_advanced_search_menu, pattern='^back_to_filters$')
             ],
             ENTER_DATE_TO: [
-                MessageHandler(Filters.text & ~Filters.command, handle_custom_date_message),  # Add this
+                MessageHandler(text_message, handle_custom_date_message),  # Add this
                 CallbackQueryHandler(show_advanced_search_menu, pattern='^back_to_filters$')
             ],
             ENTER_AUTHOR: [
                 CallbackQueryHandler(handle_author_input, pattern='^author_'),
-                MessageHandler(Filters.text & ~Filters.command, handle_author_input),  # Add this
+                MessageHandler(text_message, handle_author_input),  # Add this
                 CallbackQueryHandler(show_advanced_search_menu, pattern='^back_to_filters$')
             ],
             ENTER_MIN_CITATIONS: [
@@ -2588,7 +3049,7 @@ def main() -> None:
     dp.add_handler(advanced_search_handler, group=1)
 
     notification_handler = MessageHandler(
-        Filters.text & ~Filters.command & Filters.chat_type.private,
+        private_text,
         handle_notification_keyword
     )
     dp.add_handler(notification_handler)
@@ -2596,13 +3057,14 @@ def main() -> None:
     document_handler = DocumentHandler()
 
     dp.add_handler(CommandHandler("analyze", document_handler.start))
-    dp.add_handler(MessageHandler(Filters.document, document_handler.handle_document))
-    dp.add_handler(CallbackQueryHandler(document_handler.handle_document_query, pattern=r'^doc_.*'))
-    dp.add_handler(CallbackQueryHandler(document_handler.handle_analysis_query, pattern=r'analysis_.*'))
-    dp.add_handler(MessageHandler(Filters.text & ~Filters.command, document_handler.handle_text_query))
+    # Document handlers download files and wait on Gemini, so they run on the worker pool
+    dp.add_handler(MessageHandler(Filters.document, document_handler.handle_document, run_async=True))
+    dp.add_handler(CallbackQueryHandler(document_handler.handle_document_query, pattern='^doc_', run_async=True))
+    dp.add_handler(CallbackQueryHandler(document_handler.handle_analysis_query, pattern='^analysis_', run_async=True))
+    dp.add_handler(MessageHandler(text_message, document_handler.handle_text_query, run_async=True))
 
     dp.add_handler(MessageHandler(
-        Filters.text & ~Filters.command & Filters.chat_type.private,
+        private_text,
         handle_stars_amount),
         group=1
     )
@@ -2615,12 +3077,24 @@ def main() -> None:
     global preferences_manager
     preferences_manager = UserPreferences()
     dp.bot_data['preferences_manager'] = preferences_manager
+    notifications_manager = NotificationPreferences()
+    dp.bot_data['notifications_manager'] = notifications_manager
+
+    # Saved preferences are written in batches so bursts of taps cost one write per user
+    updater.job_queue.run_repeating(lambda _: preferences_manager.flush(), interval=UserPreferences.FLUSH_INTERVAL)
+    updater.job_queue.run_repeating(lambda _: notifications_manager.flush(), interval=NotificationPreferences.FLUSH_INTERVAL)
+    updater.job_queue.run_repeating(
+        check_notifications,
+        interval=NOTIFICATION_CHECK_INTERVAL,
+        first=NOTIFICATION_CHECK_FIRST
+    )
 
     admin_manager = AdminManager()
     dp.bot_data['admin_manager'] = admin_manager
 
     dp.add_handler(CommandHandler("admin", admin_command))
     dp.add_handler(CallbackQueryHandler(handle_admin_callback, pattern="^admin_"))
+    dp.add_handler(ChatMemberHandler(handle_channel_member_update, ChatMemberHandler.CHAT_MEMBER))
 
     voice_handler = VoiceSearchHandler()
     dp.bot_data['chat_handler'] = ChatHandler()
@@ -2628,38 +3102,41 @@ def main() -> None:
     # Add command handlers
     dp.add_handler(CommandHandler("start", start), group=2)
     dp.add_handler(CommandHandler("help", help_command), group=2)
-    dp.add_handler(CommandHandler("search", handle_search), group=2)
+    dp.add_handler(CommandHandler("search", handle_search, run_async=True), group=2)
     dp.add_handler(CommandHandler("about", about_command), group=2)
     add_support_handlers(dp)
-    add_support_handlers(dp)
     add_stars_handlers(dp)
     add_payment_handlers(dp)
-    dp.add_handler(CommandHandler("latest", get_latest_papers), group=2)
-    dp.add_handler(CommandHandler("compare", generate_comparison), group=2)
+    dp.add_handler(CommandHandler("latest", get_latest_papers, run_async=True), group=2)
+    dp.add_handler(CommandHandler("compare", generate_comparison, run_async=True), group=2)
     dp.add_handler(CommandHandler("clear_comparison", clear_comparison), group=2)
     dp.add_handler(CommandHandler("settings", settings_command), group=2)
     dp.add_handler(CommandHandler("notifications", setup_notifications), group=2)
-    dp.add_handler(CommandHandler("notifications", show_notifications_menu), group=2)
     dp.add_handler(CommandHandler("model", model_command))
     dp.add_handler(CallbackQueryHandler(model_command, pattern="^back_to_models$"))
     dp.add_handler(CallbackQueryHandler(handle_model_selection, pattern="^model_"))
 
     # Add callback handlers
-    dp.add_handler(CallbackQueryHandler(handle_notification_callback))
-    dp.add_handler(CallbackQueryHandler(handle_notification_callback, pattern="^notif_"), group=2)
+    dp.add_handler(CallbackQueryHandler(
+        handle_notification_callback,
+        pattern="^(?:notif_|back_to_notifications$|back_notifications$|back$)"
+    ), group=2)
     dp.add_handler(CallbackQueryHandler(handle_settings_callback, pattern="^settings_"), group=2)
     dp.add_handler(CallbackQueryHandler(handle_max_results_callback, pattern="^set_max_results_"), group=2)
     dp.add_handler(CallbackQueryHandler(handle_journal_actions, pattern="^journal_"), group=2)
     dp.add_handler(CallbackQueryHandler(handle_back_to_settings, pattern="^back_settings$"), group=2)
-    dp.add_handler(CallbackQueryHandler(summarize_paper, pattern="^summarize_"), group=2)
-    dp.add_handler(CallbackQueryHandler(download_paper, pattern="^download_"), group=2)
+    dp.add_handler(CallbackQueryHandler(summarize_paper, pattern="^summarize_", run_async=True), group=2)
+    dp.add_handler(CallbackQueryHandler(download_paper, pattern="^download_", run_async=True), group=2)
     dp.add_handler(CallbackQueryHandler(handle_more_results, pattern="^more_results"), group=2)
     dp.add_handler(CallbackQueryHandler(add_paper_to_comparison, pattern="^compare_add_"), group=2)
-    dp.add_handler(CallbackQueryHandler(voice_handler.handle_voice_callback, pattern='^(retry|edit|search)_voice_'))
+    dp.add_handler(CallbackQueryHandler(
+        voice_handler.handle_voice_callback,
+        pattern='^(?:retry|edit|search)_voice_',
+        run_async=True
+    ))
     dp.add_handler(CallbackQueryHandler(handle_categories_menu, pattern="^settings_categories$"), group=2)
     dp.add_handler(CallbackQueryHandler(handle_category_field, pattern="^category_field_"), group=2)
     dp.add_handler(CallbackQueryHandler(handle_category_toggle, pattern="^toggle_category_"), group=2)
-    dp.add_handler(CallbackQueryHandler(handle_notification_callback, pattern="^keyword_"), group=2)
 
 
     dp.add_handler(CallbackQueryHandler(end_chat_command, pattern="^end_chat$"))
@@ -2669,65 +3146,68 @@ def main() -> None:
     dp.add_handler(CommandHandler("endchat", end_chat_command))
     dp.add_handler(CallbackQueryHandler(end_chat_command, pattern="^end_chat$"), group=2)
 
-    dp.add_handler(MessageHandler(
-        Filters.text & ~Filters.command & (
-            Filters.regex(r'expecting_restriction') |
-            Filters.regex(r'expecting_block') |
-            Filters.regex(r'expecting_unrestrict') |
-            Filters.regex(r'expecting_admin_add') |
-            Filters.regex(r'expecting_admin_remove')
-        ),
-        handle_restriction_input
-    ))
+    # Runs before every other text handler so admin input is never treated as a search or question
+    dp.add_handler(MessageHandler(text_message, handle_restriction_input), group=-1)
 
 
     # Add chat message handler with lower priority than other handlers
     dp.add_handler(MessageHandler(
-        Filters.text & ~Filters.command & Filters.chat_type.private,
-        handle_chat_message
+        private_text,
+        handle_chat_message,
+        run_async=True
     ), group=5)  # Higher group number means lower priority
 
     dp.add_handler(CallbackQueryHandler(
         handle_search_options,
-        pattern='^(simple_search|advanced_search|back_to_search_options)$'
+        pattern='^(?:simple_search|advanced_search|back_to_search_options)$'
     ), group=2)  # Using group=-1 to ensure this runs before others
 
 
 
     # Make sure simple search input handler has lower priority
     dp.add_handler(MessageHandler(
-        Filters.text & ~Filters.command & ~Filters.regex('^/'),
-        handle_simple_search_input
+        text_message,
+        chat_ordered(handle_simple_search_input)
     ), group=4)
 
-    # Add journal name handler (medium priority)
-    journal_handler = MessageHandler(
-        Filters.text & ~Filters.command & Filters.chat_type.private,
-        lambda u, c: handle_journal_name_message(u, c) if not c.user_data.get('awaiting_notification_keyword') else None
-    )
-    dp.add_handler(journal_handler, group=2)
-
-    # Add general chat handler (lowest priority)
-    chat_handler = MessageHandler(
-        Filters.text & ~Filters.command & Filters.chat_type.private,
-        lambda u, c: chat_about_paper(u, c) if not (
-            c.user_data.get('awaiting_notification_keyword') or
-            c.user_data.get('awaiting_journal_name')
-        ) else None
-    )
-    dp.add_handler(chat_handler, group=3)
+    # Journal names and paper questions share one private text handler
+    dp.add_handler(MessageHandler(
+        private_text,
+        route_private_text
+    ), group=2)
 
     # Add voice handler
     dp.add_handler(MessageHandler(
         Filters.voice & Filters.chat_type.private,
-        voice_handler.process_voice
+        chat_ordered(voice_handler.process_voice)  # Downloads and transcribes the audio before searching
     ))
 
 
-    # Start the Bot
-    updater.start_polling()
+    # Start the Bot, receiving only the update types we handle
+    allowed_updates = ['message', 'callback_query', 'pre_checkout_query', 'chat_member']
+    if WEBHOOK_URL:
+        # The token in the path keeps other senders from posting fake updates
+        updater.start_webhook(
+            listen='0.0.0.0',
+            port=WEBHOOK_PORT,
+            url_path=TOKEN,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{TOKEN}",
+            bootstrap_retries=-1,
+            allowed_updates=allowed_updates
+        )
+    else:
+        updater.start_polling(
+            poll_interval=0,
+            timeout=POLL_TIMEOUT,
+            bootstrap_retries=-1,
+            allowed_updates=allowed_updates
+        )
     logger.info("✨ ArXiv Research Assistant is online! 🚀")
     updater.idle()
 
+    # Write out anything saved since the last flush before exiting
+    preferences_manager.flush()
+    notifications_manager.flush()
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
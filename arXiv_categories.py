@@ -3,6 +3,8 @@ ArXiv Categories and Subcategories
 Source: https://arxiv.org/category_taxonomy
 """
 
+from types import MappingProxyType
+
 ARXIV_CATEGORIES = {
     "Physics": {
         "astro-ph": {
@@ -257,4 +259,13 @@ ARXIV_CATEGORIES = {
             }
         }
     }
-}
\ No newline at end of file
+}
+
+# category_id -> (main_category, parent_category_id or None for top-level entries)
+_parents = {}
+for _main_cat, _categories in ARXIV_CATEGORIES.items():
+    for _cat_id, _cat_data in _categories.items():
+        _parents[_cat_id] = (_main_cat, None)
+        for _sub_id in _cat_data['subcategories']:
+            _parents[_sub_id] = (_main_cat, _cat_id)
+CATEGORY_PARENT = MappingProxyType(_parents)
@@ -1,8 +1,12 @@
 import logging
-from typing import Dict, List, Optional
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import hashlib
 import os
+import random
 from datetime import datetime
-import tempfile
+import threading
+from collections import OrderedDict, deque
 from pathlib import Path
 import fitz  # PyMuPDF for PDF handling
 import docx  # python-docx for DOCX handling
@@ -10,7 +14,7 @@ from pptx import Presentation  # python-pptx for PowerPoint
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ParseMode, ChatAction, CallbackQuery
 from telegram.ext import CallbackContext
 import google.generativeai as genai
-from io import BytesIO
+from io import BytesIO, TextIOWrapper
 import re
 from dotenv import load_dotenv
 
@@ -42,55 +46,216 @@ NON_ACADEMIC_MESSAGES = [
     "🎮 This looks fun, but I'm more of a scholarly papers kind of bot! Got any of those? 📝",
 ]
 
-# Keywords indicating academic content
+# Plain text extraction; ligatures are expanded ("ﬁ" -> "fi") so keyword matching and prompts see normal words
+PDF_TEXT_FLAGS = fitz.TEXT_PRESERVE_WHITESPACE | fitz.TEXT_MEDIABOX_CLIP
+
+# Documents are kept per chat, least recently used first; older ones are dropped beyond this
+MAX_ACTIVE_DOCUMENTS = 256
+# Gemini answers kept for re-uploaded documents and repeated menu clicks, keyed by prompt hash
+RESPONSE_CACHE_SIZE = 512
+# Only the most recent Q&A messages go into chat prompts, so no more are kept
+CHAT_HISTORY_LENGTH = 5
+
+# Keywords indicating academic content, compiled once at import
 ACADEMIC_INDICATORS = {
-    'strong': [
+    'strong': [re.compile(pattern) for pattern in (
         r'abstract', r'introduction', r'methodology', r'conclusion',
         r'references', r'citation[s]?', r'bibliography', r'hypothesis',
         r'research', r'analysis', r'study', r'experiment[s]?',
         r'data', r'results', r'discussion', r'findings'
-    ],
-    'moderate': [
+    )],
+    'moderate': [re.compile(pattern) for pattern in (
         r'figure[s]?', r'table[s]?', r'equation[s]?', r'theory',
         r'model[s]?', r'algorithm[s]?', r'method[s]?', r'framework',
         r'approach', r'implementation', r'evaluation'
-    ]
+    )]
 }
 
+# All indicators in one scan. The lookahead lets matches overlap, and longer words come first so a
+# word containing a shorter indicator at its start (methodology/method) is reported as both.
+ACADEMIC_INDICATOR_SCAN = re.compile('(?=(' + '|'.join(sorted(
+    (pattern.pattern for patterns in ACADEMIC_INDICATORS.values() for pattern in patterns),
+    key=len, reverse=True
+)) + '))')
+
+# Papers put their abstract and introduction near the start and references near the end,
+# so long documents are classified from these windows before falling back to a full scan
+ACADEMIC_HEAD_CHARS = 20000
+ACADEMIC_TAIL_CHARS = 10000
+
+# Static menus are identical on every callback, so build them once at import
+_BACK_TO_DOC_MENU_BUTTON = InlineKeyboardButton("🔄 Back", callback_data="doc_main_menu")
+
+_DOC_MENU_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📝 Summary", callback_data="doc_summary"),
+     InlineKeyboardButton("🔍 Detailed Analysis", callback_data="doc_analysis")],
+    [InlineKeyboardButton("❓ Ask Question", callback_data="doc_question"),
+     InlineKeyboardButton("📊 Key Points", callback_data="doc_keypoints")],
+    [InlineKeyboardButton("📚 Related Papers", callback_data="doc_related"),
+     InlineKeyboardButton("🎯 Research Gap", callback_data="doc_gaps")]
+])
+
+_ANALYSIS_MENU_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📊 Methods", callback_data="analysis_methods"),
+     InlineKeyboardButton("🎯 Results", callback_data="analysis_results")],
+    [InlineKeyboardButton("💡 Innovation", callback_data="analysis_innovation"),
+     InlineKeyboardButton("📈 Impact", callback_data="analysis_impact")],
+    [_BACK_TO_DOC_MENU_BUTTON]
+])
+
+_QUESTION_MODE_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📝 Example Questions", callback_data="doc_example_questions"),
+     InlineKeyboardButton("🎯 Exit Q&A", callback_data="doc_main_menu")]
+])
+
+_KEY_POINTS_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📈 Visualize Points", callback_data="keypoints_visualize"),
+     InlineKeyboardButton("🔍 Expand Point", callback_data="keypoints_expand")],
+    [_BACK_TO_DOC_MENU_BUTTON]
+])
+
+_RESEARCH_GAPS_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("💡 Suggest Extensions", callback_data="gaps_suggest_extensions"),
+     InlineKeyboardButton("🔍 Explore Gap", callback_data="gaps_explore")],
+    [_BACK_TO_DOC_MENU_BUTTON]
+])
+
+_BACK_TO_ANALYSIS_MARKUP = InlineKeyboardMarkup([[
+    InlineKeyboardButton("🔄 Back to Analysis", callback_data="doc_analysis")
+]])
+
+@lru_cache(maxsize=None)
+def _indicators_at(word: str) -> Tuple[frozenset, frozenset]:
+    """Return the strong and moderate indicators that match at the start of word."""
+    return (
+        frozenset(i for i, pattern in enumerate(ACADEMIC_INDICATORS['strong']) if pattern.match(word)),
+        frozenset(i for i, pattern in enumerate(ACADEMIC_INDICATORS['moderate']) if pattern.match(word))
+    )
+
+@lru_cache(maxsize=1)
+def _get_document_model() -> genai.GenerativeModel:
+    """Build the Gemini model used for document analysis once per process."""
+    try:
+        # Initialize Gemini model with advanced configuration
+        generation_config = {
+            'temperature': 0.7,
+            'top_p': 0.9,
+            'top_k': 40,
+            'max_output_tokens': 2048,
+        }
+
+        safety_settings = [
+            {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+            {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+            {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+            {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"}
+        ]
+
+        model = genai.GenerativeModel(
+            model_name='gemini-1.5-pro',
+            generation_config=generation_config,
+            safety_settings=safety_settings
+        )
+
+        logger.info("🤖 Gemini AI model initialized successfully!")
+        return model
+
+    except Exception as e:
+        logger.error(f"❌ Failed to initialize Gemini AI model: {str(e)}")
+        raise
+
 class DocumentHandler:
     """Handles document processing and analysis using Gemini AI."""
 
-    def __init__(self):
-        """Initialize DocumentHandler with its own Gemini model instance."""
-        try:
-            # Initialize Gemini model with advanced configuration
-            generation_config = {
-                'temperature': 0.7,
-                'top_p': 0.9,
-                'top_k': 40,
-                'max_output_tokens': 2048,
-            }
-
-            safety_settings = [
-                {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-                {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-                {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-                {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"}
-            ]
-
-            self.model = genai.GenerativeModel(
-                model_name='gemini-1.5-pro',
-                generation_config=generation_config,
-                safety_settings=safety_settings
-            )
+    # Prompt templates are static; only the document analysis is filled in per request
+    SUMMARY_PROMPT = """
+        Create a concise summary of this academic document.
+        Focus on main contributions, methodology, and key findings.
+        Format with clear sections and emoji indicators.
 
-            logger.info("🤖 Gemini AI model initialized successfully!")
+        Document: {analysis}
+        """
 
-        except Exception as e:
-            logger.error(f"❌ Failed to initialize Gemini AI model: {str(e)}")
-            raise
+    KEY_POINTS_PROMPT = """
+        Extract the most important key points from this academic document.
+        Include:
+        1. Major contributions
+        2. Critical findings
+        3. Novel insights
+        4. Important conclusions
+
+        Format them as a bulleted list with emojis.
+
+        Document analysis: {analysis}
+        """
+
+    RELATED_TERMS_PROMPT = """
+        Extract 3-5 key search terms from this document that would be
+        most effective for finding related academic papers. Focus on:
+        1. Core concepts
+        2. Methodologies
+        3. Research areas
 
-        self.user_documents: Dict[int, Dict] = {}
+        Document: {analysis}
+        """
+
+    RESEARCH_GAPS_PROMPT = """
+        Analyze this academic document to identify:
+        1. Current research gaps
+        2. Limitations of the work
+        3. Potential future research directions
+        4. Unexplored aspects of the topic
+
+        Format the response with clear sections and recommendations.
+
+        Document: {analysis}
+        """
+
+    ANALYSIS_PROMPTS = {
+        'analysis_methods': (
+            "🔬 *Methodology Analysis*\n\n"
+            "Analyze and explain the research methodology, including:\n"
+            "1. Research approach\n"
+            "2. Data collection methods\n"
+            "3. Analysis techniques\n"
+            "4. Validation methods"
+        ),
+        'analysis_results': (
+            "📊 *Results Analysis*\n\n"
+            "Analyze the key findings, including:\n"
+            "1. Main results\n"
+            "2. Statistical significance\n"
+            "3. Practical implications\n"
+            "4. Comparative analysis"
+        ),
+        'analysis_innovation': (
+            "💡 *Innovation Analysis*\n\n"
+            "Identify and analyze innovative aspects:\n"
+            "1. Novel contributions\n"
+            "2. Technical advancements\n"
+            "3. Theoretical contributions\n"
+            "4. Methodological innovations"
+        ),
+        'analysis_impact': (
+            "📈 *Impact Analysis*\n\n"
+            "Evaluate the research impact:\n"
+            "1. Academic significance\n"
+            "2. Practical applications\n"
+            "3. Industry relevance\n"
+            "4. Future implications"
+        )
+    }
+
+    def __init__(self):
+        """Initialize DocumentHandler with the shared document Gemini model."""
+        self.model = _get_document_model()
+
+        # chat_id -> document info, least recently used first
+        self.user_documents: Dict[int, Dict] = OrderedDict()
+        self._documents_lock = threading.Lock()
+        # prompt digest -> response text, least recently used first
+        self._responses: Dict[bytes, str] = OrderedDict()
+        self._responses_lock = threading.Lock()
         self.max_chunk_size = 30000
 
         self.system_prompt = """
@@ -145,85 +310,93 @@ class DocumentHandler:
             )
             return
 
-        # Create temp file
-        with tempfile.NamedTemporaryFile(suffix=file_extension, delete=False) as temp_file:
-            # Download document
-            doc_file.download(custom_path=temp_file.name)
-
-            # Extract text based on file type
-            text_content = self._extract_text(temp_file.name, file_extension)
-
-            # Check if document is academic
-            if not self._is_academic_document(text_content):
-                message.reply_text(
-                    self._get_random_non_academic_message(),
-                    parse_mode=ParseMode.MARKDOWN
-                )
-                os.unlink(temp_file.name)
-                return
-
-            # Process and store document
-            doc_info = self._process_document(text_content, message.document.file_name)
-            self.user_documents[chat_id] = doc_info
+        # Download into memory; every extractor reads from a stream, so nothing touches the disk
+        document_stream = BytesIO()
+        doc_file.download(out=document_stream)
+        document_stream.seek(0)
+
+        # Extract text based on file type
+        text_content = self._extract_text(document_stream, file_extension)
 
-            # Create interactive keyboard
-            keyboard = [
-                [InlineKeyboardButton("📝 Summary", callback_data="doc_summary"),
-                 InlineKeyboardButton("🔍 Detailed Analysis", callback_data="doc_analysis")],
-                [InlineKeyboardButton("❓ Ask Question", callback_data="doc_question"),
-                 InlineKeyboardButton("📊 Key Points", callback_data="doc_keypoints")],
-                [InlineKeyboardButton("📚 Related Papers", callback_data="doc_related"),
-                 InlineKeyboardButton("🎯 Research Gap", callback_data="doc_gaps")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-
-            # Send welcome message
+        # Long PDFs skip their middle pages; they are only read if the classifier needs the whole text
+        read_full_text = None
+        if file_extension == '.pdf':
+            read_full_text = lambda: self._extract_pdf_text(document_stream, skip_middle=False)
+
+        # Check if document is academic
+        if not self._is_academic_document(text_content, read_full_text):
             message.reply_text(
-                f"🌟 *Document Analysis Ready!*\n\n"
-                f"I've processed your document: `{message.document.file_name}`\n\n"
-                f"What would you like to know about it? Choose an option below or simply ask me anything! 🤓",
-                parse_mode=ParseMode.MARKDOWN,
-                reply_markup=reply_markup
+                self._get_random_non_academic_message(),
+                parse_mode=ParseMode.MARKDOWN
             )
+            return
+
+        # Process and store document
+        doc_info = self._process_document(text_content, message.document.file_name)
+        self._store_document(chat_id, doc_info)
+
+        # Send welcome message
+        message.reply_text(
+            f"🌟 *Document Analysis Ready!*\n\n"
+            f"I've processed your document: `{message.document.file_name}`\n\n"
+            f"What would you like to know about it? Choose an option below or simply ask me anything! 🤓",
+            parse_mode=ParseMode.MARKDOWN,
+            reply_markup=_DOC_MENU_MARKUP
+        )
 
-    def _extract_text(self, file_path: str, extension: str) -> str:
+    def _extract_text(self, stream: BytesIO, extension: str) -> str:
         """Extract text from different document formats."""
         try:
             if extension == '.pdf':
-                return self._extract_pdf_text(file_path)
+                return self._extract_pdf_text(stream)
             elif extension == '.txt':
-                return self._extract_txt_text(file_path)
+                return self._extract_txt_text(stream)
             elif extension == '.docx':
-                return self._extract_docx_text(file_path)
+                return self._extract_docx_text(stream)
             elif extension == '.pptx':
-                return self._extract_pptx_text(file_path)
+                return self._extract_pptx_text(stream)
             else:
                 raise ValueError(f"Unsupported file format: {extension}")
         except Exception as e:
             logger.error(f"Error extracting text from {extension} file: {str(e)}")
             raise
 
-    def _extract_pdf_text(self, file_path: str) -> str:
+    def _extract_pdf_text(self, stream: BytesIO, skip_middle: bool = True) -> str:
         """Extract text from PDF files."""
-        text = []
-        with fitz.open(file_path) as doc:
-            for page in doc:
-                text.append(page.get_text())
-        return "\n".join(text)
-
-    def _extract_txt_text(self, file_path: str) -> str:
+        # Only the first chunk and the classification windows are usually read, so long PDFs
+        # skip the pages between the opening chunk and the closing references
+        head_limit = self.max_chunk_size if skip_middle else float('inf')
+        with fitz.open(stream=stream.getvalue(), filetype="pdf") as doc:
+            head, head_length = [], 0
+            first_unread = 0
+            while first_unread < doc.page_count and head_length < head_limit:
+                text = doc[first_unread].get_text("text", flags=PDF_TEXT_FLAGS)
+                head.append(text)
+                head_length += len(text)
+                first_unread += 1
+
+            tail, tail_length = [], 0
+            last_unread = doc.page_count - 1
+            while last_unread >= first_unread and tail_length < ACADEMIC_TAIL_CHARS:
+                text = doc[last_unread].get_text("text", flags=PDF_TEXT_FLAGS)
+                tail.append(text)
+                tail_length += len(text)
+                last_unread -= 1
+
+        return "\n".join(head + tail[::-1])
+
+    def _extract_txt_text(self, stream: BytesIO) -> str:
         """Extract text from TXT files."""
-        with open(file_path, 'r', encoding='utf-8') as file:
-            return file.read()
+        return TextIOWrapper(stream, encoding='utf-8').read()
 
-    def _extract_docx_text(self, file_path: str) -> str:
+    def _extract_docx_text(self, stream: BytesIO) -> str:
         """Extract text from DOCX files."""
-        doc = docx.Document(file_path)
+        doc = docx.Document(stream)
         return "\n".join([paragraph.text for paragraph in doc.paragraphs])
 
-    def _extract_pptx_text(self, file_path: str) -> str:
+    def _extract_pptx_text(self, stream: BytesIO) -> str:
         """Extract text from PPTX files."""
-        prs = Presentation(file_path)
+        prs = Presentation(stream)
         text = []
         for slide in prs.slides:
             for shape in slide.shapes:
@@ -231,18 +404,33 @@ class DocumentHandler:
                     text.append(shape.text)
         return "\n".join(text)
 
-    def _is_academic_document(self, text: str) -> bool:
-        """Check if document appears to be academic."""
-        text_lower = text.lower()
-        strong_matches = sum(1 for pattern in ACADEMIC_INDICATORS['strong']
-                           if re.search(pattern, text_lower))
-        moderate_matches = sum(1 for pattern in ACADEMIC_INDICATORS['moderate']
-                             if re.search(pattern, text_lower))
-        return (strong_matches >= 3) or (strong_matches >= 2 and moderate_matches >= 3)
+    def _is_academic_document(self, text: str, read_full_text: Optional[Callable[[], str]] = None) -> bool:
+        """Check if document appears to be academic; read_full_text supplies any text left out of text."""
+        if len(text) > ACADEMIC_HEAD_CHARS + ACADEMIC_TAIL_CHARS:
+            sample = (text[:ACADEMIC_HEAD_CHARS] + '\n' + text[-ACADEMIC_TAIL_CHARS:]).lower()
+            academic, strong_count = self._scan_indicators(sample)
+            # Only a partial match is worth a pass over the whole document
+            if academic or not strong_count:
+                return academic
+            # Extraction may have skipped pages that the full scan has to see
+            if read_full_text is not None:
+                text = read_full_text()
+        return self._scan_indicators(text.lower())[0]
+
+    def _scan_indicators(self, text_lower: str) -> Tuple[bool, int]:
+        """Return whether the text passes the academic threshold and how many strong indicators it has."""
+        strong, moderate = set(), set()
+        for match in ACADEMIC_INDICATOR_SCAN.finditer(text_lower):
+            found_strong, found_moderate = _indicators_at(match.group(1))
+            strong |= found_strong
+            moderate |= found_moderate
+            if len(strong) >= 3 or (len(strong) >= 2 and len(moderate) >= 3):
+                return True, len(strong)  # Decided; skip the rest of the text
+        return False, len(strong)
 
     def _get_random_non_academic_message(self) -> str:
         """Return random fun message for non-academic docs."""
-        return NON_ACADEMIC_MESSAGES[int(datetime.now().timestamp()) % len(NON_ACADEMIC_MESSAGES)]
+        return random.choice(NON_ACADEMIC_MESSAGES)
 
     def _process_document(self, text: str, filename: str) -> Dict:
         """Process and analyze document content."""
@@ -259,43 +447,72 @@ class DocumentHandler:
         {chunks[0]}
         """
 
-        response = self.model.generate_content(prompt)
+        analysis = self._generate_cached(prompt)
 
         return {
             'filename': filename,
-            'chunks': chunks,
-            'initial_analysis': response.text,
+            'chunk_count': len(chunks),
+            'initial_analysis': analysis,
             'timestamp': datetime.now().isoformat(),
-            'chat_history': []
+            'chat_history': deque(maxlen=CHAT_HISTORY_LENGTH)
         }
 
+    def _generate_cached(self, prompt: str) -> str:
+        """Return Gemini's answer to prompt, reusing the answer to an identical earlier prompt."""
+        key = hashlib.blake2b(prompt.encode(), digest_size=16).digest()
+        with self._responses_lock:
+            text = self._responses.get(key)
+            if text is not None:
+                self._responses.move_to_end(key)
+                return text
+
+        text = self.model.generate_content(prompt).text
+        with self._responses_lock:
+            self._responses[key] = text
+            while len(self._responses) > RESPONSE_CACHE_SIZE:
+                self._responses.popitem(last=False)
+        return text
+
     def _split_into_chunks(self, text: str) -> List[str]:
         """Split text into manageable chunks for processing."""
+        # Slice the text directly, breaking at the last newline that fits in each chunk
         chunks = []
-        current_chunk = []
-        current_length = 0
-
-        for paragraph in text.split('\n'):
-            if current_length + len(paragraph) > self.max_chunk_size:
-                if current_chunk:
-                    chunks.append('\n'.join(current_chunk))
-                current_chunk = [paragraph]
-                current_length = len(paragraph)
-            else:
-                current_chunk.append(paragraph)
-                current_length += len(paragraph)
-
-        if current_chunk:
-            chunks.append('\n'.join(current_chunk))
-
-        return chunks
+        start = 0
+        length = len(text)
+        while start < length:
+            end = min(start + self.max_chunk_size, length)
+            next_start = end
+            if end < length:
+                newline = text.rfind('\n', start, end)
+                if newline > start:
+                    end, next_start = newline, newline + 1
+            chunks.append(text[start:end])
+            start = next_start
+
+        return chunks or [text]
+
+    def _get_document(self, chat_id: int) -> Optional[Dict]:
+        """Return the chat's active document, if it is still kept."""
+        with self._documents_lock:
+            doc_info = self.user_documents.get(chat_id)
+            if doc_info is not None:
+                self.user_documents.move_to_end(chat_id)
+            return doc_info
+
+    def _store_document(self, chat_id: int, doc_info: Dict) -> None:
+        with self._documents_lock:
+            self.user_documents[chat_id] = doc_info
+            self.user_documents.move_to_end(chat_id)
+            while len(self.user_documents) > MAX_ACTIVE_DOCUMENTS:
+                self.user_documents.popitem(last=False)
 
     def handle_document_query(self, update: Update, context: CallbackContext) -> None:
         """Handle user queries about the document."""
         query = update.callback_query
         chat_id = update.effective_chat.id
 
-        if chat_id not in self.user_documents:
+        doc_info = self._get_document(chat_id)
+        if doc_info is None:
             query.message.reply_text(
                 "🎭 Oops! I don't see any active document to analyze.\n"
                 "Send me an academic document first! 📚",
@@ -303,7 +520,6 @@ class DocumentHandler:
             )
             return
 
-        doc_info = self.user_documents[chat_id]
         action = query.data
 
         if action == "doc_summary":
@@ -326,7 +542,8 @@ class DocumentHandler:
         chat_id = update.effective_chat.id
         message = update.message
 
-        if chat_id not in self.user_documents:
+        doc_info = self._get_document(chat_id)
+        if doc_info is None:
             message.reply_text(
                 "🎭 I'd love to help, but I don't see any active document!\n"
                 "Send me an academic document first, and I'll answer all your questions! 📚",
@@ -334,7 +551,6 @@ class DocumentHandler:
             )
             return
 
-        doc_info = self.user_documents[chat_id]
         doc_info['chat_history'].append({
             'role': 'user',
             'content': message.text,
@@ -360,30 +576,24 @@ class DocumentHandler:
         {question}
 
         Previous conversation:
-        {self._format_chat_history(doc_info['chat_history'][-5:])}
+        {self._format_chat_history(doc_info['chat_history'])}
 
         Document analysis:
         {doc_info['initial_analysis']}
         """
 
-    def _format_chat_history(self, history: List[Dict]) -> str:
+    def _format_chat_history(self, history: Iterable[Dict]) -> str:
         """Format chat history for context."""
         return "\n".join(f"{msg['role'].upper()}: {msg['content']}" for msg in history)
 
     def _generate_summary(self, query: CallbackQuery, doc_info: Dict) -> None:
         """Generate and send document summary."""
         query.answer("🎯 Generating summary...")
-        prompt = f"""
-        Create a concise summary of this academic document.
-        Focus on main contributions, methodology, and key findings.
-        Format with clear sections and emoji indicators.
-
-        Document: {doc_info['initial_analysis']}
-        """
+        prompt = self.SUMMARY_PROMPT.format(analysis=doc_info['initial_analysis'])
 
-        response = self.model.generate_content(prompt)
+        summary = self._generate_cached(prompt)
         query.message.reply_text(
-            f"📚 *Document Summary*\n\n{response.text}",
+            f"📚 *Document Summary*\n\n{summary}",
             parse_mode=ParseMode.MARKDOWN
         )
 
@@ -391,15 +601,6 @@ class DocumentHandler:
         """Generate detailed analysis options."""
         query.answer("🔬 Analyzing in detail...")
 
-        keyboard = [
-            [InlineKeyboardButton("📊 Methods", callback_data="analysis_methods"),
-             InlineKeyboardButton("🎯 Results", callback_data="analysis_results")],
-            [InlineKeyboardButton("💡 Innovation", callback_data="analysis_innovation"),
-             InlineKeyboardButton("📈 Impact", callback_data="analysis_impact")],
-            [InlineKeyboardButton("🔄 Back", callback_data="doc_main_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
         query.message.reply_text(
             "🔍 *Choose an aspect to analyze:*\n\n"
             "• *Methods*: Research methodology\n"
@@ -407,19 +608,13 @@ class DocumentHandler:
             "• *Innovation*: Novel contributions\n"
             "• *Impact*: Significance",
             parse_mode=ParseMode.MARKDOWN,
-            reply_markup=reply_markup
+            reply_markup=_ANALYSIS_MENU_MARKUP
         )
 
     def _handle_question_mode(self, query: CallbackQuery, doc_info: Dict) -> None:
         """Enable question mode for the document."""
         query.answer("❓ Question mode activated!")
 
-        keyboard = [
-            [InlineKeyboardButton("📝 Example Questions", callback_data="doc_example_questions"),
-             InlineKeyboardButton("🎯 Exit Q&A", callback_data="doc_main_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
         query.message.reply_text(
             "🤓 *Ask Me Anything Mode Activated!*\n\n"
             "Just type your question about the document, and I'll answer!\n\n"
@@ -431,73 +626,47 @@ class DocumentHandler:
             "• Compare this with existing work\n\n"
             "🎯 _Try asking something specific!_",
             parse_mode=ParseMode.MARKDOWN,
-            reply_markup=reply_markup
+            reply_markup=_QUESTION_MODE_MARKUP
         )
 
     def _generate_key_points(self, query: CallbackQuery, doc_info: Dict) -> None:
         """Extract and present key points from the document."""
         query.answer("📊 Extracting key points...")
 
-        prompt = f"""
-        Extract the most important key points from this academic document.
-        Include:
-        1. Major contributions
-        2. Critical findings
-        3. Novel insights
-        4. Important conclusions
-
-        Format them as a bulleted list with emojis.
-
-        Document analysis: {doc_info['initial_analysis']}
-        """
-
-        response = self.model.generate_content(prompt)
+        prompt = self.KEY_POINTS_PROMPT.format(analysis=doc_info['initial_analysis'])
 
-        keyboard = [
-            [InlineKeyboardButton("📈 Visualize Points", callback_data="keypoints_visualize"),
-             InlineKeyboardButton("🔍 Expand Point", callback_data="keypoints_expand")],
-            [InlineKeyboardButton("🔄 Back", callback_data="doc_main_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        key_points = self._generate_cached(prompt)
 
         query.message.reply_text(
-            f"📊 *Key Points Analysis*\n\n{response.text}",
+            f"📊 *Key Points Analysis*\n\n{key_points}",
             parse_mode=ParseMode.MARKDOWN,
-            reply_markup=reply_markup
+            reply_markup=_KEY_POINTS_MARKUP
         )
 
     def _find_related_papers(self, query: CallbackQuery, doc_info: Dict) -> None:
         """Find and suggest related papers."""
         query.answer("🔍 Searching related papers...")
 
-        prompt = f"""
-        Extract 3-5 key search terms from this document that would be
-        most effective for finding related academic papers. Focus on:
-        1. Core concepts
-        2. Methodologies
-        3. Research areas
-
-        Document: {doc_info['initial_analysis']}
-        """
+        prompt = self.RELATED_TERMS_PROMPT.format(analysis=doc_info['initial_analysis'])
 
-        search_terms = self.model.generate_content(prompt)
+        search_terms = self._generate_cached(prompt)
 
         keyboard = []
-        for term in search_terms.text.split('\n'):
+        for term in search_terms.split('\n'):
             if term.strip():
                 keyboard.append([
                     InlineKeyboardButton(f"🔍 {term.strip()}",
                                       callback_data=f"search_{term.strip()}")
                 ])
 
-        keyboard.append([InlineKeyboardButton("🔄 Back", callback_data="doc_main_menu")])
+        keyboard.append([_BACK_TO_DOC_MENU_BUTTON])
         reply_markup = InlineKeyboardMarkup(keyboard)
 
         query.message.reply_text(
             "📚 *Related Papers Search*\n\n"
             "I've extracted key topics from your document.\n"
             "Click on any term to find related papers!\n\n"
-            "*Search Terms:*\n" + search_terms.text,
+            "*Search Terms:*\n" + search_terms,
             parse_mode=ParseMode.MARKDOWN,
             reply_markup=reply_markup
         )
@@ -506,52 +675,25 @@ class DocumentHandler:
         """Analyze and present research gaps and future work."""
         query.answer("🎯 Analyzing research gaps...")
 
-        prompt = f"""
-        Analyze this academic document to identify:
-        1. Current research gaps
-        2. Limitations of the work
-        3. Potential future research directions
-        4. Unexplored aspects of the topic
-
-        Format the response with clear sections and recommendations.
-
-        Document: {doc_info['initial_analysis']}
-        """
-
-        response = self.model.generate_content(prompt)
+        prompt = self.RESEARCH_GAPS_PROMPT.format(analysis=doc_info['initial_analysis'])
 
-        keyboard = [
-            [InlineKeyboardButton("💡 Suggest Extensions", callback_data="gaps_suggest_extensions"),
-             InlineKeyboardButton("🔍 Explore Gap", callback_data="gaps_explore")],
-            [InlineKeyboardButton("🔄 Back", callback_data="doc_main_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        gaps = self._generate_cached(prompt)
 
         query.message.reply_text(
-            f"🎯 *Research Gaps Analysis*\n\n{response.text}",
+            f"🎯 *Research Gaps Analysis*\n\n{gaps}",
             parse_mode=ParseMode.MARKDOWN,
-            reply_markup=reply_markup
+            reply_markup=_RESEARCH_GAPS_MARKUP
         )
 
     def _show_main_menu(self, query: CallbackQuery, doc_info: Dict) -> None:
         """Show the main document analysis menu."""
         query.answer()
-        keyboard = [
-            [InlineKeyboardButton("📝 Summary", callback_data="doc_summary"),
-             InlineKeyboardButton("🔍 Detailed Analysis", callback_data="doc_analysis")],
-            [InlineKeyboardButton("❓ Ask Question", callback_data="doc_question"),
-             InlineKeyboardButton("📊 Key Points", callback_data="doc_keypoints")],
-            [InlineKeyboardButton("📚 Related Papers", callback_data="doc_related"),
-             InlineKeyboardButton("🎯 Research Gap", callback_data="doc_gaps")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
         query.edit_message_text(
             f"🌟 *Document Analysis Menu*\n\n"
             f"Current document: `{doc_info['filename']}`\n\n"
             f"What would you like to know about it?",
             parse_mode=ParseMode.MARKDOWN,
-            reply_markup=reply_markup
+            reply_markup=_DOC_MENU_MARKUP
         )
 
     def handle_analysis_query(self, update: Update, context: CallbackContext) -> None:
@@ -559,60 +701,22 @@ class DocumentHandler:
         query = update.callback_query
         chat_id = update.effective_chat.id
 
-        if chat_id not in self.user_documents:
+        doc_info = self._get_document(chat_id)
+        if doc_info is None:
             query.answer("No active document! Send me one first! 📚")
             return
 
-        doc_info = self.user_documents[chat_id]
         action = query.data
 
-        analysis_prompts = {
-            'analysis_methods': (
-                "🔬 *Methodology Analysis*\n\n"
-                "Analyze and explain the research methodology, including:\n"
-                "1. Research approach\n"
-                "2. Data collection methods\n"
-                "3. Analysis techniques\n"
-                "4. Validation methods"
-            ),
-            'analysis_results': (
-                "📊 *Results Analysis*\n\n"
-                "Analyze the key findings, including:\n"
-                "1. Main results\n"
-                "2. Statistical significance\n"
-                "3. Practical implications\n"
-                "4. Comparative analysis"
-            ),
-            'analysis_innovation': (
-                "💡 *Innovation Analysis*\n\n"
-                "Identify and analyze innovative aspects:\n"
-                "1. Novel contributions\n"
-                "2. Technical advancements\n"
-                "3. Theoretical contributions\n"
-                "4. Methodological innovations"
-            ),
-            'analysis_impact': (
-                "📈 *Impact Analysis*\n\n"
-                "Evaluate the research impact:\n"
-                "1. Academic significance\n"
-                "2. Practical applications\n"
-                "3. Industry relevance\n"
-                "4. Future implications"
-            )
-        }
-
-        if action in analysis_prompts:
+        if action in self.ANALYSIS_PROMPTS:
             query.answer(f"Analyzing {action.split('_')[1]}...")
-            prompt = f"{analysis_prompts[action]}\n\nDocument: {doc_info['initial_analysis']}"
-            response = self.model.generate_content(prompt)
-
-            keyboard = [[InlineKeyboardButton("🔄 Back to Analysis", callback_data="doc_analysis")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            prompt = f"{self.ANALYSIS_PROMPTS[action]}\n\nDocument: {doc_info['initial_analysis']}"
+            analysis = self._generate_cached(prompt)
 
             query.edit_message_text(
-                response.text,
+                analysis,
                 parse_mode=ParseMode.MARKDOWN,
-                reply_markup=reply_markup
+                reply_markup=_BACK_TO_ANALYSIS_MARKUP
             )
 
         elif action == "doc_main_menu":
@@ -1,24 +1,78 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timezone
 import json
 import os
+import threading
+import time
 from typing import Dict, List, Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
+DAY_SECONDS = 24 * 60 * 60
+
+def _to_epoch(value) -> Optional[int]:
+    """Convert a stored timestamp to epoch seconds; older files hold UTC '%Y-%m-%d %H:%M:%S' strings."""
+    if isinstance(value, str):
+        return int(datetime.strptime(value, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc).timestamp())
+    return value
+
 class NotificationPreferences:
+
+    FLUSH_INTERVAL = 0.5  # seconds between writes of saved preferences to disk
+
     def __init__(self):
         self.notifications_dir = "user_notifications"
         os.makedirs(self.notifications_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._enabled_users = self._scan_enabled_users()
+        # user_id -> arXiv query built from their keywords and categories; dropped on save
+        self._queries: Dict[int, str] = {}
+        # user_id -> preferences saved since the last flush
+        self._dirty: Dict[int, Dict] = {}
+        # user_id -> preferences taken by the flush in progress, until they reach the disk
+        self._flushing: Dict[int, Dict] = {}
+        self._flush_lock = threading.Lock()
+
+    def _scan_enabled_users(self) -> set:
+        """Read every preferences file once to find the users with notifications on."""
+        enabled = set()
+        with os.scandir(self.notifications_dir) as entries:
+            for entry in entries:
+                filename = entry.name
+                if not (filename.startswith("notifications_") and filename.endswith(".json") and entry.is_file()):
+                    continue
+                try:
+                    with open(entry.path, 'r') as f:
+                        if json.load(f).get('enabled'):
+                            enabled.add(int(filename[len("notifications_"):-len(".json")]))
+                except (ValueError, OSError) as e:
+                    logger.error(f"Skipping notification file {filename}: {str(e)}")
+        return enabled
+
+    def enabled_users(self) -> List[int]:
+        """Return the ids of users who have notifications enabled."""
+        with self._lock:
+            return list(self._enabled_users)
 
     def _get_user_file_path(self, user_id: int) -> str:
         return os.path.join(self.notifications_dir, f"notifications_{user_id}.json")
 
     def get_preferences(self, user_id: int) -> Dict:
         """Get user notification preferences."""
+        with self._lock:
+            pending = self._dirty.get(user_id)
+            if pending is None:
+                pending = self._flushing.get(user_id)
+        if pending is not None:
+            return pending
+
         try:
             with open(self._get_user_file_path(user_id), 'r') as f:
-                return json.load(f)
+                prefs = json.load(f)
+            # Timestamps are compared on every check, so keep them as epoch seconds in memory
+            for key in ('last_checked', 'last_notification'):
+                prefs[key] = _to_epoch(prefs.get(key))
+            return prefs
         except (FileNotFoundError, json.JSONDecodeError):
             default_prefs = {
                 'enabled': False,
@@ -27,15 +81,63 @@ class NotificationPreferences:
                 'categories': [],
                 'last_notification': None,
                 'notification_time': "09:00",  # Default to 9 AM UTC
-                'last_checked': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+                'last_checked': int(time.time())
             }
             self.save_preferences(user_id, default_prefs)
             return default_prefs
 
     def save_preferences(self, user_id: int, preferences: Dict) -> None:
-        """Save user notification preferences."""
-        with open(self._get_user_file_path(user_id), 'w') as f:
-            json.dump(preferences, f, indent=2)
+        """Save user notification preferences; the file is written on the next flush."""
+        self.save_preferences_bulk({user_id: preferences})
+
+    def save_preferences_bulk(self, updates: Dict[int, Dict]) -> None:
+        """Save several users' notification preferences at once."""
+        with self._lock:
+            for user_id, preferences in updates.items():
+                self._dirty[user_id] = preferences
+                self._queries.pop(user_id, None)
+                if preferences.get('enabled'):
+                    self._enabled_users.add(user_id)
+                else:
+                    self._enabled_users.discard(user_id)
+
+    def search_query(self, user_id: int, prefs: Dict) -> str:
+        """Return the arXiv query for the user's keywords and categories, built once per save."""
+        with self._lock:
+            query = self._queries.get(user_id)
+        if query is not None:
+            return query
+
+        search_query_parts = sorted(prefs['keywords'])
+        if prefs['categories']:
+            category_filter = ' OR '.join(f'cat:{cat}' for cat in sorted(prefs['categories']))
+            search_query_parts.append(f"({category_filter})")
+        query = ' AND '.join(f"({part})" for part in search_query_parts if part)
+
+        with self._lock:
+            self._queries[user_id] = query
+        return query
+
+    def flush(self) -> None:
+        """Write preferences saved since the last flush to disk."""
+        # Flushes run one at a time; _lock is only held to swap buffers, so readers never wait on the disk
+        with self._flush_lock:
+            with self._lock:
+                self._flushing, self._dirty = self._dirty, {}
+            for user_id, preferences in list(self._flushing.items()):
+                try:
+                    path = self._get_user_file_path(user_id)
+                    # Write to a temp file first so the startup scan never reads a half-written file
+                    with open(path + '.tmp', 'w') as f:
+                        json.dump(preferences, f, indent=2)
+                    os.replace(path + '.tmp', path)
+                except Exception:
+                    logger.exception(f"Failed to write notification preferences for user {user_id}")
+                    with self._lock:
+                        # Retry on the next flush unless a newer save has replaced it
+                        self._dirty.setdefault(user_id, preferences)
+                with self._lock:
+                    del self._flushing[user_id]
 
     def add_keyword(self, user_id: int, keyword: str) -> None:
         """Add a keyword to user's notification preferences."""
@@ -62,12 +164,11 @@ class NotificationPreferences:
         if not last_notification:
             return True
 
-        last_notification = datetime.strptime(last_notification, '%Y-%m-%d %H:%M:%S')
-        now = datetime.utcnow()
+        elapsed = time.time() - last_notification
 
         if prefs['frequency'] == 'daily':
-            return (now - last_notification) >= timedelta(days=1)
+            return elapsed >= DAY_SECONDS
         elif prefs['frequency'] == 'weekly':
-            return (now - last_notification) >= timedelta(days=7)
+            return elapsed >= 7 * DAY_SECONDS
 
         return False
\ No newline at end of file
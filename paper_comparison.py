@@ -3,9 +3,85 @@ import json
 import os
 from typing import Dict, List, Optional
 import logging
+import re
+from collections import Counter
+from itertools import combinations
 
 logger = logging.getLogger(__name__)
 
+# Words that say nothing about a paper's topic, left out of common and unique terms
+_STOPWORDS = frozenset("""
+    about above across after again against along also among an analysis and approach are based been
+    being between both but can could does done during each either from further have having here how
+    however into its itself more most much must only other over paper propose proposed provide
+    results same several should show shows since some such than that their them then there these
+    they this those through thus under until upon using very well were what when where whether which
+    while with within without would
+""".split())
+_TERM_RE = re.compile(r"[a-z][a-z-]{3,}")
+COMMON_TOPICS_SHOWN = 8
+UNIQUE_ASPECTS_SHOWN = 5
+
+class PaperComparison:
+    """Overlap between papers; the Gemini analysis is attached as methodology_comparison."""
+
+    def __init__(self, common_topics: List[str], unique_aspects: Dict[str, List[str]], similarity_score: float):
+        self.common_topics = common_topics
+        self.unique_aspects = unique_aspects
+        self.similarity_score = similarity_score
+        self.methodology_comparison = ""
+
+def _term_counts(paper) -> Counter:
+    """Count the topical words in a paper's title and abstract."""
+    text = f"{paper.title} {paper.summary}".lower()
+    return Counter(term for term in _TERM_RE.findall(text) if term not in _STOPWORDS)
+
+def compare_papers(papers) -> PaperComparison:
+    """Compare papers by their shared categories and title/abstract vocabulary."""
+    counts = [_term_counts(paper) for paper in papers]
+    terms = [set(count) for count in counts]
+    totals = sum(counts, Counter())
+
+    shared_categories = set.intersection(*(set(paper.categories) for paper in papers))
+    shared_terms = set.intersection(*terms)
+    common_topics = sorted(shared_categories) + sorted(
+        shared_terms, key=lambda term: (-totals[term], term)
+    )[:COMMON_TOPICS_SHOWN]
+
+    unique_aspects = {}
+    for i, count in enumerate(counts):
+        others = set().union(*(terms[:i] + terms[i + 1:]))
+        unique = [term for term, _ in count.most_common() if term not in others]
+        unique_aspects[f"Paper {i + 1}"] = unique[:UNIQUE_ASPECTS_SHOWN]
+
+    # Mean pairwise Jaccard overlap of the papers' vocabularies
+    pairs = list(combinations(terms, 2))
+    similarity_score = sum(
+        len(a & b) / len(a | b) if a | b else 0.0 for a, b in pairs
+    ) / len(pairs) if pairs else 1.0
+
+    return PaperComparison(common_topics, unique_aspects, similarity_score)
+
+def generate_comparison_prompt(papers) -> str:
+    """Build the Gemini prompt asking for a side-by-side analysis of the papers."""
+    paper_sections = "\n\n".join(
+        f"Paper {i}: {paper.title}\nAbstract: {paper.summary}"
+        for i, paper in enumerate(papers, 1)
+    )
+    return f"""
+    Compare the following academic papers. Refer to them as Paper 1, Paper 2, and so on.
+    Cover:
+    1. Research questions and goals
+    2. Methodologies and how they differ
+    3. Key results and how they relate
+    4. Strengths and limitations of each
+    5. Which paper suits which use case
+
+    Answer in plain text without Markdown formatting.
+
+    {paper_sections}
+    """
+
 class NotificationPreferences:
     def __init__(self):
         self.notifications_dir = "user_notifications"
@@ -1,10 +1,18 @@
 from typing import Dict, List, Optional
+from collections import OrderedDict
 import json
 import os
+import threading
+import logging
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 class UserPreferences:
 
+    CACHE_SIZE = 1024  # users whose preferences are kept in memory
+    FLUSH_INTERVAL = 0.5  # seconds between writes of saved preferences to disk
+
     ARXIV_CATEGORIES = {
         "Computer Science": {
             "cs.AI": "Artificial Intelligence",
@@ -41,32 +49,88 @@ class UserPreferences:
     def __init__(self):
         self.preferences_dir = "user_preferences"
         os.makedirs(self.preferences_dir, exist_ok=True)
+        # user_id -> preferences, least recently used first; updated on save, written to disk on the next flush
+        self._cache: Dict[int, Dict] = OrderedDict()
+        # user_id -> snapshot saved since the last flush, in file form
+        self._dirty: Dict[int, Dict] = {}
+        # user_id -> snapshot taken by the flush in progress, until it reaches the disk
+        self._flushing: Dict[int, Dict] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
 
     def _get_user_file_path(self, user_id: int) -> str:
         return os.path.join(self.preferences_dir, f"user_{user_id}.json")
 
     def get_preferences(self, user_id: int) -> Dict:
         """Get user preferences, creating default if none exist."""
+        with self._lock:
+            prefs = self._cache.get(user_id)
+            if prefs is not None:
+                self._cache.move_to_end(user_id)
+                return prefs
+            pending = self._dirty.get(user_id)
+            if pending is None:
+                pending = self._flushing.get(user_id)
+
+        if pending is not None:
+            # Evicted from the cache before its write reached the disk
+            prefs = dict(pending, preferred_categories=set(pending['preferred_categories']))
+            self._remember(user_id, prefs)
+            return prefs
+
         try:
             with open(self._get_user_file_path(user_id), 'r') as f:
-                return json.load(f)
+                prefs = json.load(f)
+            # Kept as a set in memory so category toggles are constant-time
+            prefs['preferred_categories'] = set(prefs.get('preferred_categories', ()))
+            self._remember(user_id, prefs)
+            return prefs
         except (FileNotFoundError, json.JSONDecodeError):
             default_prefs = {
                 'max_results': 10,
                 'specific_journals': [],
-                'preferred_categories': [],
-                'last_updated': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
                 'auto_download': False,
-                'preferred_categories': []
+                'preferred_categories': set()
             }
-            self.save_preferences(user_id, default_prefs)
+            self.save_preferences(user_id, default_prefs)  # stamps last_updated
             return default_prefs
 
     def save_preferences(self, user_id: int, preferences: Dict) -> None:
-        """Save user preferences to file."""
+        """Save user preferences; the file is written on the next flush."""
         preferences['last_updated'] = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
-        with open(self._get_user_file_path(user_id), 'w') as f:
-            json.dump(preferences, f, indent=2)
+        preferences['preferred_categories'] = set(preferences.get('preferred_categories', ()))
+        snapshot = dict(preferences, preferred_categories=sorted(preferences['preferred_categories']))
+        with self._lock:
+            self._dirty[user_id] = snapshot
+        self._remember(user_id, preferences)
+
+    def flush(self) -> None:
+        """Write preferences saved since the last flush to disk."""
+        # Flushes run one at a time; _lock is only held to swap buffers, so readers never wait on the disk
+        with self._flush_lock:
+            with self._lock:
+                self._flushing, self._dirty = self._dirty, {}
+            for user_id, preferences in list(self._flushing.items()):
+                try:
+                    path = self._get_user_file_path(user_id)
+                    # Write to a temp file first so a crash never leaves a half-written preferences file
+                    with open(path + '.tmp', 'w') as f:
+                        json.dump(preferences, f, indent=2)
+                    os.replace(path + '.tmp', path)
+                except Exception:
+                    logger.exception(f"Failed to write preferences for user {user_id}")
+                    with self._lock:
+                        # Retry on the next flush unless a newer save has replaced it
+                        self._dirty.setdefault(user_id, preferences)
+                with self._lock:
+                    del self._flushing[user_id]
+
+    def _remember(self, user_id: int, preferences: Dict) -> None:
+        with self._lock:
+            self._cache[user_id] = preferences
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self.CACHE_SIZE:
+                self._cache.popitem(last=False)
 
     def update_preference(self, user_id: int, key: str, value: any) -> Dict:
         """Update a single preference and return all preferences."""
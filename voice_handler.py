@@ -9,10 +9,15 @@ import speech_recognition as sr
 from pydub import AudioSegment
 from random import choice
 
+# MarkdownV2 reserved characters, backslash included, escaped in a single pass
+_MD2_ESCAPE = str.maketrans({c: '\\' + c for c in '\\_*[]()~`>#+-=|{}.!'})
+
 class VoiceSearchHandler:
     def __init__(self):
         self.recognizer = sr.Recognizer()
         self.logger = logging.getLogger(__name__)
+        # Voice files all come from api.telegram.org, so keep the connection alive
+        self.session = requests.Session()
 
         # Cool emojis for different actions
         self.EMOJIS = {
@@ -36,7 +41,7 @@ class VoiceSearchHandler:
     def download_voice_file(self, file_url: str, token: str) -> bytes:
         """Download voice file from Telegram servers."""
         headers = {'User-Agent': 'PaperPilotBot/1.0'}
-        response = requests.get(file_url, headers=headers)
+        response = self.session.get(file_url, headers=headers)
         return response.content
 
     def process_voice(self, update: Update, context: CallbackContext) -> None:
@@ -227,10 +232,7 @@ class VoiceSearchHandler:
 
     def escape_markdown_v2(self, text: str) -> str:
         """Helper function to escape MarkdownV2 special characters."""
-        special_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-        for char in special_chars:
-            text = text.replace(char, f'\\{char}')
-        return text
+        return text.translate(_MD2_ESCAPE)
 
     def cleanup_temp_files(self, temp_dir: str) -> None:
         """Clean up temporary voice files."""